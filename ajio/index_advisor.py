@@ -0,0 +1,371 @@
+"""
+Replay-driven index advisor (used by `manage.py advise_indexes`).
+
+A request log (JSON lines) is replayed through the Django test client
+while every SQL statement is recorded per endpoint. Slow statements are
+EXPLAINed; their WHERE / ORDER BY columns become composite index
+candidates (equality columns first, then one range or the ORDER BY
+columns), ranked by estimated rows scanned saved x executions.
+
+Log line format (extra keys are ignored, lines without a path skipped):
+
+    {"method": "GET", "path": "/api/products/?sort=low", "user": "alice"}
+    {"method": "POST", "path": "/api/orders/create/", "data": {"address_id": 3}, "user": "alice"}
+"""
+import json
+import re
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.urls import Resolver404, resolve
+
+
+RANGE_GUESS = 3         # a range predicate is assumed to keep 1/3 of the rows
+MAX_INDEX_COLUMNS = 4
+
+_COL = r'(?:[`"](?P<{t}>\w+)[`"]|(?P<{a}>T\d+))\.[`"](?P<{c}>\w+)[`"]'
+_COLREF = re.compile(_COL.format(t="t", a="a", c="c"))
+_EQ_PARAM = re.compile(_COL.format(t="t", a="a", c="c") + r"\s*(?:=\s*%s|IN\s*\()", re.I)
+_RANGE = re.compile(_COL.format(t="t", a="a", c="c") + r"\s*(?:<=|>=|<|>|LIKE|BETWEEN)\s", re.I)
+_JOIN = re.compile(r'JOIN\s+[`"](?P<table>\w+)[`"](?:\s+(?:AS\s+)?(?P<alias>T\d+))?\s+ON\s+\((?P<on>[^)]*)\)', re.I)
+_NOT = re.compile(r"NOT \((?:[^()]|\([^()]*\))*\)")
+_ALIAS = re.compile(r'[`"](\w+)[`"]\s+(?:AS\s+)?(T\d+)\b')
+_IN_LIST = re.compile(r"\((?:%s,\s*)+%s\)")
+_SQLITE_PLAN = re.compile(
+    r"^(?P<op>SCAN|SEARCH)\s+(?:TABLE\s+)?(?P<table>\w+)(?:\s+AS\s+(?P<alias>\w+))?"
+    r"(?:\s+USING\s+(?:COVERING\s+)?INDEX\s+(?P<index>\w+)\s+\((?P<cols>[^)]*)\)"
+    r"|\s+USING\s+INTEGER PRIMARY KEY)?"
+)
+
+
+# ---------------- LOG ----------------
+
+def read_log(path):
+    """ Yields request dicts; returns nothing for lines that are not requests. """
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            target = entry.get("path") or entry.get("url")
+            if not isinstance(target, str) or not target.startswith("/"):
+                continue
+            yield {
+                "method": (entry.get("method") or "GET").upper(),
+                "path": target,
+                "data": entry.get("data") or entry.get("body") or {},
+                "user": entry.get("user"),
+            }
+
+
+def normalize_sql(sql):
+    """ IN (%s, %s, ...) of any length counts as one statement shape. """
+    return _IN_LIST.sub("(%s, ...)", sql)
+
+
+# ---------------- REPLAY ----------------
+
+class Recorder:
+    """ connection.execute_wrapper that files every statement under the current endpoint. """
+
+    def __init__(self):
+        self.endpoint = None
+        self.statements = defaultdict(lambda: {"count": 0, "ms": 0.0, "endpoints": set(), "sample": None})
+        self.endpoints = defaultdict(lambda: {"requests": 0, "queries": 0, "ms": 0.0, "statuses": defaultdict(int)})
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            if self.endpoint and not many:
+                stmt = self.statements[normalize_sql(sql)]
+                stmt["count"] += 1
+                stmt["ms"] += ms
+                stmt["endpoints"].add(self.endpoint)
+                if stmt["sample"] is None:
+                    stmt["sample"] = (sql, tuple(params or ()))
+                self.endpoints[self.endpoint]["queries"] += 1
+
+
+def endpoint_name(path):
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return urlsplit(path).path
+    return match.view_name or match.route
+
+
+def _host():
+    hosts = [h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")]
+    return hosts[0] if hosts else "localhost"
+
+
+def replay(entries, recorder, repeat=1):
+    """ Runs every entry through the test client (JWT header + cookie for entries with a user). """
+    User = get_user_model()
+    clients = {}
+
+    def client_for(username):
+        if username not in clients:
+            client = Client(HTTP_HOST=_host())
+            if username:
+                from rest_framework_simplejwt.tokens import RefreshToken
+
+                user = User.objects.filter(username=username).first()
+                if user:
+                    access = str(RefreshToken.for_user(user).access_token)
+                    client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {access}"
+                    client.cookies["access"] = access
+                    client.force_login(user)
+            clients[username] = client
+        return clients[username]
+
+    total = 0
+    for _ in range(repeat):
+        for entry in entries:
+            client = client_for(entry["user"])
+            name = endpoint_name(entry["path"])
+            recorder.endpoint = name
+            start = time.perf_counter()
+            response = client.generic(
+                entry["method"],
+                entry["path"],
+                json.dumps(entry["data"]) if entry["method"] != "GET" else "",
+                content_type="application/json",
+            )
+            recorder.endpoint = None
+
+            stats = recorder.endpoints[name]
+            stats["requests"] += 1
+            stats["ms"] += (time.perf_counter() - start) * 1000
+            stats["statuses"][response.status_code] += 1
+            total += 1
+    return total
+
+
+# ---------------- EXPLAIN + ESTIMATES ----------------
+
+class Advisor:
+    def __init__(self):
+        self.cursor = connection.cursor()
+        self._counts = {}
+        self._distinct = {}
+        self._indexes = {}
+
+    def table_rows(self, table):
+        if table not in self._counts:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+            self._counts[table] = self.cursor.fetchone()[0]
+        return self._counts[table]
+
+    def distinct_values(self, table, columns):
+        key = (table, tuple(columns))
+        if key not in self._distinct:
+            cols = ", ".join(connection.ops.quote_name(c) for c in columns)
+            self.cursor.execute(
+                f"SELECT COUNT(*) FROM (SELECT DISTINCT {cols} FROM {connection.ops.quote_name(table)}) d"
+            )
+            self._distinct[key] = max(1, self.cursor.fetchone()[0])
+        return self._distinct[key]
+
+    def existing_indexes(self, table):
+        """ Column lists of every index/unique/pk on the table. """
+        if table not in self._indexes:
+            constraints = connection.introspection.get_constraints(self.cursor, table)
+            self._indexes[table] = [
+                tuple(c["columns"]) for c in constraints.values()
+                if c["columns"] and (c["index"] or c["unique"] or c["primary_key"])
+            ]
+        return self._indexes[table]
+
+    def rows_for(self, table, eq_columns, has_range=False):
+        rows = self.table_rows(table)
+        if eq_columns:
+            rows = rows / self.distinct_values(table, eq_columns)
+        if has_range:
+            rows = rows / RANGE_GUESS
+        return max(1, round(rows))
+
+    def unique_indexes(self, table):
+        constraints = connection.introspection.get_constraints(self.cursor, table)
+        return [set(c["columns"]) for c in constraints.values() if c["columns"] and (c["unique"] or c["primary_key"])]
+
+    def explain(self, sql, params):
+        """
+        ([{"table", "index", "rows"}] per table access, needs_sort) where
+        needs_sort means the plan sorts rows itself (temp b-tree / filesort).
+        """
+        if connection.vendor == "sqlite":
+            self.cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+            out = []
+            needs_sort = False
+            for row in self.cursor.fetchall():
+                if "TEMP B-TREE FOR ORDER BY" in row[-1]:
+                    needs_sort = True
+                m = _SQLITE_PLAN.match(row[-1])
+                if not m:
+                    continue
+                table = aliases.get(m["table"], m["table"])
+                table = aliases.get(m["alias"], table) if m["alias"] else table
+                if m["op"] == "SCAN" and not m["index"]:
+                    rows = self.table_rows(table)
+                elif m["cols"]:
+                    eq = re.findall(r"(\w+)=\?", m["cols"])
+                    rows = self.rows_for(table, eq, has_range=bool(re.search(r"[<>]", m["cols"])))
+                elif m["op"] == "SCAN":
+                    rows = self.table_rows(table)       # full index scan
+                else:
+                    rows = 1                            # rowid lookup
+                out.append({"table": table, "index": m["index"], "rows": rows})
+            return out, needs_sort
+
+        # MySQL / MariaDB: EXPLAIN reports an estimate per table directly
+        self.cursor.execute(f"EXPLAIN {sql}", params)
+        names = [c[0].lower() for c in self.cursor.description]
+        aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+        out = []
+        needs_sort = False
+        for row in self.cursor.fetchall():
+            r = dict(zip(names, row))
+            if "filesort" in (r.get("extra") or ""):
+                needs_sort = True
+            if not r.get("table"):
+                continue
+            table = aliases.get(r["table"], r["table"])
+            out.append({"table": table, "index": r.get("key"), "rows": int(r.get("rows") or 0)})
+        return out, needs_sort
+
+
+def predicates(sql):
+    """ {table: {"eq": [...], "range": [...], "order": [...]}} from Django-generated SQL. """
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+
+    def table_of(m):
+        return m["t"] or aliases.get(m["a"])
+
+    out = defaultdict(lambda: {"eq": [], "range": [], "order": []})
+
+    def add(table, kind, column):
+        if table and column not in out[table][kind]:
+            out[table][kind].append(column)
+
+    head, _, order = sql.partition(" ORDER BY ")
+    where = head.split(" WHERE ", 1)[1] if " WHERE " in head else ""
+    # "NOT (id = %s)" can't use an index
+    where = _NOT.sub("", where)
+
+    for m in _EQ_PARAM.finditer(where):
+        add(table_of(m), "eq", m["c"])
+    for m in _RANGE.finditer(where):
+        add(table_of(m), "range", m["c"])
+
+    # a join is an equality lookup on the joined table's side of ON
+    for j in _JOIN.finditer(head):
+        for m in _COLREF.finditer(j["on"]):
+            if (j["alias"] and m["a"] == j["alias"]) or (not j["alias"] and m["t"] == j["table"]):
+                add(j["table"], "eq", m["c"])
+
+    if order:
+        order = re.split(r"\s+LIMIT\s", order, flags=re.I)[0]
+        for m in _COLREF.finditer(order):
+            add(table_of(m), "order", m["c"])
+    return out
+
+
+def _covered(eq, tail, existing):
+    """ An index already leads with the equality columns (any order) followed by tail. """
+    n = len(eq)
+    return any(
+        set(ix[:n]) == set(eq) and tuple(ix[n:n + len(tail)]) == tuple(tail)
+        for ix in existing
+    )
+
+
+def _field_names(table, columns):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            by_column = {f.column: f.name for f in model._meta.concrete_fields}
+            return model.__name__, [by_column.get(c, c) for c in columns]
+    return table, list(columns)
+
+
+def suggest(recorder, advisor, slow_ms=2.0, top=None):
+    """
+    Ranked suggestions: list of dicts (table, columns, before, after,
+    executions, score, ...). score = rows saved x executions; removing an
+    in-memory sort counts as reading the matched rows once more.
+    """
+    statements = sorted(recorder.statements.items(), key=lambda kv: -kv[1]["ms"])
+    if top:
+        statements = statements[:top]
+
+    found = {}
+    for shape, stmt in statements:
+        avg = stmt["ms"] / stmt["count"]
+        sql, params = stmt["sample"]
+        if avg < slow_ms or not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        try:
+            plan, needs_sort = advisor.explain(sql, params)
+        except Exception:
+            continue
+        before_by_table = {}
+        for step in plan:
+            before_by_table[step["table"]] = max(before_by_table.get(step["table"], 0), step["rows"])
+
+        for table, cols in predicates(sql).items():
+            if table not in before_by_table:
+                continue
+            eq = list(cols["eq"])
+            # unique lookups are already as good as it gets
+            if any(u <= set(eq) for u in advisor.unique_indexes(table)):
+                continue
+            # most selective equality column first
+            eq.sort(key=lambda c: -advisor.distinct_values(table, [c]))
+
+            tail = []
+            if cols["range"]:
+                tail = cols["range"][:1]
+            elif cols["order"] and len(eq) + len(cols["order"]) <= MAX_INDEX_COLUMNS:
+                tail = [c for c in cols["order"] if c not in eq]
+            columns = (eq + tail)[:MAX_INDEX_COLUMNS]
+            if not columns or _covered(eq, tail, advisor.existing_indexes(table)):
+                continue
+
+            before = before_by_table[table]
+            after = advisor.rows_for(table, eq, has_range=bool(cols["range"]))
+            sort_avoided = needs_sort and bool(tail) and not cols["range"]
+            gain = max(0, before - after) + (after if sort_avoided else 0)
+            if gain <= 0:
+                continue
+
+            key = (table, tuple(columns))
+            s = found.setdefault(key, {
+                "table": table, "columns": columns, "before": before, "after": after,
+                "sort_avoided": sort_avoided, "gain": gain,
+                "executions": 0, "ms": 0.0, "endpoints": set(), "sql": shape,
+            })
+            s["executions"] += stmt["count"]
+            s["ms"] += stmt["ms"]
+            s["endpoints"] |= stmt["endpoints"]
+
+    out = []
+    for s in found.values():
+        s["score"] = s.pop("gain") * s["executions"]
+        s["model"], s["fields"] = _field_names(s["table"], s["columns"])
+        out.append(s)
+    out.sort(key=lambda s: -s["score"])
+    return out
@@ -0,0 +1,238 @@
+"""
+Production media serving.
+
+    MEDIA_URL/<path>  ->  serve_media(request, path)
+
+Uploads are stored under content-hashed names (HashedMediaStorage:
+"products/shirt.1a2b3c4d5e6f.jpg"; image derivatives are already named by
+hash), so those URLs never change content and are sent with a one-year
+immutable Cache-Control. Anything else gets a short max-age and is
+revalidated with ETag / Last-Modified.
+
+settings.MEDIA_SERVE_MODE picks who streams the bytes:
+  "python"      FileResponse (wsgi.file_wrapper -> sendfile under gunicorn),
+                with single-range 206 responses and .br/.gz precompressed
+                variants (compress_media command)
+  "x-accel"     nginx: X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path
+  "x-sendfile"  Apache / lighttpd: X-Sendfile with the absolute path
+In the offload modes Django only checks the path and sets headers; the web
+server handles ranges and the transfer, so workers are freed immediately.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+
+# "name.<12 hex>.ext" (HashedMediaStorage) or "<20 hex>-<width>w.ext" (products/images.py)
+HASHED_NAME = re.compile(r"(\.[0-9a-f]{12}\.[^./]+|^[0-9a-f]{20}-\d+w\.[^./]+)$")
+HASH_LENGTH = 12
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Accept-Encoding token -> suffix written by compress_media (best first)
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(os.path.basename(name)))
+
+
+# ---------------- STORAGE ----------------
+
+class HashedMediaStorage(FileSystemStorage):
+    """
+    Saves uploads as <stem>.<content hash><ext>. Uploading the same bytes
+    twice reuses the existing file instead of writing shirt_x7Yq2.jpg.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # _save() renames to the content hash; a "_x7Yq2" suffix added here would end up in it
+        if not is_hashed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if is_hashed(name):
+            return super()._save(name, content)
+
+        digest = hashlib.sha1()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        stem, ext = os.path.splitext(name)
+        name = f"{stem}.{digest.hexdigest()[:HASH_LENGTH]}{ext.lower()}"
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+# ---------------- HEADERS ----------------
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request, etag, mtime):
+    inm = request.META.get("HTTP_IF_NONE_MATCH")
+    if inm is not None:
+        return inm.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in inm.split(",")]
+    since = parse_http_date_safe(request.META.get("HTTP_IF_MODIFIED_SINCE", ""))
+    return since is not None and int(mtime) <= since
+
+
+def _cache_headers(response, path, stat, etag):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["Cache-Control"] = (
+        IMMUTABLE if is_hashed(path)
+        else f"public, max-age={getattr(settings, 'MEDIA_MAX_AGE', 3600)}"
+    )
+    return response
+
+
+def _byte_range(request, size, etag):
+    """
+    (start, end) inclusive for a satisfiable single range, None for a full
+    response, or False when unsatisfiable (416). Multi-range and malformed
+    headers get the full file, which RFC 9110 allows.
+    """
+    header = request.META.get("HTTP_RANGE")
+    if not header:
+        return None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if if_range and if_range.strip() != etag:
+        return None
+
+    m = RANGE.match(header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    first, last = m.group(1), m.group(2)
+
+    if not first:                       # bytes=-500: last 500 bytes
+        length = int(last)
+        if not length:
+            return False
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+class _RangeFile:
+    """ File-like view of [start, start + length) for FileResponse """
+
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self.f, self.remaining = f, length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.f.close()
+
+
+def _precompressed(request, full_path):
+    accepted = {
+        token.split(";")[0].strip()
+        for token in request.META.get("HTTP_ACCEPT_ENCODING", "").split(",")
+    }
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return encoding, full_path + suffix
+    return None, full_path
+
+
+# ---------------- VIEW ----------------
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Invalid media path")
+    if not os.path.isfile(full_path) or full_path.endswith((".gz", ".br")):
+        raise Http404("Media file not found")
+    stat = os.stat(full_path)
+
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    mode = getattr(settings, "MEDIA_SERVE_MODE", "python")
+
+    if mode in ("x-accel", "x-sendfile"):
+        etag = _etag(stat)
+        if _not_modified(request, etag, stat.st_mtime):
+            return _cache_headers(HttpResponseNotModified(), path, stat, etag)
+        response = HttpResponse(content_type=content_type)
+        if mode == "x-accel":
+            prefix = getattr(settings, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+            response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + path.lstrip("/")
+        else:
+            response["X-Sendfile"] = full_path
+        return _cache_headers(response, path, stat, etag)
+
+    # ranges are always served from the identity file
+    encoding, send_path = (None, full_path) if "HTTP_RANGE" in request.META else _precompressed(request, full_path)
+    has_variants = any(os.path.isfile(full_path + suffix) for _, suffix in PRECOMPRESSED)
+
+    etag = _etag(stat)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+    if _not_modified(request, etag, stat.st_mtime):
+        response = _cache_headers(HttpResponseNotModified(), path, stat, etag)
+    else:
+        response = _file_response(request, full_path, send_path, encoding, content_type, stat, etag)
+        if response.status_code != 416:
+            _cache_headers(response, path, stat, etag)
+    if has_variants:
+        response["Vary"] = "Accept-Encoding"
+    return response
+
+
+def _file_response(request, full_path, send_path, encoding, content_type, stat, etag):
+    filename = os.path.basename(full_path)
+    byte_range = _byte_range(request, stat.st_size, etag)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(
+            _RangeFile(open(full_path, "rb"), start, length),
+            content_type=content_type, filename=filename,
+        )
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(length)
+    else:
+        response = FileResponse(open(send_path, "rb"), content_type=content_type, filename=filename)
+        if encoding:
+            response["Content-Encoding"] = encoding
+            response["Content-Length"] = str(os.path.getsize(send_path))
+
+    response["Accept-Ranges"] = "bytes"
+    return response
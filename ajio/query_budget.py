@@ -0,0 +1,67 @@
+"""
+Query-count contract for hot views.
+
+    @api_view(["GET"])
+    @query_budget(6)
+    def product_list(request): ...
+
+When settings.QUERY_BUDGET_CHECKS is on (the test suite turns it on, see
+products/tests.py) every SQL statement run by the view body is counted and
+QueryBudgetExceeded is raised past the budget, so an N+1 fails CI instead
+of showing up in production. One-off index/cache builds run inside
+unbudgeted() and are not counted.
+"""
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_state = threading.local()
+
+
+def _count_query(execute, sql, params, many, context):
+    if not getattr(_state, "exempt", 0):
+        _state.count = getattr(_state, "count", 0) + 1
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def unbudgeted():
+    _state.exempt = getattr(_state, "exempt", 0) + 1
+    try:
+        yield
+    finally:
+        _state.exempt -= 1
+
+
+def query_budget(max_queries):
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not getattr(settings, "QUERY_BUDGET_CHECKS", False):
+                return view(request, *args, **kwargs)
+
+            outer = getattr(_state, "count", None)
+            _state.count = 0
+            try:
+                with connection.execute_wrapper(_count_query):
+                    response = view(request, *args, **kwargs)
+                used = _state.count
+            finally:
+                _state.count = outer
+
+            if used > max_queries:
+                raise QueryBudgetExceeded(
+                    f"{view.__name__} ran {used} queries (budget {max_queries})"
+                )
+            return response
+
+        return wrapped
+    return decorator
@@ -102,6 +102,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'products.context_processors.nav_taxonomy',
             ],
         },
     },
@@ -166,13 +167,35 @@ STATICFILES_DIRS = [
      BASE_DIR / 'static'
 ]
 
-# WhiteNoise static storage
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+STORAGES = {
+    # Uploads get content-hashed names; /media/ is served by ajio/media.py
+    "default": {"BACKEND": "ajio.media.HashedMediaStorage"},
+    # WhiteNoise static storage
+    "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
+}
 
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# /media/ serving (ajio/media.py)
+MEDIA_SERVE_MODE = os.getenv("MEDIA_SERVE_MODE", "python")        # python | x-accel | x-sendfile
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/protected-media/")  # nginx "internal" location
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "3600"))            # files without a hash in the name
+
+# Upload-time thumb/card/zoom derivatives (see products/images.py)
+IMAGE_DERIVATIVE_WORKERS = int(os.getenv("IMAGE_DERIVATIVE_WORKERS", "2"))
+IMAGE_DERIVATIVES_ASYNC = os.getenv("IMAGE_DERIVATIVES_ASYNC", "True") == "True"
+
+# /api/products/changes/ delta sync: older tokens get a full snapshot (prune_catalog_tombstones)
+CATALOG_TOMBSTONE_DAYS = int(os.getenv("CATALOG_TOMBSTONE_DAYS", "30"))
+
+# /api/home/rails/ (products/rails.py): rebuilt every HOME_RAILS_TTL seconds
+HOME_RAILS_TTL = int(os.getenv("HOME_RAILS_TTL", "300"))
+
+# nav taxonomy map (products/taxonomy.py): full rebuild at least this often, for renames with no stamp
+TAXONOMY_TTL = int(os.getenv("TAXONOMY_TTL", "300"))
+
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # ===============================
@@ -183,3 +206,7 @@ RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Raise QueryBudgetExceeded when a @query_budget view runs too many queries (see ajio/query_budget.py);
+# the test suite turns it on, set QUERY_BUDGET_CHECKS=True to check a dev server too
+QUERY_BUDGET_CHECKS = os.getenv("QUERY_BUDGET_CHECKS", "False") == "True"
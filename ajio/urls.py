@@ -14,13 +14,16 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.shortcuts import render
 from .views import index
 from django.conf import settings
 from django.conf.urls.static import static
 from . import views
+from .media import serve_media
 
 urlpatterns = [
       # HOME
@@ -78,7 +81,9 @@ urlpatterns = [
 ]
 
 
-# serve static + media only in DEBUG
+# media: cache headers, ranges, X-Accel-Redirect / X-Sendfile (ajio/media.py); before the catch-all routes
+urlpatterns.insert(0, re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media, name="media"))
+
+# static is served by WhiteNoise outside DEBUG
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
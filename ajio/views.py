@@ -128,7 +128,7 @@ def customer_care_orders_api(request):
             p = it.product
             img = None
             if hasattr(p, "images") and p.images.first():
-                img = p.images.first().image.url
+                img = p.images.first().thumb_url
 
             products.append({
                 "name": p.name,
@@ -1,3 +1,31 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from products.tests import CatalogTestCase
+
+from .models import Cart, CartItem
+
+
+class CartQueryBudgetTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user("shopper")
+        self.cart = Cart.objects.create(user=user)
+        self.api = APIClient()
+        self.api.force_authenticate(user)
+
+    def add(self, product):
+        CartItem.objects.create(cart=self.cart, product=product, size=product.sizes.first(), quantity=1)
+
+    def test_cart_detail_queries_do_not_grow_with_items(self):
+        # cart, items + product/brand/rating/popularity/size, images, sizes
+        self.add(self.products[0])
+        with self.assertNumQueries(4):
+            self.assertEqual(self.api.get("/api/cart/").status_code, 200)
+
+        for p in self.products[1:]:
+            self.add(p)
+        with self.assertNumQueries(4):
+            body = self.api.get("/api/cart/").json()
+        self.assertEqual(len(body["items"]), len(self.products))
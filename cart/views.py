@@ -4,6 +4,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from rest_framework.response import Response
+from django.db.models import Prefetch, prefetch_related_objects
+from ajio.query_budget import query_budget
 from .models import Cart, CartItem
 from .serializers import *
 from products.models import Product, ProductSize
@@ -14,8 +16,19 @@ from products.models import Product, ProductSize
 @api_view(['GET'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@query_budget(5)
 def cart_detail(request):
     cart, _ = Cart.objects.get_or_create(user=request.user)  # always exists
+
+    # one query per relation, whatever the number of items
+    prefetch_related_objects([cart], Prefetch(
+        "items",
+        queryset=CartItem.objects
+        .select_related("product__brand", "product__rating_summary", "product__popularity", "size")
+        .prefetch_related("product__images", "product__sizes")
+        .order_by("id"),
+    ))
+
     serializer = CartSerializer(cart)
     return Response(serializer.data)
 
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Order, OrderItem, Payment,  ProductRating, OrderStatusHistory
 from users.models import Address
+from products.serializers import first_image
 import re
 
 class AddressMiniSerializer(serializers.ModelSerializer):
@@ -33,26 +34,34 @@ class OrderItemSerializer(serializers.ModelSerializer):
     def get_product_image(self, obj):
         request = self.context.get("request")
 
-        image = obj.product.images.first()
-        if image and image.image:
+        image = first_image(obj.product)
+        if image:
             if request:
-                return request.build_absolute_uri(image.image.url)
-            return image.image.url
+                return request.build_absolute_uri(image.thumb_url)
+            return image.thumb_url
 
         return None
     
     
-    def get_is_rated(self, obj):
+    def _user_rating(self, obj):
+        """
+        Rating for this item by the request user. Uses the reverse one-to-one
+        (select_related("productrating")) when the caller loaded it.
+        """
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
-            return False
-        return ProductRating.objects.filter(order_item=obj, user=request.user).exists()
+            return None
+        try:
+            r = obj.productrating
+        except ProductRating.DoesNotExist:
+            return None
+        return r if r.user_id == request.user.id else None
+
+    def get_is_rated(self, obj):
+        return self._user_rating(obj) is not None
 
     def get_rating_value(self, obj):
-        request = self.context.get("request")
-        if not request or not request.user.is_authenticated:
-            return None
-        r = ProductRating.objects.filter(order_item=obj, user=request.user).first()
+        r = self._user_rating(obj)
         return r.rating if r else None
     
     def get_size(self, obj):
@@ -1,3 +1,250 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from cart.models import Cart, CartItem
+from products import serviceability, similar
+from products.models import (
+    Product, ProductListing, ProductPincodeAvailability, ProductRatingSummary, ProductSalesDaily,
+    ProductSize, ServiceablePincode,
+)
+from products.popularity import update_popularity
+from products.ratings import rebuild_summaries
+from products.tests import CatalogTestCase
+from users.models import Address
+
+from .models import Order, OrderItem, ProductRating
+
+
+class OrderTestCase(CatalogTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user("buyer", password="x")
+        cls.address = Address.objects.create(
+            user=cls.user, name="Buyer", mobile="9999999999", pincode="560001",
+            area="Area", address_line="1 Road", city="Bengaluru", state="KA",
+        )
+
+    def order(self, *lines, status="PENDING"):
+        """ lines: (product, quantity) """
+        order = Order.objects.create(user=self.user, address=self.address, total_amount=0, status=status)
+        for product, quantity in lines:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
+        return order
+
+    def set_status(self, order, status):
+        order.status = status
+        order.save()
+
+
+# ---------------- QUERY BUDGETS ----------------
+
+class OrderQueryBudgetTests(OrderTestCase):
+
+    def test_my_orders_queries_do_not_grow_with_orders(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        self.order((self.products[0], 1))
+        # orders + address, items + product/rating, images, status history
+        with self.assertNumQueries(4):
+            self.assertEqual(api.get("/api/orders/my/").status_code, 200)
+
+        self.order((self.products[1], 2), (self.products[2], 1))
+        self.order((self.products[3], 1), status="CONFIRMED")
+        with self.assertNumQueries(4):
+            body = api.get("/api/orders/my/").json()
+        self.assertEqual(sorted(len(o["items"]) for o in body), [1, 1, 2])
+
+
+# ---------------- DELIVERABILITY ----------------
+
+@override_settings(PINCODE_SYNC_SECONDS=600)
+class CartDeliverabilityTests(OrderTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        blr = ServiceablePincode.objects.create(pincode="560001", city="Bengaluru", state="Karnataka")
+        ProductPincodeAvailability.objects.create(product=cls.products[0], pincode=blr, stock=2, eta_days=2)
+        ProductPincodeAvailability.objects.create(
+            product=cls.products[1], pincode=blr, stock=0, eta_days=5, cod_available=False,
+        )
+        cart = Cart.objects.create(user=cls.user)
+        for p in cls.products[:2]:
+            CartItem.objects.create(cart=cart, product=p, size=p.sizes.first())
+
+    def setUp(self):
+        super().setUp()
+        serviceability._index = serviceability.ServiceabilityIndex()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def check(self, **params):
+        return self.api.get("/api/orders/deliverability/", params)
+
+    def test_whole_cart(self):
+        data = self.check(address_id=self.address.id).json()
+        self.assertEqual((data["pincode"], data["city"]), ("560001", "Bengaluru"))
+        self.assertTrue(data["deliverable"])
+        self.assertFalse(data["cod_available"])
+        self.assertEqual(data["eta_days"], 5)
+        self.assertEqual(
+            [(line["in_stock"], line["message"]) for line in data["items"]],
+            [(True, ""), (False, "Out of stock at your location")],
+        )
+
+    def test_undeliverable_line_blocks_cart(self):
+        CartItem.objects.create(cart=self.user.cart, product=self.products[2], size=None)
+        data = self.check(pincode="560001").json()
+        self.assertFalse(data["deliverable"])
+        self.assertIsNone(data["estimated_delivery"])
+        self.assertEqual(data["items"][-1]["message"], "Not deliverable to this pincode")
+
+    def test_unserviceable_pincode(self):
+        data = self.check(pincode="110001").json()
+        self.assertFalse(data["serviceable"])
+        self.assertEqual({line["message"] for line in data["items"]}, {"We do not deliver to this pincode"})
+
+    def test_bad_input(self):
+        self.assertEqual(self.check(pincode="5600").status_code, 400)
+        other = User.objects.create_user("other", password="x")
+        address = Address.objects.create(
+            user=other, name="Other", mobile="8888888888", pincode="560001",
+            area="Area", address_line="2 Road", city="Bengaluru", state="KA",
+        )
+        self.assertEqual(self.check(address_id=address.id).status_code, 400)
+
+    def test_query_budget(self):
+        self.check(pincode="560001")        # loads the serviceability index
+        # cart, cart items + product; availability comes from the index
+        with self.assertNumQueries(2):
+            self.assertEqual(self.check(pincode="560001").status_code, 200)
+
+
+# ---------------- SIMILAR PRODUCTS ----------------
+
+class SimilarProductsTests(OrderTestCase):
+
+    def ids(self, *indexes):
+        return [self.products[i].id for i in indexes]
+
+    def ranked(self, index=0):
+        ranked = similar.rank_category(self.clothing.id, similar.copurchase_counts())
+        return ranked[self.products[index].id]
+
+    def test_rank_category(self):
+        # subcategory + brand + price band: Straight (Levis jeans, same price) first;
+        # Oxford Shirt shares nothing but the category and stays out
+        self.assertEqual(self.ranked(), self.ids(1, 2, 5, 3))
+
+    def test_copurchases_lift_and_add_candidates(self):
+        self.order((self.products[0], 1), (self.products[3], 1))
+        self.order((self.products[0], 1), (self.products[3], 1), (self.products[4], 1))
+        # cancelled orders say nothing about taste
+        self.order((self.products[0], 1), (self.products[5], 1), status="CANCELLED")
+        self.assertEqual(self.ranked(), self.ids(1, 3, 2, 5, 4))
+
+    def test_similar_listings(self):
+        # not built yet: same brand + subcategory
+        self.assertEqual([l.pk for l in similar.similar_listings(self.products[0])], self.ids(1))
+        self.assertEqual(similar.build_all(), len(self.products))
+        self.assertEqual([l.pk for l in similar.similar_listings(self.products[0], limit=3)], self.ids(1, 2, 5))
+
+    def test_refresh_changed(self):
+        similar.build_all()
+        self.assertEqual(similar.refresh_changed(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            new = Product.objects.create(
+                name="Bootcut Jeans", brand=self.levis, category=self.clothing, subcategory=self.jeans,
+                price=Decimal("2499"), discount_price=Decimal("1999"), stock=5,
+            )
+            ProductSize.objects.create(product=new, size="32", stock=3)
+        # every jeans product may now list it, plus the new product itself
+        self.assertEqual(similar.refresh_changed(), 5)
+        self.assertEqual(similar.similar_listings(self.products[0])[0].pk, new.id)
+        self.assertEqual(similar.similar_listings(self.products[4])[0].pk, self.products[5].id)
+
+        self.order((self.products[4], 1), (self.products[5], 1))
+        self.assertEqual(similar.refresh_changed(), 2)
+
+
+# ---------------- RATING SUMMARIES ----------------
+
+class RatingSummaryTests(OrderTestCase):
+
+    def rate(self, product, stars):
+        item = self.order((product, 1), status="DELIVERED").items.get()
+        return ProductRating.objects.create(user=self.user, product=product, order_item=item, rating=stars)
+
+    def summary(self, product):
+        s = ProductRatingSummary.objects.get(pk=product.pk)
+        return s.count, s.total, s.histogram
+
+    def test_create_edit_delete(self):
+        p = self.products[1]
+        first = self.rate(p, 5)
+        self.rate(p, 3)
+        self.assertEqual(self.summary(p), (2, 8, {"5": 1, "4": 0, "3": 1, "2": 0, "1": 0}))
+        listing = ProductListing.objects.get(pk=p.pk)
+        self.assertEqual((listing.rating_avg, listing.rating_count), (Decimal("4.00"), 2))
+
+        first.rating = 4
+        first.save()
+        self.assertEqual(self.summary(p), (2, 7, {"5": 0, "4": 1, "3": 1, "2": 0, "1": 0}))
+
+        first.delete()
+        self.assertEqual(self.summary(p)[:2], (1, 3))
+        self.assertEqual(ProductListing.objects.get(pk=p.pk).rating_avg, Decimal("3.00"))
+
+    def test_out_of_range_rating_is_not_counted(self):
+        p = self.products[1]
+        self.rate(p, 0)
+        self.assertFalse(ProductRatingSummary.objects.filter(pk=p.pk).exists())
+        self.assertEqual(ProductListing.objects.get(pk=p.pk).rating_count, 0)
+
+    def test_rebuild_matches_incremental(self):
+        p, q = self.products[1], self.products[3]
+        self.rate(p, 2)
+        self.rate(p, 4)
+        self.rate(q, 1)
+        incremental = {x.pk: self.summary(x) for x in (p, q)}
+
+        ProductRatingSummary.objects.all().delete()
+        rebuild_summaries()
+        self.assertEqual({x.pk: self.summary(x) for x in (p, q)}, incremental)
+        self.assertEqual(ProductListing.objects.get(pk=q.pk).rating_count, 1)
+
+
+# ---------------- SALES COUNTERS ----------------
+
+class SalesCounterTests(OrderTestCase):
+
+    def units(self, product):
+        return sum(ProductSalesDaily.objects.filter(product=product).values_list("units", flat=True))
+
+    def test_counted_once_confirmed_and_taken_back_on_cancel(self):
+        p = self.products[2]
+        order = self.order((p, 2))
+        self.assertEqual(self.units(p), 0)
+
+        self.set_status(order, "CONFIRMED")
+        self.set_status(order, "SHIPPED")
+        self.assertEqual(self.units(p), 2)
+
+        self.set_status(order, "CANCELLED")
+        self.assertEqual(self.units(p), 0)
+
+    def test_update_popularity_copies_to_listing(self):
+        p = self.products[2]
+        self.set_status(self.order((p, 6)), "CONFIRMED")
+        update_popularity()
+
+        listing = ProductListing.objects.get(pk=p.pk)
+        self.assertEqual((listing.sold_7d, listing.sold_30d, listing.is_bestseller), (6, 6, True))
+        self.assertGreater(listing.popularity, 0)
+        self.assertFalse(ProductListing.objects.get(pk=self.products[0].pk).is_bestseller)
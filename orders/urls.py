@@ -8,6 +8,7 @@ urlpatterns = [
 
     # -------- APIs --------
     path("create/", views.create_order, name="create_order"),
+    path("deliverability/", views.cart_deliverability, name="cart_deliverability"),
     path("my/", views.my_orders, name="my_orders"),
     path("payment/", views.create_payment, name="create_payment"),
     path("detail/<int:order_id>/", views.order_detail_api, name="order_detail_api"),
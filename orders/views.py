@@ -21,7 +21,9 @@ from .serializers import OrderSerializer
 from users.models import Address
 from cart.models import Cart, CartItem
 from .jwt_utils import get_jwt_user_from_cookie
-from products.models import ProductPincodeAvailability
+from ajio.query_budget import query_budget, unbudgeted
+from django.db.models import Prefetch, prefetch_related_objects
+from products.serviceability import check_availability, pincode_info
 
 
 # -------------------------
@@ -136,24 +138,19 @@ def normalize_order_size(cart_item) -> str:
 
 def compute_eta_days(cart_items, pincode):
     """
-    Get ETA from ProductPincodeAvailability
+    Get ETA from the in-memory pincode index (products.serviceability)
     Take max eta_days among items
     """
-    product_ids = list(cart_items.values_list("product_id", flat=True))
+    product_ids = list({item.product_id for item in cart_items})
 
-    qs = ProductPincodeAvailability.objects.filter(
-        product_id__in=product_ids,
-        pincode__pincode=str(pincode),
-        is_available=True
-    )
-
-    availability_map = {x.product_id: x for x in qs}
+    availability_map = check_availability(product_ids, pincode)
 
     for pid in product_ids:
-        if pid not in availability_map:
+        avail = availability_map.get(pid)
+        if avail is None or not avail.is_available:
             raise ValueError("Product not deliverable to this pincode")
 
-    return max(int(availability_map[pid].eta_days or 3) for pid in product_ids)
+    return max(availability_map[pid].eta_days or 3 for pid in product_ids)
 
 
 def calculate_order_breakup(cart_items):
@@ -253,6 +250,79 @@ def payment_page(request):
 # APIs
 # -------------------------
 
+@api_view(["GET"])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+@query_budget(3)
+def cart_deliverability(request):
+    """
+    ?pincode=560001 or ?address_id=5
+    Per cart line availability / COD / ETA for one pincode, plus the
+    whole-cart verdict that create_order will apply.
+    """
+    address_id = request.GET.get("address_id")
+    if address_id:
+        if not str(address_id).isdigit():
+            return Response({"error": "Invalid address"}, status=400)
+        address = Address.objects.filter(id=int(address_id), user=request.user).first()
+        if not address:
+            return Response({"error": "Invalid address"}, status=400)
+        pincode = (address.pincode or "").strip()
+    else:
+        pincode = (request.GET.get("pincode") or "").strip()
+
+    if len(pincode) != 6 or not pincode.isdigit():
+        return Response({"error": "Enter valid 6 digit pincode"}, status=400)
+
+    cart_items = list(get_cart_items(request.user).order_by("id"))
+    info = pincode_info(pincode)
+    availability = check_availability({item.product_id for item in cart_items}, pincode)
+
+    items = []
+    for item in cart_items:
+        avail = availability.get(item.product_id)
+        line = {
+            "item_id": item.id,
+            "product_id": item.product_id,
+            "name": item.product.name,
+            "quantity": item.quantity,
+            "deliverable": False,
+            "in_stock": False,
+            "cod_available": False,
+            "eta_days": None,
+        }
+        if not info:
+            line["message"] = "We do not deliver to this pincode"
+        elif avail is None or not avail.is_available:
+            line["message"] = "Not deliverable to this pincode"
+        else:
+            line.update(
+                deliverable=True,
+                in_stock=avail.stock > 0,
+                cod_available=avail.cod_available,
+                eta_days=avail.eta_days or 3,
+            )
+            line["message"] = "" if avail.stock > 0 else "Out of stock at your location"
+        items.append(line)
+
+    deliverable = bool(items) and all(line["deliverable"] for line in items)
+    eta_days = max(line["eta_days"] for line in items) if deliverable else None
+
+    return Response({
+        "pincode": pincode,
+        "serviceable": bool(info),
+        "city": info[0] if info else None,
+        "state": info[1] if info else None,
+        "deliverable": deliverable,
+        "cod_available": deliverable and all(line["cod_available"] for line in items),
+        "eta_days": eta_days,
+        "estimated_delivery": (
+            timezone.localdate() + timedelta(days=eta_days) if deliverable else None
+        ),
+        "items": items,
+    })
+
+
 @api_view(["POST"])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
@@ -313,12 +383,27 @@ def create_order(request):
 @api_view(["GET"])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
+@query_budget(5)
 def my_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by("-created_at")
+    orders = list(
+        Order.objects
+        .filter(user=request.user)
+        .select_related("address")
+        .order_by("-created_at")
+    )
 
-    # auto update each order
-    for o in orders:
-        auto_update_order_status(o)
+    # auto update each order (status catch-up writes happen once per order)
+    with unbudgeted():
+        for o in orders:
+            auto_update_order_status(o)
+
+    # prefetch after the status updates so the timeline includes them
+    prefetch_related_objects(
+        orders,
+        Prefetch("items", queryset=OrderItem.objects.select_related("product", "productrating")),
+        "items__product__images",
+        "status_history",
+    )
 
     data = OrderSerializer(orders, many=True, context={"request": request}).data
 
@@ -0,0 +1,124 @@
+"""
+Catalog version + HTTP caching for catalog APIs.
+
+Every save/delete on a products model bumps CatalogVersion (once per
+transaction, after commit), except stock-only ProductSize saves that do
+not take a size in or out of stock (products/signals.py). Views wrapped with @catalog_cache get an ETag
+and Last-Modified derived from it, answer If-None-Match / If-Modified-Since
+with 304 without running the view, and keep full response data in the
+Django cache keyed by version + canonical URL.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+from .models import CatalogVersion
+
+
+# ---------------- VERSION ----------------
+
+_memo = {"version": None, "updated_at": None, "fetched": 0.0}
+
+
+def _load_version():
+    row, _ = CatalogVersion.objects.get_or_create(pk=1)
+    _memo.update(version=row.version, updated_at=row.updated_at, fetched=time.monotonic())
+
+
+def get_catalog_version():
+    """
+    (version, updated_at). Re-read from the DB at most every
+    CATALOG_VERSION_TTL seconds, so 304s normally cost no query.
+    Other workers see a bump within that TTL.
+    """
+    ttl = getattr(settings, "CATALOG_VERSION_TTL", 2)
+    if _memo["version"] is None or time.monotonic() - _memo["fetched"] > ttl:
+        _load_version()
+    return _memo["version"], _memo["updated_at"]
+
+
+def bump_catalog_version():
+    # one bump per transaction (admin saves a product + all inlines together); only a
+    # callback at the current savepoint level counts, so savepoints get their own
+    conn = transaction.get_connection()
+    if conn.in_atomic_block:
+        level = set(conn.savepoint_ids)
+        if any(sids == level and func is _bump for sids, func, *_ in conn.run_on_commit):
+            return
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    updated = CatalogVersion.objects.filter(pk=1).update(
+        version=F("version") + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+    _load_version()
+
+
+# ---------------- HTTP CACHE ----------------
+
+def _canonical_url(request):
+    """ Same resource -> same key, whatever the query param order. """
+    params = []
+    for key in sorted(request.GET):
+        for value in sorted(request.GET.getlist(key)):
+            params.append(f"{key}={value}")
+    return f"{request.build_absolute_uri(request.path)}?{'&'.join(params)}"
+
+
+def _not_modified(request, etag, changed_at):
+    inm = request.headers.get("If-None-Match")
+    if inm:
+        tags = [t.strip() for t in inm.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    ims = parse_http_date_safe(request.headers.get("If-Modified-Since") or "")
+    return ims is not None and int(changed_at.timestamp()) <= ims
+
+
+def catalog_cache(view):
+    """
+    Put under @api_view / @permission_classes so auth rules still apply.
+    Only 200 GET responses are stored.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+
+        version, changed_at = get_catalog_version()
+        digest = hashlib.sha1(_canonical_url(request).encode()).hexdigest()[:20]
+        etag = f'"{version}-{digest}"'
+
+        def finish(response):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(changed_at.timestamp())
+            patch_cache_control(response, no_cache=True)   # always revalidate, 304 is cheap
+            return response
+
+        if _not_modified(request, etag, changed_at):
+            return finish(Response(status=304))
+
+        key = f"catalog:{version}:{digest}"
+        data = cache.get(key)
+        if data is not None:
+            return finish(Response(data))
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, "CATALOG_CACHE_SECONDS", 300))
+            finish(response)
+        return response
+
+    return wrapped
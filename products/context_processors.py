@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .taxonomy import get_taxonomy
+
+
+def nav_taxonomy(request):
+    """
+    {{ nav_taxonomy.men.categories }} etc. in any template. Lazy and served
+    from the per-worker taxonomy map, so pages cost no query for it.
+    """
+    return {"nav_taxonomy": SimpleLazyObject(get_taxonomy().nav_by_slug)}
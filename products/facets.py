@@ -0,0 +1,407 @@
+"""
+Bitmap facet engine for the PLP sidebar.
+
+Per category, every product gets a dense bit position; each facet value
+(brand, color, size, subcategory, price bucket, discount bucket) is a
+Python int used as a bitset. Disjunctive counts for the active selection
+are then a few AND/ORs and int.bit_count(), with no per-page DB work.
+
+Price and discount buckets are not fixed: per subcategory, price edges are
+payable-price quantiles rounded to round rupee amounts and discount
+thresholds follow the discount quartiles. They are computed once per
+subcategory from the bitset build and dropped with it.
+
+A category's bitsets are dropped when its listing rows are added, removed,
+or change a facet column (ProductListing.facets_changed_at); stock, rating
+and popularity updates leave them alone.
+"""
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from ajio.query_budget import unbudgeted
+
+from .listing import sizes_from_mask, unpack_ids
+from .models import Color, ProductListing, ProductSize, SubCategory
+
+
+PRICE_BUCKETS = 5          # at most; fewer when prices are bunched together
+DISCOUNT_BUCKETS = 4
+HISTOGRAM_BINS = 20
+
+SIZE_ORDER = [code for code, _ in ProductSize.SIZE_CHOICES]
+
+
+def _bitset(positions, size):
+    """ int with the given bit positions set, built in one pass (no growing-int ORs) """
+    buf = bytearray((size + 7) // 8)
+    for i in positions:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _or_all(bitsets):
+    out = 0
+    for b in bitsets:
+        out |= b
+    return out
+
+
+def _round_price(value):
+    """ Quantile edge -> a round rupee amount a shopper would pick. """
+    step = 100 if value < 2000 else 500 if value < 10000 else 1000
+    return int((value + step // 2) // step * step)
+
+
+def _quantiles(values, n):
+    """ n - 1 inner cut points of a sorted list """
+    return [values[len(values) * i // n] for i in range(1, n)]
+
+
+def price_edges(prices, n=PRICE_BUCKETS):
+    """ Sorted payable prices -> ascending int bucket edges (buckets are [edge_i, edge_i+1)). """
+    if not prices:
+        return []
+    edges = []
+    for q in _quantiles(prices, n):
+        edge = _round_price(q)
+        if prices[0] < edge <= prices[-1] and (not edges or edge > edges[-1]):
+            edges.append(edge)
+    return edges
+
+
+def discount_thresholds(discounts, n=DISCOUNT_BUCKETS):
+    """ Sorted positive discounts -> ascending "X% and above" thresholds (multiples of 10). """
+    if not discounts:
+        return []
+    out = []
+    for q in [discounts[0], *_quantiles(discounts, n)]:
+        t = int(q) // 10 * 10
+        if t > 0 and t not in out:
+            out.append(t)
+    return sorted(out)
+
+
+def _price_label(lo, hi):
+    if lo is None:
+        return f"Below Rs.{hi}"
+    if hi is None:
+        return f"Rs.{lo} and above"
+    return f"Rs.{lo}-{hi - 1}"
+
+
+class CategoryFacets:
+    """ All bitsets for one category (built from ProductListing in one query). """
+
+    def __init__(self, category_id, color_names):
+        self.category_id = category_id
+        self.ids = []               # bit position -> product id
+        self.pos = {}               # product id -> bit position
+        self.payable = []           # bit position -> payable price
+        self.discount = []          # bit position -> discount percent
+
+        self.subcats = {}           # subcategory id -> bits
+        self.brands = {}            # brand slug -> bits
+        self.brand_names = {}       # brand slug -> name
+        self.colors = {}            # color name -> bits
+        self.sizes = {}             # size code -> bits
+
+        self._range_cache = {}      # ("price" | "discount", min, max) -> bits, bucket bounds only
+        self._bucket_ranges = set() # keys buckets() has handed out
+        self._buckets = {}          # subcategory id -> (price buckets, discount buckets)
+
+        rows = (
+            ProductListing.objects
+            .filter(category_id=category_id)
+            .order_by("pk")
+            .values_list(
+                "pk", "subcategory_id", "brand_slug", "brand_name",
+                "size_mask", "color_ids", "payable_price", "discount_percent",
+            )
+        )
+        # positions per facet value first, then one bitset each
+        subcats, brands, colors, sizes = {}, {}, {}, {}
+        for pid, subcat_id, brand_slug, brand_name, size_mask, color_ids, payable, discount in rows:
+            i = len(self.ids)
+            self.pos[pid] = i
+            self.ids.append(pid)
+            self.payable.append(payable)
+            self.discount.append(discount)
+
+            subcats.setdefault(subcat_id, []).append(i)
+            if brand_slug:
+                brands.setdefault(brand_slug, []).append(i)
+                self.brand_names[brand_slug] = brand_name
+            for cid in unpack_ids(color_ids):
+                name = color_names.get(cid)
+                if name:
+                    colors.setdefault(name, []).append(i)
+            for code in sizes_from_mask(size_mask):
+                sizes.setdefault(code, []).append(i)
+
+        n = len(self.ids)
+        self.subcats = {k: _bitset(v, n) for k, v in subcats.items()}
+        self.brands = {k: _bitset(v, n) for k, v in brands.items()}
+        self.colors = {k: _bitset(v, n) for k, v in colors.items()}
+        self.sizes = {k: _bitset(v, n) for k, v in sizes.items()}
+
+        # sidebar subcategory links (names cached with the bitsets)
+        self.subcat_list = list(
+            SubCategory.objects.filter(category_id=category_id)
+            .order_by("name")
+            .values("id", "name", "slug")
+        )
+
+    # ----- range bitsets -----
+    # only the engine's own bucket bounds are cached: ?min_price= etc. can take
+    # any value, and keeping each one would grow the worker without limit
+
+    def _range_bits(self, key, positions):
+        bits = self._range_cache.get(key)
+        if bits is None:
+            bits = _bitset(positions, len(self.ids))
+            if key in self._bucket_ranges:
+                self._range_cache[key] = bits
+        return bits
+
+    def price_bits(self, min_price, max_price):
+        """ min_price <= payable <= max_price (either may be None) """
+        return self._range_bits(("price", min_price, max_price), (
+            i for i, price in enumerate(self.payable)
+            if (min_price is None or price >= min_price) and (max_price is None or price <= max_price)
+        ))
+
+    def discount_bits(self, min_offer, max_offer):
+        return self._range_bits(("discount", min_offer, max_offer), (
+            i for i, pct in enumerate(self.discount)
+            if pct > 0 and (min_offer is None or pct >= min_offer) and (max_offer is None or pct <= max_offer)
+        ))
+
+    @staticmethod
+    def _positions(bits):
+        """ set bit positions, lowest first """
+        for i, ch in enumerate(reversed(bin(bits)[2:])):
+            if ch == "1":
+                yield i
+
+    def buckets(self, subcategory_id):
+        """
+        (price buckets, discount buckets) for a subcategory, from its own
+        price / discount distribution. Each bucket keeps its filter bounds;
+        the counts are filled in by counts().
+        """
+        cached = self._buckets.get(subcategory_id)
+        if cached is not None:
+            return cached
+
+        positions = list(self._positions(self.subcats.get(subcategory_id, 0)))
+        prices = sorted(self.payable[i] for i in positions)
+        discounts = sorted(self.discount[i] for i in positions if self.discount[i] > 0)
+
+        bounds = [None, *price_edges(prices), None]
+        price_buckets = []
+        for lo, hi in zip(bounds, bounds[1:]):
+            if lo is None and hi is None:
+                break           # one price level: nothing to choose between
+            price_buckets.append({
+                "label": _price_label(lo, hi),
+                "value": f"{lo if lo is not None else ''}-{hi if hi is not None else ''}",
+                "min": Decimal(lo) if lo is not None else None,
+                "max": Decimal(hi) - Decimal("0.01") if hi is not None else None,
+            })
+
+        discount_buckets = [
+            {"label": f"{t}% and above", "value": str(t), "min": Decimal(t)}
+            for t in discount_thresholds(discounts)
+        ]
+
+        self._bucket_ranges.update(("price", b["min"], b["max"]) for b in price_buckets)
+        self._bucket_ranges.update(("discount", b["min"], None) for b in discount_buckets)
+        self._buckets[subcategory_id] = (price_buckets, discount_buckets)
+        return price_buckets, discount_buckets
+
+    def histogram(self, subcategory_id, selection, bins=HISTOGRAM_BINS):
+        """
+        Payable-price histogram for a range slider: equal-width bins over
+        the subcategory's price range, counting products that pass every
+        active filter except price.
+        """
+        scope = self.subcats.get(subcategory_id, 0)
+        positions = list(self._positions(scope))
+        if not positions:
+            return {"min": None, "max": None, "bins": []}
+
+        low = min(self.payable[i] for i in positions)
+        high = max(self.payable[i] for i in positions)
+        width = max((high - low) / bins, Decimal("1"))
+        edges = [low + width * k for k in range(1, bins)]
+
+        counts = [0] * bins
+        base = self._filter_bits(subcategory_id, selection, skip="price")
+        for i in self._positions(base):
+            counts[min(bisect_right(edges, self.payable[i]), bins - 1)] += 1
+
+        bounds = [low, *edges, high]
+        return {
+            "min": str(low),
+            "max": str(high),
+            "bins": [
+                {"min": str(bounds[k].quantize(Decimal("0.01"))), "max": str(bounds[k + 1].quantize(Decimal("0.01"))),
+                 "cnt": counts[k]}
+                for k in range(bins)
+            ],
+        }
+
+    def ids_bits(self, product_ids):
+        pos = self.pos
+        return _bitset((pos[pid] for pid in product_ids if pid in pos), len(self.ids))
+
+    # ----- counts -----
+
+    def _active(self, selection):
+        """ filter bitset per facet (all ones when inactive) """
+        brands = selection.get("brands") or []
+        colors = selection.get("colors") or []
+        sizes = selection.get("sizes") or []
+        min_price, max_price = selection.get("min_price"), selection.get("max_price")
+        min_offer, max_offer = selection.get("min_offer"), selection.get("max_offer")
+        return {
+            "brand": _or_all(self.brands.get(v, 0) for v in brands) if brands else -1,
+            "color": _or_all(self.colors.get(v, 0) for v in colors) if colors else -1,
+            "size": _or_all(self.sizes.get(v, 0) for v in sizes) if sizes else -1,
+            "price": (
+                self.price_bits(min_price, max_price)
+                if (min_price is not None or max_price is not None) else -1
+            ),
+            "discount": (
+                self.discount_bits(min_offer, max_offer)
+                if (min_offer is not None or max_offer is not None) else -1
+            ),
+        }
+
+    def _filter_bits(self, subcategory_id, selection, skip=None, active=None):
+        """ products in scope passing every active filter except `skip` """
+        bits = self.subcats.get(subcategory_id, 0)
+        if selection.get("ids") is not None:
+            bits &= self.ids_bits(selection["ids"])
+        for name, f in (active or self._active(selection)).items():
+            if name != skip:
+                bits &= f
+        return bits
+
+    def counts(self, subcategory_id, selection):
+        """
+        selection: brands / colors / sizes (lists), min_price / max_price /
+        min_offer / max_offer (Decimal or None), ids (search hits or None).
+
+        Disjunctive: each facet's counts apply every *other* active filter,
+        so ticking another value in the same facet shows what it would add.
+        """
+        brands = selection.get("brands") or []
+        colors = selection.get("colors") or []
+        sizes = selection.get("sizes") or []
+        active = self._active(selection)
+
+        def others(facet):
+            return self._filter_bits(subcategory_id, selection, skip=facet, active=active)
+
+        def value_counts(facet, bitsets, selected):
+            base = others(facet)
+            out = {}
+            for value, bits in bitsets.items():
+                cnt = (bits & base).bit_count()
+                if cnt or value in selected:
+                    out[value] = cnt
+            return out
+
+        brand_counts = value_counts("brand", self.brands, set(brands))
+        color_counts = value_counts("color", self.colors, set(colors))
+        size_counts = value_counts("size", self.sizes, set(sizes))
+
+        price_base = others("price")
+        discount_base = others("discount")
+        price_buckets, discount_buckets = self.buckets(subcategory_id)
+
+        return {
+            "total": others(None).bit_count(),
+            "brands": [
+                {"brand_name": self.brand_names[slug], "brand_slug": slug, "cnt": cnt}
+                for slug, cnt in sorted(brand_counts.items(), key=lambda kv: self.brand_names[kv[0]])
+            ],
+            "colors": [{"value": v, "cnt": c} for v, c in sorted(color_counts.items())],
+            "sizes": [
+                {"value": v, "cnt": c}
+                for v, c in sorted(
+                    size_counts.items(),
+                    key=lambda kv: SIZE_ORDER.index(kv[0]) if kv[0] in SIZE_ORDER else len(SIZE_ORDER),
+                )
+            ],
+            "price_buckets": [
+                {**b, "cnt": (self.price_bits(b["min"], b["max"]) & price_base).bit_count()}
+                for b in price_buckets
+            ],
+            "discount_buckets": [
+                {**b, "cnt": (self.discount_bits(b["min"], None) & discount_base).bit_count()}
+                for b in discount_buckets
+            ],
+        }
+
+    def subcat_facets(self):
+        """ [{"name", "slug", "cnt"}] for every subcategory of the category. """
+        return [
+            {"name": sc["name"], "slug": sc["slug"], "cnt": self.subcats.get(sc["id"], 0).bit_count()}
+            for sc in self.subcat_list
+        ]
+
+
+class FacetEngine:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.categories = {}        # category id -> CategoryFacets
+        self.color_names = None
+        self.stamps = None          # category id -> (listing rows, max facets_changed_at)
+        self.checked_at = 0.0
+
+    def _check_version(self):
+        interval = getattr(settings, "SEARCH_SYNC_SECONDS", 5)
+        if self.stamps is not None and time.monotonic() - self.checked_at < interval:
+            return
+        self.checked_at = time.monotonic()
+        stamps = {
+            cid: (n, changed) for cid, n, changed in
+            ProductListing.objects.values("category_id")
+            .annotate(n=Count("pk"), changed=Max("facets_changed_at"))
+            .order_by()
+            .values_list("category_id", "n", "changed")
+        }
+        # drop only the categories that changed; they rebuild lazily on next view
+        stale = [cid for cid in self.categories if stamps.get(cid) != (self.stamps or {}).get(cid)]
+        for cid in stale:
+            del self.categories[cid]
+        if stale:
+            self.color_names = None
+        self.stamps = stamps
+
+    def get(self, category_id):
+        with self.lock:
+            self._check_version()
+            facets = self.categories.get(category_id)
+            if facets is None:
+                with unbudgeted():
+                    if self.color_names is None:
+                        self.color_names = dict(Color.objects.values_list("id", "name"))
+                    facets = CategoryFacets(category_id, self.color_names)
+                self.categories[category_id] = facets
+            return facets
+
+
+_engine = FacetEngine()
+
+
+def get_category_facets(category_id):
+    return _engine.get(category_id)
+
@@ -0,0 +1,188 @@
+"""
+Streaming product feeds for marketplaces / ads (Google Shopping style).
+
+    feed_items(base_url, since=None)   -> dict per product, constant memory
+    render(items, fmt)                 -> str chunks of an xml / csv / ndjson document
+    encode_chunks(chunks)              -> UTF-8 bytes in ~64 KB blocks
+    gzip_chunks(blocks)                -> the same, gzip-compressed on the fly
+
+Products are walked with .iterator(chunk_size) so images and sizes are
+prefetched one chunk at a time. A delta feed (since=datetime) only has
+products whose ProductListing row changed since then; the listing is
+refreshed on every product, size, image, variant and brand change, so its
+updated_at is the product's "last changed" time.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+from xml.sax.saxutils import escape
+
+from django.db.models import Max, Prefetch
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .images import derivative_url
+from .models import Product, ProductImage, ProductListing
+
+
+FORMATS = {
+    "xml": "application/xml; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+COLUMNS = (
+    "id", "title", "description", "brand", "link", "image_link", "additional_image_link",
+    "price", "sale_price", "availability", "stock", "product_type", "updated",
+)
+
+CHUNK_SIZE = 1000
+ADDITIONAL_IMAGES = 10      # Google Shopping limit
+
+
+def parse_since(value):
+    """ ISO datetime or date -> aware datetime; ValueError when unparseable """
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(f"bad timestamp {value!r}")
+        dt = datetime.combine(d, dt_time.min)
+    return timezone.make_aware(dt, dt_timezone.utc) if timezone.is_naive(dt) else dt
+
+
+def feed_watermark():
+    """ Pass as since= next time to get only what changed after this feed. """
+    return ProductListing.objects.aggregate(m=Max("updated_at"))["m"]
+
+
+def feed_queryset(since=None):
+    qs = (
+        Product.objects
+        .select_related("brand", "category", "subcategory", "listing")
+        .prefetch_related(
+            Prefetch("images", queryset=ProductImage.objects.order_by("id")),
+            "sizes",
+        )
+        .order_by("id")
+    )
+    if since is not None:
+        qs = qs.filter(listing__updated_at__gt=since)
+    return qs
+
+
+def _image(base_url, im):
+    return base_url + derivative_url(im.image_hash, "zoom", fallback=im.image.url)
+
+
+def feed_items(base_url, since=None, chunk_size=CHUNK_SIZE):
+    base_url = base_url.rstrip("/")
+    for p in feed_queryset(since).iterator(chunk_size=chunk_size):
+        images = [im for im in p.images.all() if im.image]
+        sizes = list(p.sizes.all())
+        stock = sum(s.stock for s in sizes) if sizes else p.stock
+        listing = getattr(p, "listing", None)
+
+        yield {
+            "id": p.id,
+            "title": p.name,
+            "description": p.description,
+            "brand": p.brand.name,
+            "link": base_url + reverse("product_detail", args=[p.id]),
+            "image_link": _image(base_url, images[0]) if images else "",
+            "additional_image_link": [_image(base_url, im) for im in images[1:1 + ADDITIONAL_IMAGES]],
+            "price": f"{p.price:.2f} INR",
+            # only when discounted; a sale_price equal to price reads as a fake sale
+            "sale_price": f"{p.payable_price:.2f} INR" if p.payable_price < p.price else "",
+            "availability": "in_stock" if stock > 0 else "out_of_stock",
+            "stock": stock,
+            "product_type": f"{p.category.name} > {p.subcategory.name}",
+            "updated": (listing.updated_at if listing else p.created_at).isoformat(),
+        }
+
+
+# ---------------- WRITERS ----------------
+
+def _xml(items, title, link):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0">\n<channel>\n'
+        f"<title>{escape(title)}</title>\n<link>{escape(link)}</link>\n"
+    )
+    for item in items:
+        parts = ["<item>"]
+        for key in COLUMNS:
+            value = item[key]
+            if key == "title":
+                parts.append(f"<title>{escape(value)}</title>")
+            elif key == "link":
+                parts.append(f"<link>{escape(value)}</link>")
+            elif key == "description":
+                parts.append(f"<description>{escape(value)}</description>")
+            elif key == "additional_image_link":
+                parts.extend(f"<g:additional_image_link>{escape(v)}</g:additional_image_link>" for v in value)
+            elif key == "updated" or (key == "sale_price" and not value):
+                continue
+            else:
+                parts.append(f"<g:{key}>{escape(str(value))}</g:{key}>")
+        parts.append("</item>\n")
+        yield "".join(parts)
+    yield "</channel>\n</rss>\n"
+
+
+def _csv(items):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for item in items:
+        writer.writerow([
+            ",".join(item[c]) if c == "additional_image_link" else item[c] for c in COLUMNS
+        ])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+def _ndjson(items):
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
+
+
+def render(items, fmt, title="Catalog", link=""):
+    if fmt == "xml":
+        return _xml(items, title, link)
+    if fmt == "csv":
+        return _csv(items)
+    if fmt == "ndjson":
+        return _ndjson(items)
+    raise ValueError(f"unknown feed format {fmt!r}")
+
+
+def encode_chunks(chunks, min_size=64 * 1024):
+    """ str chunks -> UTF-8 bytes in blocks of at least min_size (fewer tiny writes) """
+    pending, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode("utf-8")
+        pending.append(data)
+        size += len(data)
+        if size >= min_size:
+            yield b"".join(pending)
+            pending, size = [], 0
+    if pending:
+        yield b"".join(pending)
+
+
+def gzip_chunks(blocks, level=6):
+    """ bytes blocks -> one gzip stream, emitted as it is produced """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        out = compressor.compress(block)
+        if out:
+            yield out
+    yield compressor.flush()
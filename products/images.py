@@ -0,0 +1,247 @@
+"""
+Responsive image derivatives for ProductImage / VariantImage.
+
+Every uploaded photo is resized to fixed widths (thumb / card / zoom) in
+WebP and JPEG. Files are named after a hash of the original's bytes, so a
+URL never changes content and can be cached forever; re-uploading the
+same photo reuses the files already on disk.
+
+Resizing runs in a small process pool after the upload commits. When it
+finishes, image_hash is stored on the row and the listing is refreshed,
+so PLP cards, cart, search and the PDP switch from the original to the
+derivatives. Until then (or if Pillow fails) everything falls back to the
+original file. build_image_derivatives covers existing media.
+"""
+import hashlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+# name -> target width in px (never upscaled)
+WIDTHS = {
+    "thumb": 160,
+    "card": 400,
+    "zoom": 1200,
+}
+
+# format -> (extension, Pillow save kwargs)
+FORMATS = {
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+
+DERIVED_DIR = "derived"
+HASH_LENGTH = 20
+
+
+# ---------------- NAMES / URLS ----------------
+
+def derivative_name(image_hash, size, fmt="jpeg"):
+    """ derived/ab/ab12...-400w.jpg (storage path) """
+    ext = FORMATS[fmt][0]
+    return f"{DERIVED_DIR}/{image_hash[:2]}/{image_hash}-{WIDTHS[size]}w.{ext}"
+
+
+def derivative_url(image_hash, size, fmt="jpeg", fallback=""):
+    if not image_hash:
+        return fallback
+    return default_storage.url(derivative_name(image_hash, size, fmt))
+
+
+def srcset(image_hash, fmt="webp", sizes=("thumb", "card", "zoom")):
+    """ "…-160w.webp 160w, …-400w.webp 400w, …" or "" when not generated yet """
+    if not image_hash:
+        return ""
+    return ", ".join(
+        f"{default_storage.url(derivative_name(image_hash, size, fmt))} {WIDTHS[size]}w"
+        for size in sizes
+    )
+
+
+def image_urls(name, image_hash, size="card"):
+    """
+    Everything a card / gallery needs for one photo:
+    {"url", "webp_srcset", "jpeg_srcset"}. url is the JPEG at `size`,
+    or the original while derivatives are missing.
+    """
+    original = default_storage.url(name) if name else ""
+    return {
+        "url": derivative_url(image_hash, size, "jpeg", fallback=original),
+        "webp_srcset": srcset(image_hash, "webp"),
+        "jpeg_srcset": srcset(image_hash, "jpeg"),
+    }
+
+
+# ---------------- RENDER (runs in worker processes) ----------------
+
+def _to_rgb(im):
+    if im.mode == "RGB":
+        return im
+    if im.mode not in ("RGBA", "LA", "P", "PA"):
+        return im.convert("RGB")
+    # flatten transparency onto white (product shots)
+    rgba = im.convert("RGBA")
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.split()[-1])
+    return background
+
+
+def render_derivatives(name):
+    """
+    Read one original from storage, write any missing derivatives and
+    return its content hash ("" when the file can't be read as an image).
+    Top level + plain arguments so it can run in a ProcessPoolExecutor.
+    """
+    try:
+        with default_storage.open(name, "rb") as f:
+            data = f.read()
+    except (OSError, ValueError):
+        logger.warning("image derivatives: cannot read %s", name)
+        return ""
+
+    image_hash = hashlib.sha1(data).hexdigest()[:HASH_LENGTH]
+    wanted = [
+        (size, fmt) for size in WIDTHS for fmt in FORMATS
+        if not default_storage.exists(derivative_name(image_hash, size, fmt))
+    ]
+    if not wanted:
+        return image_hash
+
+    try:
+        with Image.open(BytesIO(data)) as im:
+            im = _to_rgb(ImageOps.exif_transpose(im))
+            for size, fmt in wanted:
+                width = WIDTHS[size]
+                resized = im
+                if im.width > width:
+                    height = max(1, round(im.height * width / im.width))
+                    resized = im.resize((width, height), Image.LANCZOS)
+                out = BytesIO()
+                resized.save(out, **FORMATS[fmt][1])
+                target = derivative_name(image_hash, size, fmt)
+                # two uploads of the same photo can race; both write the same bytes
+                if not default_storage.exists(target):
+                    default_storage.save(target, ContentFile(out.getvalue()))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("image derivatives: cannot process %s", name, exc_info=True)
+        return ""
+
+    return image_hash
+
+
+# ---------------- POOL ----------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def get_pool():
+    """
+    Lazily started, shared per web worker. "spawn" so children never
+    inherit the parent's open DB sockets.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_DERIVATIVE_WORKERS", 2),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+            )
+        return _pool
+
+
+def reset_pool():
+    """ Drop a broken pool (a worker was killed); the next upload starts a new one. """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def save_hashes(model, hashes):
+    """
+    hashes: {(pk, image name): hash}. Rows whose image changed meanwhile
+    are skipped (the newer upload has its own job). Refreshes listings.
+    """
+    from .listing import refresh_listing
+    from .catalog import bump_catalog_version
+
+    product_ids = set()
+    with transaction.atomic():
+        for (pk, name), image_hash in hashes.items():
+            if not image_hash:
+                continue
+            rows = model.objects.filter(pk=pk, image=name)
+            if rows.update(image_hash=image_hash, **_touch(model)):
+                product_ids.update(rows.values_list(_product_path(model), flat=True))
+        if product_ids:
+            refresh_listing(product_ids)
+            bump_catalog_version()
+    return len(product_ids)
+
+
+def _touch(model):
+    # ProductImage.updated_at feeds delta sync; VariantImage has none
+    return {"updated_at": timezone.now()} if hasattr(model, "updated_at") else {}
+
+
+def _product_path(model):
+    return "product_id" if hasattr(model, "product_id") else "variant__product_id"
+
+
+def _finished(model, pk, name):
+    def callback(future):
+        try:
+            image_hash = future.result()
+        except BrokenProcessPool:
+            logger.exception("image derivatives: pool died while processing %s", name)
+            reset_pool()
+            return
+        except Exception:
+            logger.exception("image derivatives: worker failed for %s", name)
+            return
+        # runs on the pool's management thread: own connection, closed after
+        close_old_connections()
+        try:
+            save_hashes(model, {(pk, name): image_hash})
+        except Exception:
+            logger.exception("image derivatives: cannot save hash for %s", name)
+        finally:
+            connection.close()
+    return callback
+
+
+def schedule_derivatives(instance):
+    """ Queue derivatives for a saved ProductImage / VariantImage after commit. """
+    name = instance.image.name
+    if not name or instance.image_hash:
+        return
+    model, pk = type(instance), instance.pk
+
+    def submit():
+        if not getattr(settings, "IMAGE_DERIVATIVES_ASYNC", True):
+            save_hashes(model, {(pk, name): render_derivatives(name)})
+            return
+        get_pool().submit(render_derivatives, name).add_done_callback(_finished(model, pk, name))
+
+    transaction.on_commit(submit)
@@ -0,0 +1,411 @@
+"""
+Streaming catalog import (import_catalog command).
+
+One row per product, keyed by product slug, from CSV or JSON lines:
+
+    slug, name, description, price, discount_price, stock,
+    category, subcategory, brand      (slugs; brand may also be its name)
+    color, color_name                 (base color name, display name)
+    sizes      CSV "S:10|M:4"           JSONL {"S": 10, "M": 4}
+    images     CSV "url1|url2"          JSONL ["url1", "url2"]
+    variants   CSV "Red=url1,url2|Blue" JSONL [{"color": "Red", "images": [...]}]
+
+Rows are read lazily and written in batches: each batch looks up its
+existing products by slug, bulk_creates new rows, bulk_updates only rows
+whose values changed, upserts sizes / variants by natural key and adds
+images whose source URL the product doesn't have yet. Reapplying the same
+feed is therefore a no-op apart from stock and price changes. Slugs are
+resolved through dicts loaded once; image downloads run on a thread pool.
+"""
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlsplit
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .catalog import bump_catalog_version
+from .listing import refresh_listing
+from .models import (
+    Brand, Category, Color, Product, ProductImage, ProductSize,
+    ProductVariant, SubCategory, VariantImage,
+)
+from .pricing import payable_and_discount
+
+
+PRODUCT_FIELDS = (
+    "name", "description", "price", "discount_price", "stock",
+    "category_id", "subcategory_id", "brand_id", "base_color_id", "color_name",
+)
+SIZE_CODES = {code for code, _ in ProductSize.SIZE_CHOICES}
+DOWNLOAD_TIMEOUT = 20
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+
+
+class RowError(ValueError):
+    pass
+
+
+ImportRow = namedtuple("ImportRow", "line slug fields sizes images variants")
+
+
+# ---------------- READERS ----------------
+
+def read_rows(path):
+    """ (line number, dict) per record; CSV or JSON lines by extension. """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson", ".json")):
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if line:
+                    try:
+                        yield n, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield n, RowError(f"invalid JSON: {e}")
+        else:
+            for n, row in enumerate(csv.DictReader(f), 2):
+                yield n, row
+
+
+def _split(value, sep="|"):
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [v.strip() for v in (value or "").split(sep) if v.strip()]
+
+
+def _sizes(value):
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, list):
+        pairs = [(s.get("size"), s.get("stock", 0)) for s in value]
+    else:
+        pairs = [part.split(":", 1) if ":" in part else (part, 0) for part in _split(value)]
+    out = {}
+    for size, stock in pairs:
+        size = str(size).strip()
+        size = size.upper() if size.upper() in SIZE_CODES else size
+        if size not in SIZE_CODES:
+            raise RowError(f"unknown size {size!r}")
+        try:
+            out[size] = max(0, int(stock))
+        except (TypeError, ValueError):
+            raise RowError(f"bad stock {stock!r} for size {size}")
+    return out
+
+
+def _variants(value):
+    if isinstance(value, list):
+        return [(v.get("color", ""), _split(v.get("images"))) for v in value]
+    out = []
+    for part in _split(value):
+        color, _, urls = part.partition("=")
+        out.append((color.strip(), _split(urls, ",")))
+    return out
+
+
+def _decimal(value, field, required=False):
+    if value in (None, ""):
+        if required:
+            raise RowError(f"{field} is required")
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise RowError(f"bad {field} {value!r}")
+
+
+# ---------------- SLUG MAPS ----------------
+
+class SlugMaps:
+    """ Taxonomy lookups loaded once per import (a few thousand rows at most). """
+
+    def __init__(self):
+        self.categories = dict(Category.objects.exclude(slug=None).values_list("slug", "id"))
+        self.subcats = {
+            slug: (pk, category_id)
+            for slug, pk, category_id in SubCategory.objects.exclude(slug=None).values_list("slug", "id", "category_id")
+        }
+        self.brands = {}
+        for pk, name, slug in Brand.objects.values_list("id", "name", "slug"):
+            self.brands[name.lower()] = pk
+            if slug:
+                self.brands[slug] = pk
+        self.colors = {}
+        for pk, name in Color.objects.order_by("-id").values_list("id", "name"):
+            self.colors[name.lower()] = pk      # lowest id wins, as in the taxonomy map
+
+    def brand(self, value):
+        pk = self.brands.get(value) or self.brands.get(value.lower()) or self.brands.get(slugify(value))
+        if pk is None:
+            raise RowError(f"unknown brand {value!r}")
+        return pk
+
+    def color(self, value):
+        if not value:
+            return None
+        pk = self.colors.get(value.lower())
+        if pk is None:
+            raise RowError(f"unknown color {value!r}")
+        return pk
+
+    def parse(self, line, raw):
+        if isinstance(raw, RowError):
+            raise raw
+        slug = (raw.get("slug") or "").strip() or slugify(raw.get("name") or "")
+        if not slug:
+            raise RowError("slug or name is required")
+
+        category_id = self.categories.get((raw.get("category") or "").strip())
+        if category_id is None:
+            raise RowError(f"unknown category {raw.get('category')!r}")
+        subcat = self.subcats.get((raw.get("subcategory") or "").strip())
+        if subcat is None or subcat[1] != category_id:
+            raise RowError(f"unknown subcategory {raw.get('subcategory')!r} for category {raw.get('category')!r}")
+
+        sizes = _sizes(raw.get("sizes"))
+        stock = raw.get("stock")
+        try:
+            stock = int(stock) if stock not in (None, "") else sum(sizes.values())
+        except ValueError:
+            raise RowError(f"bad stock {stock!r}")
+
+        fields = {
+            "name": (raw.get("name") or "").strip() or slug,
+            "description": raw.get("description") or "",
+            "price": _decimal(raw.get("price"), "price", required=True),
+            "discount_price": _decimal(raw.get("discount_price"), "discount_price"),
+            "stock": stock,
+            "category_id": category_id,
+            "subcategory_id": subcat[0],
+            "brand_id": self.brand((raw.get("brand") or "").strip()),
+            "base_color_id": self.color((raw.get("color") or "").strip()),
+            "color_name": (raw.get("color_name") or raw.get("color") or "").strip() or None,
+        }
+        variants = []
+        for color, urls in _variants(raw.get("variants")):
+            if not color:
+                raise RowError("variant without a color")
+            variants.append((self.color(color), urls))
+        return ImportRow(line, slug, fields, sizes, _split(raw.get("images")), variants)
+
+
+# ---------------- IMAGES ----------------
+
+def download_image(url, upload_to):
+    """ Fetch one image into storage; returns (url, storage name or None, error). """
+    try:
+        with requests.get(url, timeout=DOWNLOAD_TIMEOUT, stream=True) as r:
+            r.raise_for_status()
+            data = r.raw.read(MAX_IMAGE_BYTES + 1, decode_content=True)
+    except requests.RequestException as e:
+        return url, None, str(e)
+    if len(data) > MAX_IMAGE_BYTES:
+        return url, None, "image too large"
+    name = os.path.basename(urlsplit(url).path) or "image.jpg"
+    return url, default_storage.save(f"{upload_to}{name}", ContentFile(data)), None
+
+
+def _image_upload_to(model):
+    return model._meta.get_field("image").upload_to
+
+
+# ---------------- BATCH WRITER ----------------
+
+class CatalogImporter:
+    def __init__(self, batch_size=500, image_workers=8, download_images=True, stdout=None):
+        self.batch_size = batch_size
+        self.download_images = download_images
+        self.stdout = stdout
+        self.maps = SlugMaps()
+        self.pool = ThreadPoolExecutor(max_workers=image_workers) if download_images else None
+        self.stats = {
+            "rows": 0, "created": 0, "updated": 0, "unchanged": 0, "errors": 0,
+            "sizes": 0, "variants": 0, "images": 0, "image_errors": 0,
+        }
+        self.errors = []        # first few (line, message) for the report
+        self.touched = set()    # product ids changed in the current batch
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(wait=True)
+
+    def _error(self, line, message):
+        self.stats["errors"] += 1
+        if len(self.errors) < 50:
+            self.errors.append((line, message))
+
+    def run(self, path):
+        batch = []
+        for line, raw in read_rows(path):
+            self.stats["rows"] += 1
+            try:
+                batch.append(self.maps.parse(line, raw))
+            except RowError as e:
+                self._error(line, str(e))
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+        if any(self.stats[k] for k in ("created", "updated", "sizes", "variants", "images")):
+            bump_catalog_version()
+        return self.stats
+
+    def _flush(self, rows):
+        started = time.monotonic()
+        # later rows win when a slug repeats inside one batch
+        rows = list({r.slug: r for r in rows}.values())
+        self.touched = set()
+
+        with transaction.atomic():
+            products = self._upsert_products(rows)
+            self._upsert_sizes(rows, products)
+            variants = self._upsert_variants(rows, products)
+        images = self._add_images(rows, products, variants) if self.download_images else 0
+
+        # bulk writes skip the post_save receivers; refresh what changed
+        refresh_listing(self.touched)
+
+        elapsed = time.monotonic() - started
+        if self.stdout:
+            self.stdout.write(
+                f"  line {rows[-1].line}: {len(rows)} rows in {elapsed:.2f}s "
+                f"({len(rows) / elapsed if elapsed else 0:.0f} rows/s, {images} images) | "
+                f"total created {self.stats['created']}, updated {self.stats['updated']}, "
+                f"unchanged {self.stats['unchanged']}, errors {self.stats['errors']}"
+            )
+
+    def _upsert_products(self, rows):
+        """ {slug: product id} for the batch """
+        existing = {
+            p.slug: p for p in Product.objects.filter(slug__in=[r.slug for r in rows])
+            .only("id", "slug", *PRODUCT_FIELDS)
+        }
+        to_create, to_update = [], []
+        now = timezone.now()    # bulk_update skips auto_now
+        for r in rows:
+            p = existing.get(r.slug)
+            if p is None:
+                p = Product(slug=r.slug, **r.fields)
+                p.payable_price, p.discount_percent = payable_and_discount(p.price, p.discount_price)
+                to_create.append(p)
+                continue
+            if any(getattr(p, f) != v for f, v in r.fields.items()):
+                for f, v in r.fields.items():
+                    setattr(p, f, v)
+                p.updated_at = now
+                p.payable_price, p.discount_percent = payable_and_discount(p.price, p.discount_price)
+                to_update.append(p)
+            else:
+                self.stats["unchanged"] += 1
+
+        if to_create:
+            Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            Product.objects.bulk_update(
+                to_update, [*PRODUCT_FIELDS, "payable_price", "discount_percent", "updated_at"],
+                batch_size=self.batch_size,
+            )
+        self.touched.update(p.id for p in to_update)
+        self.stats["created"] += len(to_create)
+        self.stats["updated"] += len(to_update)
+
+        ids = {p.slug: p.id for p in existing.values()}
+        if to_create and any(p.id is None for p in to_create):
+            # backends without RETURNING on bulk insert (MySQL)
+            ids.update(Product.objects.filter(slug__in=[p.slug for p in to_create]).values_list("slug", "id"))
+        else:
+            ids.update((p.slug, p.id) for p in to_create)
+        self.touched.update(ids[p.slug] for p in to_create)
+        return ids
+
+    def _upsert_sizes(self, rows, products):
+        existing = {
+            (s.product_id, s.size): s
+            for s in ProductSize.objects.filter(product_id__in=products.values())
+        }
+        to_create, to_update = [], []
+        now = timezone.now()
+        for r in rows:
+            pid = products[r.slug]
+            for size, stock in r.sizes.items():
+                s = existing.get((pid, size))
+                if s is None:
+                    to_create.append(ProductSize(product_id=pid, size=size, stock=stock))
+                elif s.stock != stock:
+                    s.stock, s.updated_at = stock, now
+                    to_update.append(s)
+                else:
+                    continue
+                self.touched.add(pid)
+        ProductSize.objects.bulk_create(to_create, batch_size=self.batch_size)
+        ProductSize.objects.bulk_update(to_update, ["stock", "updated_at"], batch_size=self.batch_size)
+        self.stats["sizes"] += len(to_create) + len(to_update)
+
+    def _upsert_variants(self, rows, products):
+        """ {(product id, color id): variant id} for variants named in the batch """
+        wanted = {(products[r.slug], color_id) for r in rows for color_id, _ in r.variants}
+        if not wanted:
+            return {}
+
+        def load():
+            return {
+                (pid, cid): vid for vid, pid, cid in ProductVariant.objects
+                .filter(product_id__in={pid for pid, _ in wanted})
+                .values_list("id", "product_id", "color_id")
+            }
+
+        existing = load()
+        missing = [ProductVariant(product_id=pid, color_id=cid) for pid, cid in wanted - existing.keys()]
+        self.touched.update(v.product_id for v in missing)
+        if missing:
+            ProductVariant.objects.bulk_create(missing, batch_size=self.batch_size)
+            self.stats["variants"] += len(missing)
+            existing = load()
+        return existing
+
+    def _add_images(self, rows, products, variants):
+        have_product = set(
+            ProductImage.objects.filter(product_id__in=products.values()).values_list("product_id", "source_url")
+        )
+        have_variant = set(
+            VariantImage.objects.filter(variant_id__in=variants.values()).values_list("variant_id", "source_url")
+        )
+
+        jobs = []       # (model, owner field, owner id, url)
+        for r in rows:
+            pid = products[r.slug]
+            jobs.extend((ProductImage, "product_id", pid, url) for url in r.images if (pid, url) not in have_product)
+            for color_id, urls in r.variants:
+                vid = variants[(pid, color_id)]
+                jobs.extend((VariantImage, "variant_id", vid, url) for url in urls if (vid, url) not in have_variant)
+        jobs = list(dict.fromkeys(jobs))
+        if not jobs:
+            return 0
+
+        futures = [self.pool.submit(download_image, url, _image_upload_to(model)) for model, _, _, url in jobs]
+        created = {ProductImage: [], VariantImage: []}
+        for (model, owner, owner_id, url), future in zip(jobs, futures):
+            _, name, error = future.result()
+            if error:
+                self.stats["image_errors"] += 1
+                self._error(None, f"{url}: {error}")
+                continue
+            created[model].append(model(**{owner: owner_id}, image=name, source_url=url))
+            if model is ProductImage:
+                self.touched.add(owner_id)
+
+        for model, objs in created.items():
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+        count = sum(len(objs) for objs in created.values())
+        self.stats["images"] += count
+        return count
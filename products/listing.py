@@ -0,0 +1,209 @@
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import search
+from .pricing import payable_and_discount
+from .models import Product, ProductListing, ProductSize
+
+
+# bit position per size code, in SIZE_CHOICES order (25 sizes -> fits BigIntegerField)
+SIZE_BITS = {code: i for i, (code, _) in enumerate(ProductSize.SIZE_CHOICES)}
+
+
+def sizes_mask(sizes):
+    mask = 0
+    for s in sizes:
+        bit = SIZE_BITS.get(s)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def sizes_from_mask(mask):
+    return [code for code, bit in SIZE_BITS.items() if mask & (1 << bit)]
+
+
+def pack_ids(ids):
+    """ [7, 3, 7] -> ",3,7," so a single id can be matched with contains=",3," """
+    ids = sorted({int(i) for i in ids if i})
+    return f",{','.join(map(str, ids))}," if ids else ""
+
+
+def unpack_ids(packed):
+    return [int(x) for x in (packed or "").split(",") if x]
+
+
+# columns facets.py builds its bitsets from; facets_changed_at only moves when one changes
+FACET_FIELDS = (
+    "category_id", "subcategory_id", "subcategory_name", "brand_slug", "brand_name",
+    "size_mask", "color_ids", "payable_price", "discount_percent",
+)
+
+
+def listing_rating(summary):
+    """ (rating_avg, rating_count) for a ProductListing row from a ProductRatingSummary """
+    if summary is None or not summary.count:
+        return Decimal("0"), 0
+    return (Decimal(summary.total) / summary.count).quantize(Decimal("0.01")), summary.count
+
+
+def _models(apps=None):
+    """ (Product, ProductListing): live models, or a migration's historical ones """
+    if apps is None:
+        return Product, ProductListing
+    return apps.get_model("products", "Product"), apps.get_model("products", "ProductListing")
+
+
+def build_listing(product, model=ProductListing):
+    """
+    Build (unsaved) ProductListing from a product that has
+    brand/category/subcategory selected and images/sizes/variants prefetched.
+    A historical model (migrations) only gets the columns it has.
+    """
+    payable, percent = payable_and_discount(product.price, product.discount_price)
+
+    images = sorted(product.images.all(), key=lambda im: im.id)
+    first = next((im for im in images if im.image), None)
+
+    sizes = list(product.sizes.all())
+    colors = [v.color_id for v in product.variants.all()]
+    if product.base_color_id:
+        colors.append(product.base_color_id)
+    rating_avg, rating_count = listing_rating(getattr(product, "rating_summary", None))
+    popularity = getattr(product, "popularity", None)
+
+    values = dict(
+        product_id=product.id,
+        name=product.name,
+        slug=product.slug,
+        brand_id=product.brand_id,
+        category_id=product.category_id,
+        subcategory_id=product.subcategory_id,
+        brand_name=product.brand.name,
+        brand_slug=product.brand.slug,
+        category_name=product.category.name,
+        subcategory_name=product.subcategory.name,
+        price=product.price,
+        discount_price=product.discount_price,
+        payable_price=payable,
+        discount_percent=percent,
+        first_image=first.image.name if first else "",
+        first_image_hash=getattr(first, "image_hash", "") if first else "",
+        in_stock=any(s.stock > 0 for s in sizes),
+        size_mask=sizes_mask(s.size for s in sizes),
+        color_ids=pack_ids(colors),
+        rating_avg=rating_avg,
+        rating_count=rating_count,
+        popularity=popularity.score if popularity else 0,
+        sold_7d=popularity.sold_7d if popularity else 0,
+        sold_30d=popularity.sold_30d if popularity else 0,
+        is_bestseller=popularity.is_bestseller if popularity else False,
+    )
+    columns = {f.attname for f in model._meta.concrete_fields}
+    return model(**{k: v for k, v in values.items() if k in columns})
+
+
+def listing_source_queryset(model=Product):
+    # older (migration) states don't have the rating / popularity relations yet
+    reverse = {rel.name for rel in model._meta.related_objects}
+    related = ["brand", "category", "subcategory"] + [
+        name for name in ("rating_summary", "popularity") if name in reverse
+    ]
+    return (
+        model.objects
+        .select_related(*related)
+        .prefetch_related("images", "sizes", "variants")
+    )
+
+
+def refresh_listing(product_ids, apps=None):
+    """
+    Recompute listing rows for these products (deleted products just lose their row).
+    Pass a migration's apps to use its historical models.
+    """
+    product_ids = {int(pid) for pid in product_ids if pid}
+    if not product_ids:
+        return 0
+
+    product_model, listing_model = _models(apps)
+    rows = [
+        build_listing(p, listing_model)
+        for p in listing_source_queryset(product_model).filter(id__in=product_ids)
+    ]
+
+    # delete + insert is portable (MySQL bulk upserts can't name a conflict target)
+    with transaction.atomic():
+        _keep_facet_stamps(listing_model, rows, product_ids)
+        listing_model.objects.filter(product_id__in=product_ids).delete()
+        listing_model.objects.bulk_create(rows)
+
+    if apps is None:
+        search.on_listings_changed(product_ids)
+    return len(rows)
+
+
+def _keep_facet_stamps(model, rows, product_ids):
+    """ Carry facets_changed_at over for rows whose facet columns are unchanged (e.g. stock only). """
+    if "facets_changed_at" not in {f.attname for f in model._meta.concrete_fields}:
+        return
+    old = {
+        r[0]: r[1:] for r in
+        model.objects.filter(product_id__in=product_ids).values_list("product_id", *FACET_FIELDS, "facets_changed_at")
+    }
+    now = timezone.now()
+    for row in rows:
+        prev = old.get(row.product_id)
+        same = prev is not None and prev[:-1] == tuple(getattr(row, f) for f in FACET_FIELDS)
+        row.facets_changed_at = prev[-1] if same else now
+
+
+def rebuild_all(batch_size=1000, stdout=None, apps=None):
+    """
+    Full rebuild, walking products by id in batches (constant memory).
+    Migrations pass their apps so a deploy never serves an empty listing.
+    """
+    product_model, listing_model = _models(apps)
+    listing_model.objects.exclude(product_id__in=product_model.objects.values("id")).delete()
+
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(
+            product_model.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        total += refresh_listing(ids, apps=apps)
+        last_id = ids[-1]
+        if stdout:
+            stdout.write(f"  {total} listings rebuilt (up to id {last_id})")
+
+    return total
+
+
+# -------- signal batching --------
+# Admin saves a product + inlines in one transaction; refresh each product once, after commit.
+# The pending ids live on the transaction's own on_commit callback, so a rollback drops
+# them together with the callback instead of leaving them behind for the next save.
+# Only a callback registered at the current savepoint level is reused.
+
+def schedule_refresh(product_id):
+    if not product_id:
+        return
+    conn = transaction.get_connection()
+    if conn.in_atomic_block:
+        level = set(conn.savepoint_ids)
+        for sids, callback, *_ in conn.run_on_commit:
+            if sids == level and isinstance(callback, partial) and callback.func is _flush_pending:
+                callback.args[0].add(product_id)
+                return
+    transaction.on_commit(partial(_flush_pending, {product_id}))
+
+
+def _flush_pending(ids):
+    refresh_listing(ids)
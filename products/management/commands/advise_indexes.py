@@ -0,0 +1,96 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from ajio.index_advisor import Advisor, Recorder, read_log, replay, suggest
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a JSON-lines request log through the test client, record SQL per endpoint, "
+        "EXPLAIN the slow statements and suggest composite indexes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help='JSON lines: {"method": "GET", "path": "/api/products/?sort=low", "user": "alice"}')
+        parser.add_argument("--repeat", type=int, default=1, help="Replay the log N times")
+        parser.add_argument("--slow-ms", type=float, default=2.0, help="Only EXPLAIN statements slower than this on average")
+        parser.add_argument("--top", type=int, default=50, help="Consider the N statements with the most total time")
+        parser.add_argument("--limit", type=int, default=20, help="Suggestions to print")
+        parser.add_argument("--json", action="store_true", help="Print suggestions as JSON")
+        parser.add_argument(
+            "--keep-changes", action="store_true",
+            help="Commit writes made by replayed requests (rolled back by default)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            entries = list(read_log(options["log"]))
+        except OSError as e:
+            raise CommandError(str(e))
+        if not entries:
+            raise CommandError("No requests in log (each line needs a \"path\" starting with /)")
+
+        recorder = Recorder()
+        result = {}
+
+        try:
+            with transaction.atomic():
+                with connection.execute_wrapper(recorder):
+                    total = replay(entries, recorder, repeat=options["repeat"])
+                result["total"] = total
+                result["suggestions"] = suggest(
+                    recorder, Advisor(), slow_ms=options["slow_ms"], top=options["top"]
+                )
+                if not options["keep_changes"]:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        suggestions = result["suggestions"][:options["limit"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps([
+                {**s, "endpoints": sorted(s["endpoints"]), "ms": round(s["ms"], 2)} for s in suggestions
+            ], indent=2))
+            return
+
+        self._print_endpoints(recorder, result["total"])
+        self._print_suggestions(suggestions)
+
+    def _print_endpoints(self, recorder, total):
+        self.stdout.write(f"Replayed {total} requests on {connection.vendor}\n")
+        self.stdout.write(f"{'endpoint':45} {'reqs':>6} {'q/req':>7} {'ms/req':>8}  statuses")
+        rows = sorted(recorder.endpoints.items(), key=lambda kv: -kv[1]["ms"])
+        for name, e in rows:
+            statuses = ",".join(f"{code}x{n}" for code, n in sorted(e["statuses"].items()))
+            self.stdout.write(
+                f"{name[:45]:45} {e['requests']:>6} {e['queries'] / e['requests']:>7.1f} "
+                f"{e['ms'] / e['requests']:>8.1f}  {statuses}"
+            )
+        self.stdout.write("")
+
+    def _print_suggestions(self, suggestions):
+        if not suggestions:
+            self.stdout.write(self.style.SUCCESS("No index suggestions: slow statements are already covered"))
+            return
+
+        for n, s in enumerate(suggestions, 1):
+            cols = ", ".join(s["columns"])
+            fields = ", ".join(f'"{f}"' for f in s["fields"])
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{n}. {s['table']} ({cols})"
+            ))
+            self.stdout.write(
+                f"   est. rows scanned {s['before']} -> {s['after']}"
+                f"{' (no sort)' if s['sort_avoided'] else ''} | "
+                f"{s['executions']} executions, {s['ms']:.1f} ms total"
+            )
+            self.stdout.write(f"   endpoints: {', '.join(sorted(s['endpoints']))}")
+            self.stdout.write(f"   {s['model']}.Meta: models.Index(fields=[{fields}], name=...)")
+            self.stdout.write(f"   sql: {s['sql'][:160]}")
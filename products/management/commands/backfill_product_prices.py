@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from products.listing import rebuild_all
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Recompute stored Product.payable_price / discount_percent (after raw SQL or fixture imports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--no-listing", action="store_true",
+            help="Skip rebuilding ProductListing afterwards",
+        )
+
+    def handle(self, *args, **options):
+        changed = Product.objects.all().recalculate_prices(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Updated stored prices on {changed} products"))
+
+        if changed and not options["no_listing"]:
+            total = rebuild_all(batch_size=options["batch_size"], stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} product listings"))
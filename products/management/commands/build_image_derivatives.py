@@ -0,0 +1,63 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from products.images import render_derivatives, save_hashes, init_worker
+from products.models import ProductImage, VariantImage
+
+
+class Command(BaseCommand):
+    help = "Generate thumb/card/zoom WebP + JPEG derivatives for existing product and variant images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true",
+            help="Also re-check images that already have a hash (re-creates missing files)",
+        )
+        parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        done = 0
+        with ProcessPoolExecutor(
+            max_workers=max(1, options["workers"]),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+        ) as pool:
+            for model in (ProductImage, VariantImage):
+                done += self._backfill(pool, model, options)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {done} images in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f}/s)"
+        ))
+
+    def _backfill(self, pool, model, options):
+        rows = model.objects.exclude(image="")
+        if not options["all"]:
+            rows = rows.filter(image_hash="")
+
+        total = failed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                rows.filter(id__gt=last_id).order_by("id")
+                .values_list("id", "image")[:options["batch_size"]]
+            )
+            if not batch:
+                break
+            hashes = pool.map(render_derivatives, [name for _, name in batch])
+            results = dict(zip(batch, hashes))
+            save_hashes(model, results)
+
+            total += len(batch)
+            failed += sum(1 for h in results.values() if not h)
+            last_id = batch[-1][0]
+            self.stdout.write(f"  {model.__name__}: {total} done (up to id {last_id})")
+
+        if failed:
+            self.stdout.write(self.style.WARNING(f"  {model.__name__}: {failed} unreadable images kept their originals"))
+        return total
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from products.similar import build_all, refresh_changed
+
+
+class Command(BaseCommand):
+    help = "Precompute PDP similar products (brand / subcategory / color / price band / co-purchase)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--changed", action="store_true",
+            help="Only recompute subcategories touched by listing changes or new orders since the last run",
+        )
+
+    def handle(self, *args, **options):
+        if options["changed"]:
+            total = refresh_changed(stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Refreshed similar products for {total} products"))
+        else:
+            total = build_all(stdout=self.stdout)
+            self.stdout.write(self.style.SUCCESS(f"Built similar products for {total} products"))
@@ -0,0 +1,68 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ajio.media import PRECOMPRESSED
+
+try:
+    import brotli
+except ImportError:      # optional: gzip only
+    brotli = None
+
+
+# photos are already compressed; only text-like media benefits
+COMPRESSIBLE = (".svg", ".json", ".txt", ".csv", ".xml", ".css", ".js", ".html")
+SUFFIXES = tuple(suffix for _, suffix in PRECOMPRESSED)
+
+
+class Command(BaseCommand):
+    help = "Write .gz (and .br when brotli is installed) next to compressible files in MEDIA_ROOT"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-size", type=int, default=512, help="Skip files smaller than this (bytes)")
+        parser.add_argument("--force", action="store_true", help="Rewrite variants that are up to date")
+
+    def handle(self, *args, **options):
+        written = skipped = 0
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            for name in files:
+                if not name.lower().endswith(COMPRESSIBLE):
+                    continue
+                path = os.path.join(root, name)
+                if os.path.getsize(path) < options["min_size"]:
+                    continue
+                n = self._compress(path, options["force"])
+                written += n
+                skipped += not n
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} precompressed variants ({skipped} files up to date or not worth it)"
+            + ("" if brotli else "; install brotli for .br")
+        ))
+
+    def _compress(self, path, force):
+        mtime = os.path.getmtime(path)
+        encoders = {".gz": lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli:
+            encoders[".br"] = lambda data: brotli.compress(data, quality=11)
+
+        data = None
+        written = 0
+        for suffix in SUFFIXES:
+            if suffix not in encoders:
+                continue
+            target = path + suffix
+            if not force and os.path.exists(target) and os.path.getmtime(target) >= mtime:
+                continue
+            if data is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            packed = encoders[suffix](data)
+            if len(packed) >= len(data) * 0.95:
+                continue
+            with open(target, "wb") as f:
+                f.write(packed)
+            written += 1
+        return written
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importer import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV / JSON-lines product feed into the catalog (upsert by product slug). "
+        "Safe to re-run: unchanged rows are skipped, images are fetched once per source URL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help=".csv, or .jsonl / .ndjson (one product per line)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per transaction / bulk write")
+        parser.add_argument("--image-workers", type=int, default=8, help="Threads downloading images")
+        parser.add_argument("--skip-images", action="store_true", help="Ignore images / variant image URLs")
+        parser.add_argument(
+            "--no-derivatives", action="store_true",
+            help="Don't run build_image_derivatives for new images afterwards",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        importer = CatalogImporter(
+            batch_size=options["batch_size"],
+            image_workers=max(1, options["image_workers"]),
+            download_images=not options["skip_images"],
+            stdout=self.stdout,
+        )
+        started = time.monotonic()
+        try:
+            stats = importer.run(options["path"])
+        except OSError as e:
+            raise CommandError(str(e))
+        finally:
+            importer.close()
+        elapsed = time.monotonic() - started
+
+        for line, message in importer.errors:
+            self.stdout.write(self.style.WARNING(f"  {f'line {line}' if line else 'image'}: {message}"))
+        if stats["errors"] > len(importer.errors):
+            self.stdout.write(self.style.WARNING(f"  ... {stats['errors'] - len(importer.errors)} more errors"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['rows']} rows in {elapsed:.1f}s ({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+            f"{stats['errors']} errors | {stats['sizes']} sizes, {stats['variants']} variants, "
+            f"{stats['images']} images ({stats['image_errors']} failed)"
+        ))
+
+        if stats["images"] and not options["no_derivatives"]:
+            call_command("build_image_derivatives", stdout=self.stdout)
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.pincode_loader import PincodeLoader, RowError
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a pincode x product availability CSV into ProductPincodeAvailability, "
+        "writing only rows that change (multi-row upserts, one transaction per batch)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV: pincode, product_id|product_slug, is_available, stock, cod_available, eta_days")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows diffed and written per transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+        parser.add_argument(
+            "--create-pincodes", action="store_true",
+            help="Add unknown pincodes to ServiceablePincode instead of rejecting their rows",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        loader = PincodeLoader(
+            batch_size=options["batch_size"],
+            dry_run=options["dry_run"],
+            create_pincodes=options["create_pincodes"],
+            stdout=self.stdout,
+        )
+        started = time.monotonic()
+        try:
+            stats = loader.run(options["path"])
+        except (OSError, RowError) as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        for line, message in loader.errors:
+            self.stdout.write(self.style.WARNING(f"  line {line}: {message}"))
+        if stats["errors"] > len(loader.errors):
+            self.stdout.write(self.style.WARNING(f"  ... {stats['errors'] - len(loader.errors)} more errors"))
+
+        prefix = "Dry run: would insert" if options["dry_run"] else "Inserted"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['inserted']}, {'update' if options['dry_run'] else 'updated'} {stats['updated']}, "
+            f"{stats['unchanged']} unchanged, {stats['errors']} errors, {stats['new_pincodes']} new pincodes "
+            f"({stats['rows']} rows in {elapsed:.1f}s, {stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
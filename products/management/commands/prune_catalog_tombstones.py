@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones older than CATALOG_TOMBSTONE_DAYS (run daily)"
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} tombstones"))
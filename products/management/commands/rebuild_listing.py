@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.listing import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized ProductListing table from Product/ProductSize/ProductImage/ProductVariant"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = rebuild_all(batch_size=options["batch_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} product listings"))
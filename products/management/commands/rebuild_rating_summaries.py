@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.ratings import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute ProductRatingSummary rows and listing ratings from orders.ProductRating"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        n = rebuild_summaries(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {n} products"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from products.popularity import backfill_sales, update_popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute decay-weighted popularity scores and bestseller badges from daily sales counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--backfill", action="store_true",
+            help="First rebuild the daily sales counters from OrderItem history",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            n = backfill_sales()
+            self.stdout.write(f"Rebuilt {n} daily sales counters")
+
+        scored, changed = update_popularity(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} products, {changed} listing rows changed"))
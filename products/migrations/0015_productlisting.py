@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-17 21:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from products.listing import rebuild_all
+
+
+def fill_listing(apps, schema_editor):
+    rebuild_all(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_alter_brand_id_alter_category_id_alter_color_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductListing',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='products.product')),
+                ('name', models.CharField(max_length=150)),
+                ('slug', models.SlugField(blank=True, max_length=255, null=True)),
+                ('brand_name', models.CharField(blank=True, max_length=100)),
+                ('brand_slug', models.SlugField(blank=True, max_length=255, null=True)),
+                ('category_name', models.CharField(blank=True, max_length=100)),
+                ('subcategory_name', models.CharField(blank=True, max_length=50)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('payable_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount_percent', models.DecimalField(decimal_places=2, default=0, max_digits=6)),
+                ('first_image', models.CharField(blank=True, max_length=255)),
+                ('in_stock', models.BooleanField(default=False)),
+                ('size_mask', models.BigIntegerField(default=0)),
+                ('color_ids', models.CharField(blank=True, max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('brand', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.brand')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.category')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.subcategory')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'payable_price', 'product'], name='listing_subcat_price'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'discount_percent'], name='listing_subcat_discount'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'brand'], name='listing_subcat_brand'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['category', 'brand'], name='listing_cat_brand'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['payable_price', 'product'], name='listing_price'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['brand', 'payable_price'], name='listing_brand_price'),
+        ),
+        migrations.RunPython(fill_listing, migrations.RunPython.noop),
+    ]
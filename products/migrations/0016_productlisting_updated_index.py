@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_productlisting'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['updated_at'], name='listing_updated'),
+        ),
+    ]
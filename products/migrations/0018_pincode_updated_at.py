@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productpincodeavailability',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='serviceablepincode',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-17 21:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_pincode_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarProducts',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar', serialize=False, to='products.product')),
+                ('similar_ids', models.TextField(blank=True, default='')),
+                ('computed_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+from products.pricing import payable_and_discount
+
+
+def fill_prices(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    batch = []
+    for p in Product.objects.only("pk", "price", "discount_price").iterator(chunk_size=1000):
+        p.payable_price, p.discount_percent = payable_and_discount(p.price, p.discount_price)
+        batch.append(p)
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ["payable_price", "discount_percent"])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ["payable_price", "discount_percent"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0019_similarproducts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productlisting',
+            name='listing_subcat_discount',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='discount_percent',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='payable_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', 'payable_price'], name='product_subcat_payable'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['subcategory', 'discount_percent'], name='product_subcat_discount'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'discount_percent', 'product'], name='listing_subcat_discount'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['discount_percent', 'product'], name='listing_discount'),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
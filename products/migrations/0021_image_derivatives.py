@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_product_stored_discount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='first_image_hash',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='variantimage',
+            name='image_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
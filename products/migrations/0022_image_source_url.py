@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 21:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productimage',
+            name='source_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='variantimage',
+            name='source_url',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+    ]
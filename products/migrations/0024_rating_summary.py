@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-17 21:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from products.ratings import rebuild_summaries
+
+
+def fill_summaries(apps, schema_editor):
+    # also copies the averages onto the listing rows of rated products
+    rebuild_summaries(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_catalog_sync'),
+        ('orders', '0011_alter_order_id_alter_orderitem_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='products.product')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('stars_1', models.PositiveIntegerField(default=0)),
+                ('stars_2', models.PositiveIntegerField(default=0)),
+                ('stars_3', models.PositiveIntegerField(default=0)),
+                ('stars_4', models.PositiveIntegerField(default=0)),
+                ('stars_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'rating_avg', 'product'], name='listing_subcat_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['rating_avg', 'product'], name='listing_rating'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-17 21:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from products.popularity import backfill_sales, update_popularity
+
+
+def fill_popularity(apps, schema_editor):
+    # counters from order history, then scores + listing columns
+    backfill_sales(apps=apps)
+    update_popularity(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_rating_summary'),
+        ('orders', '0011_alter_order_id_alter_orderitem_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='products.product')),
+                ('score', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('sold_7d', models.PositiveIntegerField(default=0)),
+                ('sold_30d', models.PositiveIntegerField(default=0)),
+                ('is_bestseller', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='is_bestseller',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='popularity',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='sold_30d',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productlisting',
+            name='sold_7d',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['subcategory', 'popularity', 'product'], name='listing_subcat_popular'),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['popularity', 'product'], name='listing_popular'),
+        ),
+        migrations.AddField(
+            model_name='productsalesdaily',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_daily', to='products.product'),
+        ),
+        migrations.AddIndex(
+            model_name='productsalesdaily',
+            index=models.Index(fields=['day'], name='sales_daily_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='productsalesdaily',
+            constraint=models.UniqueConstraint(fields=('product', 'day'), name='sales_daily_product_day'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
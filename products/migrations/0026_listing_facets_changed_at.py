@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-17 21:52
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productlisting',
+            name='facets_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='productlisting',
+            index=models.Index(fields=['category', 'facets_changed_at'], name='listing_cat_facets'),
+        ),
+    ]
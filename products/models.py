@@ -1,6 +1,11 @@
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
+from . import images as derived
+from .pricing import payable_and_discount
+
 class Gender(models.Model):
     name = models.CharField(max_length=50)   # Men, Women, Kids
     slug = models.SlugField(max_length=255, unique=True, null=True, blank=True)
@@ -12,6 +17,7 @@ class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=255, unique=True, null=True, blank=True)
     gender = models.ForeignKey(Gender, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)   # delta sync (products/sync.py)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -34,6 +40,7 @@ class SubCategory(models.Model):
 class Brand(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=255, unique=True, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -44,6 +51,55 @@ class Brand(models.Model):
         return self.name
 
 
+class ProductQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # delta sync reads updated_at, which auto_now only sets on save()
+        kwargs.setdefault("updated_at", timezone.now())
+
+        # bulk price edits keep the stored payable_price / discount_percent in step
+        if "price" not in kwargs and "discount_price" not in kwargs:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            ids = list(self.values_list("pk", flat=True))
+            rows = super().update(**kwargs)
+            self.model.objects.filter(pk__in=ids).recalculate_prices()
+
+        def refresh():
+            from .catalog import bump_catalog_version
+            from .listing import refresh_listing
+            refresh_listing(ids)
+            bump_catalog_version()
+
+        transaction.on_commit(refresh, using=self.db)
+        return rows
+
+    def recalculate_prices(self, batch_size=1000):
+        """ Recompute payable_price / discount_percent; returns rows changed. """
+        changed = 0
+        last_id = 0
+        qs = self.order_by("pk").only("pk", "price", "discount_price", "payable_price", "discount_percent")
+        while True:
+            batch = list(qs.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            dirty = []
+            for p in batch:
+                payable, percent = payable_and_discount(p.price, p.discount_price)
+                if p.payable_price != payable or p.discount_percent != percent:
+                    p.payable_price, p.discount_percent = payable, percent
+                    dirty.append(p)
+            if dirty:
+                now = timezone.now()
+                for p in dirty:
+                    p.updated_at = now
+                self.model.objects.bulk_update(dirty, ["payable_price", "discount_percent", "updated_at"])
+                changed += len(dirty)
+            last_id = batch[-1].pk
+        return changed
+
+
 class Product(models.Model):
     name = models.CharField(max_length=150)
     slug = models.SlugField(max_length=255, unique=True, null=True, blank=True)
@@ -64,11 +120,30 @@ class Product(models.Model):
     )
     color_name = models.CharField(max_length=50, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # derived from price / discount_price on save (indexed for offer filters + sort=discount)
+    payable_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    discount_percent = models.DecimalField(max_digits=5, decimal_places=2, default=0, editable=False)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["subcategory", "payable_price"], name="product_subcat_payable"),
+            models.Index(fields=["subcategory", "discount_percent"], name="product_subcat_discount"),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.payable_price, self.discount_percent = payable_and_discount(self.price, self.discount_price)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extra = {"updated_at"}
+            if {"price", "discount_price"} & set(update_fields):
+                extra |= {"payable_price", "discount_percent"}
+            kwargs["update_fields"] = {*update_fields, *extra}
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -76,9 +151,31 @@ class Product(models.Model):
     
 
 
-class ProductImage(models.Model):
+# Sized copies of an uploaded photo (products/images.py); originals until image_hash is set
+class DerivedImageMixin:
+    @property
+    def thumb_url(self):
+        return derived.derivative_url(self.image_hash, "thumb", fallback=self.image.url)
+
+    @property
+    def card_url(self):
+        return derived.derivative_url(self.image_hash, "card", fallback=self.image.url)
+
+    @property
+    def zoom_url(self):
+        return derived.derivative_url(self.image_hash, "zoom", fallback=self.image.url)
+
+    @property
+    def srcset(self):
+        return derived.srcset(self.image_hash, "webp")
+
+
+class ProductImage(DerivedImageMixin, models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='products/')
+    image_hash = models.CharField(max_length=40, blank=True, default="", editable=False)
+    source_url = models.CharField(max_length=500, blank=True, default="")   # import_catalog feed URL
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.product.name} - Image{self.id}"
@@ -114,6 +211,7 @@ class ProductSize(models.Model):
     )
     size = models.CharField(max_length=10, choices=SIZE_CHOICES)
     stock = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ("product", "size")  # prevents duplicate size for same product
@@ -140,20 +238,171 @@ class ProductVariant(models.Model):
         return f"{self.product.name} - {self.color.name}"
 
 
-class VariantImage(models.Model):
+class VariantImage(DerivedImageMixin, models.Model):
     variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, related_name="images")
     image = models.ImageField(upload_to="variant_images/")
+    image_hash = models.CharField(max_length=40, blank=True, default="", editable=False)
+    source_url = models.CharField(max_length=500, blank=True, default="")   # import_catalog feed URL
 
     def __str__(self):
         return f"Image for {self.variant}"
     
 
+# Denormalized PLP/search row (one per product), kept fresh by products/signals.py
+class ProductListing(models.Model):
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="listing")
+    name = models.CharField(max_length=150)
+    slug = models.SlugField(max_length=255, null=True, blank=True)
+
+    brand = models.ForeignKey(Brand, on_delete=models.CASCADE, related_name="+")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="+")
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, related_name="+")
+    brand_name = models.CharField(max_length=100, blank=True)
+    brand_slug = models.SlugField(max_length=255, null=True, blank=True)
+    category_name = models.CharField(max_length=100, blank=True)
+    subcategory_name = models.CharField(max_length=50, blank=True)
+
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    payable_price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_percent = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+
+    first_image = models.CharField(max_length=255, blank=True)   # storage path of images.first()
+    first_image_hash = models.CharField(max_length=40, blank=True, default="")  # its derivatives
+    in_stock = models.BooleanField(default=False)                # any size with stock > 0
+    size_mask = models.BigIntegerField(default=0)                # bit per ProductSize.SIZE_CHOICES entry
+    color_ids = models.CharField(max_length=255, blank=True)     # ",3,7," (base color + variant colors)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)   # ProductRatingSummary
+    rating_count = models.PositiveIntegerField(default=0)
+    popularity = models.DecimalField(max_digits=12, decimal_places=4, default=0)  # ProductPopularity
+    sold_7d = models.PositiveIntegerField(default=0)
+    sold_30d = models.PositiveIntegerField(default=0)
+    is_bestseller = models.BooleanField(default=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    facets_changed_at = models.DateTimeField(default=timezone.now)   # last change to a column facets.py reads
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["subcategory", "payable_price", "product"], name="listing_subcat_price"),
+            models.Index(fields=["subcategory", "discount_percent", "product"], name="listing_subcat_discount"),
+            models.Index(fields=["discount_percent", "product"], name="listing_discount"),
+            models.Index(fields=["subcategory", "brand"], name="listing_subcat_brand"),
+            models.Index(fields=["category", "brand"], name="listing_cat_brand"),
+            models.Index(fields=["payable_price", "product"], name="listing_price"),
+            models.Index(fields=["brand", "payable_price"], name="listing_brand_price"),
+            models.Index(fields=["updated_at"], name="listing_updated"),
+            models.Index(fields=["subcategory", "rating_avg", "product"], name="listing_subcat_rating"),
+            models.Index(fields=["rating_avg", "product"], name="listing_rating"),
+            models.Index(fields=["subcategory", "popularity", "product"], name="listing_subcat_popular"),
+            models.Index(fields=["popularity", "product"], name="listing_popular"),
+            models.Index(fields=["category", "facets_changed_at"], name="listing_cat_facets"),
+        ]
+
+    @property
+    def image_url(self):
+        # card-size JPEG once derivatives exist
+        original = default_storage.url(self.first_image) if self.first_image else ""
+        return derived.derivative_url(self.first_image_hash, "card", fallback=original)
+
+    @property
+    def image_srcset(self):
+        return derived.srcset(self.first_image_hash, "webp")
+
+    def __str__(self):
+        return f"Listing {self.product_id} - {self.name}"
+
+
+# Running totals of orders.ProductRating per product (products/ratings.py, rebuild_rating_summaries)
+class ProductRatingSummary(models.Model):
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="rating_summary")
+    count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)      # sum of stars
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+    @property
+    def histogram(self):
+        """ {"5": n, ..., "1": n}, best first """
+        return {str(star): getattr(self, f"stars_{star}") for star in range(5, 0, -1)}
+
+    def __str__(self):
+        return f"Rating {self.product_id}: {self.average} ({self.count})"
+
+
+# Units sold per product per day, fed by order status changes (products/popularity.py)
+class ProductSalesDaily(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="sales_daily")
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "day"], name="sales_daily_product_day"),
+        ]
+        indexes = [models.Index(fields=["day"], name="sales_daily_day")]
+
+    def __str__(self):
+        return f"{self.product_id} {self.day}: {self.units}"
+
+
+# Decay-weighted sales score, recomputed by the update_popularity command
+class ProductPopularity(models.Model):
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="popularity")
+    score = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    sold_7d = models.PositiveIntegerField(default=0)
+    sold_30d = models.PositiveIntegerField(default=0)
+    is_bestseller = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Popularity {self.product_id}: {self.score}"
+
+
+# Precomputed "Similar Styles" for the PDP (products/similar.py, build_similar_products command)
+class SimilarProducts(models.Model):
+    product = models.OneToOneField(
+        Product, primary_key=True, on_delete=models.CASCADE, related_name="similar"
+    )
+    similar_ids = models.TextField(blank=True, default="")   # ranked, best first: "12,7,31"
+    computed_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Similar to {self.product_id}"
+
+
+# Deleted catalog rows, so delta-sync clients can drop them (products/sync.py)
+class CatalogTombstone(models.Model):
+    kind = models.CharField(max_length=20)          # sync.KINDS key: product / size / image / brand / category
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted"
+
+
+# Single row (pk=1); bumped after any catalog save/delete, drives ETags + API response cache
+class CatalogVersion(models.Model):
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+
 class ServiceablePincode(models.Model):
     pincode = models.CharField(max_length=6, unique=True)
     city = models.CharField(max_length=80, blank=True, null=True)
     state = models.CharField(max_length=80, blank=True, null=True)
-    
-
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.pincode
@@ -168,6 +417,7 @@ class ProductPincodeAvailability(models.Model):
     stock = models.PositiveIntegerField(default=0)   # stock for this pincode
     cod_available = models.BooleanField(default=True)
     eta_days = models.PositiveIntegerField(default=3)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ("product", "pincode")
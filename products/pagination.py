@@ -0,0 +1,155 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+from .models import ProductListing
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+MAX_ID = 2 ** 63 - 1     # BIGINT; larger ids cannot exist and overflow the driver
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size(request):
+    """
+    ?limit=24 -> clamp to 1..MAX_PAGE_SIZE
+    """
+    raw = request.GET.get("limit")
+    try:
+        size = int(raw)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+# sort -> (value field carried in the cursor, descending?); "default"/"newest" seek on id only
+SORT_KEYS = {
+    "low": ("payable_price", False),
+    "high": ("payable_price", True),
+    "discount": ("discount_percent", True),
+    "rating": ("rating_avg", True),
+    "popular": ("popularity", True),
+}
+
+SORTS = ("low", "high", "discount", "rating", "popular", "newest")
+
+
+def encode_cursor(sort, obj):
+    """
+    Opaque cursor = urlsafe base64 of the last row's sort key.
+    sort "low"/"high" -> (payable_price, id), "discount" -> (discount_percent, id),
+    "rating" -> (rating_avg, id), "popular" -> (popularity, id), default / "newest" -> (id,)
+    """
+    payload = {"s": sort or "default", "i": obj.pk}
+    if sort in SORT_KEYS:
+        payload["p"] = str(getattr(obj, SORT_KEYS[sort][0]))
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _fits(value, field):
+    """ value could have come from the column: finite, in range, no extra decimal places """
+    f = ProductListing._meta.get_field(field)
+    return (
+        value.is_finite()
+        and value.copy_abs() < Decimal(10) ** (f.max_digits - f.decimal_places)
+        and value.as_tuple().exponent >= -f.decimal_places
+    )
+
+
+def decode_cursor(token, sort):
+    """ (sort value or None, last id); the token is client input, so anything odd is InvalidCursor """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = int(payload["i"])
+        value = Decimal(str(payload["p"])) if "p" in payload else None
+    except (ValueError, KeyError, TypeError, InvalidOperation):
+        raise InvalidCursor("Invalid cursor")
+
+    # cursor from a different ordering cannot be applied
+    if payload.get("s") != (sort or "default"):
+        raise InvalidCursor("Cursor does not match sort")
+    if not 0 < last_id <= MAX_ID:
+        raise InvalidCursor("Invalid cursor")
+    if sort in SORT_KEYS and (value is None or not _fits(value, SORT_KEYS[sort][0])):
+        raise InvalidCursor("Invalid cursor")
+
+    return value, last_id
+
+
+def apply_keyset(queryset, sort, cursor):
+    """
+    Seek past the cursor row instead of OFFSET so every page costs the same.
+    queryset must already be ordered by order_for_sort(sort) and expose the sort field.
+    """
+    if not cursor:
+        return queryset
+
+    value, last_id = decode_cursor(cursor, sort)
+
+    if sort in SORT_KEYS:
+        field, desc = SORT_KEYS[sort]
+        op, id_op = ("lt", "lt") if desc else ("gt", "gt")
+        return queryset.filter(
+            Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"pk__{id_op}": last_id})
+        )
+    return queryset.filter(pk__lt=last_id)
+
+
+def order_for_sort(sort):
+    if sort in SORT_KEYS:
+        field, desc = SORT_KEYS[sort]
+        return (f"-{field}", "-pk") if desc else (field, "pk")
+    return ("-pk",)
+
+
+def paginate_ranked(ranked_ids, request):
+    """
+    Search relevance order lives in memory (products.search), so its cursor
+    is just the offset into the ranked id list.
+    """
+    limit = get_page_size(request)
+    offset = 0
+
+    token = request.GET.get("cursor")
+    if token:
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            offset = int(payload["o"])
+        except (ValueError, KeyError, TypeError):
+            raise InvalidCursor("Invalid cursor")
+        if payload.get("s") != "relevance" or offset < 0:
+            raise InvalidCursor("Cursor does not match sort")
+
+    page = ranked_ids[offset:offset + limit]
+    next_cursor = None
+    if offset + limit < len(ranked_ids):
+        raw = json.dumps({"s": "relevance", "o": offset + limit}, separators=(",", ":")).encode()
+        next_cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    return page, next_cursor
+
+
+def paginate_keyset(queryset, request, sort):
+    """
+    Returns (rows, next_cursor). Fetches limit + 1 rows to know if
+    another page exists without a COUNT(*).
+    """
+    limit = get_page_size(request)
+    queryset = apply_keyset(queryset, sort, request.GET.get("cursor"))
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1])
+
+    return rows, next_cursor
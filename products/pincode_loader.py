@@ -0,0 +1,220 @@
+"""
+Bulk loader for ProductPincodeAvailability (load_pincode_availability command).
+
+CSV, one row per (pincode, product):
+
+    pincode, product_id | product_slug, is_available, stock, cod_available, eta_days
+
+Missing value columns keep the stored value (or the model default for new
+rows), so a stock-only feed is just "pincode,product_id,stock". The file
+is read in chunks; each chunk fetches the current rows for exactly its
+(pincode, product) pairs in one query, drops rows that would not change
+anything and writes the rest with one multi-row upsert
+(INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE) per transaction.
+updated_at is set on every written row, which is what the per-worker
+serviceability index syncs from.
+"""
+import csv
+from collections import defaultdict, namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import Product, ProductPincodeAvailability, ServiceablePincode
+from .serviceability import parse_pincode
+
+
+VALUE_FIELDS = ("is_available", "stock", "cod_available", "eta_days")
+MAX_ETA_DAYS = 255      # serviceability index packs eta into 8 bits
+
+TRUE = {"1", "true", "yes", "y", "t"}
+FALSE = {"0", "false", "no", "n", "f", ""}
+
+
+class RowError(ValueError):
+    pass
+
+
+LoadRow = namedtuple("LoadRow", "line pincode product values")
+
+
+def _bool(value, field):
+    v = value.strip().lower()
+    if v in TRUE:
+        return True
+    if v in FALSE:
+        return False
+    raise RowError(f"bad {field} {value!r}")
+
+
+def _int(value, field, upper=None):
+    try:
+        n = int(value)
+    except ValueError:
+        raise RowError(f"bad {field} {value!r}")
+    if n < 0 or (upper is not None and n > upper):
+        raise RowError(f"{field} out of range: {n}")
+    return n
+
+
+def parse_row(line, raw, columns):
+    pincode = parse_pincode(raw.get("pincode"))
+    if pincode is None:
+        raise RowError(f"bad pincode {raw.get('pincode')!r}")
+
+    product = (raw.get("product_id") or "").strip() or (raw.get("product_slug") or "").strip()
+    if not product:
+        raise RowError("product_id or product_slug is required")
+
+    values = {}
+    for field in columns:
+        value = raw.get(field)
+        if value is None:
+            continue
+        if field in ("is_available", "cod_available"):
+            values[field] = _bool(value, field)
+        elif value.strip():
+            values[field] = _int(value, field, MAX_ETA_DAYS if field == "eta_days" else None)
+    return LoadRow(line, f"{pincode:06d}", product, values)
+
+
+class PincodeLoader:
+    def __init__(self, batch_size=5000, dry_run=False, create_pincodes=False, stdout=None):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.create_pincodes = create_pincodes
+        self.stdout = stdout
+        self.pincodes = dict(ServiceablePincode.objects.values_list("pincode", "id"))
+        self.stats = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0, "errors": 0, "new_pincodes": 0}
+        self.errors = []
+
+    def _error(self, line, message):
+        self.stats["errors"] += 1
+        if len(self.errors) < 50:
+            self.errors.append((line, message))
+
+    def run(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            header = set(reader.fieldnames or ())
+            if "pincode" not in header or not header & {"product_id", "product_slug"}:
+                raise RowError("CSV needs a pincode column and product_id or product_slug")
+            columns = [c for c in VALUE_FIELDS if c in header]
+
+            chunk = []
+            for line, raw in enumerate(reader, 2):
+                self.stats["rows"] += 1
+                try:
+                    chunk.append(parse_row(line, raw, columns))
+                except RowError as e:
+                    self._error(line, str(e))
+                if len(chunk) >= self.batch_size:
+                    self._flush(chunk)
+                    chunk = []
+            if chunk:
+                self._flush(chunk)
+
+        if not self.dry_run and (self.stats["inserted"] or self.stats["updated"]):
+            bump_catalog_version()
+        return self.stats
+
+    # ----- per chunk -----
+
+    def _resolve(self, chunk):
+        """ {(pincode_id, product_id): row} for rows whose pincode and product exist """
+        ids = {r.product for r in chunk if r.product.isdigit()}
+        slugs = {r.product for r in chunk if not r.product.isdigit()}
+        products = {}
+        if ids or slugs:
+            for pk, slug in Product.objects.filter(Q(pk__in=ids) | Q(slug__in=slugs)).values_list("pk", "slug"):
+                products[str(pk)] = pk
+                if slug in slugs:
+                    products[slug] = pk
+
+        missing_pins = {r.pincode for r in chunk} - self.pincodes.keys()
+        if missing_pins and self.create_pincodes:
+            self._add_pincodes(missing_pins)
+
+        out = {}
+        for r in chunk:
+            pincode_id = self.pincodes.get(r.pincode)
+            product_id = products.get(r.product)
+            if pincode_id is None:
+                self._error(r.line, f"pincode {r.pincode} is not serviceable (use --create-pincodes)")
+            elif product_id is None:
+                self._error(r.line, f"unknown product {r.product!r}")
+            else:
+                # later rows win within a chunk
+                out[(pincode_id, product_id)] = r
+        return out
+
+    def _add_pincodes(self, pincodes):
+        self.stats["new_pincodes"] += len(pincodes)
+        if self.dry_run:
+            # pretend ids so the rest of the chunk can be diffed
+            self.pincodes.update({pin: -i for i, pin in enumerate(sorted(pincodes), 1)})
+            return
+        ServiceablePincode.objects.bulk_create(
+            [ServiceablePincode(pincode=pin) for pin in sorted(pincodes)], ignore_conflicts=True
+        )
+        self.pincodes.update(ServiceablePincode.objects.filter(pincode__in=pincodes).values_list("pincode", "id"))
+
+    def _current(self, pairs):
+        """ {(pincode_id, product_id): row} for the chunk's pairs, one query """
+        by_pin = defaultdict(list)
+        for pincode_id, product_id in pairs:
+            if pincode_id > 0:
+                by_pin[pincode_id].append(product_id)
+        if not by_pin:
+            return {}
+        q = Q()
+        for pincode_id, product_ids in by_pin.items():
+            q |= Q(pincode_id=pincode_id, product_id__in=product_ids)
+        return {
+            (r.pincode_id, r.product_id): r
+            for r in ProductPincodeAvailability.objects.filter(q).only("id", "pincode_id", "product_id", *VALUE_FIELDS)
+        }
+
+    def _flush(self, chunk):
+        resolved = self._resolve(chunk)
+        current = self._current(resolved.keys())
+        now = timezone.now()
+
+        writes, inserted, updated = [], 0, 0
+        for (pincode_id, product_id), r in resolved.items():
+            old = current.get((pincode_id, product_id))
+            if old is None:
+                obj = ProductPincodeAvailability(pincode_id=pincode_id, product_id=product_id, **r.values)
+                inserted += 1
+            elif any(getattr(old, f) != v for f, v in r.values.items()):
+                # fresh instance without a pk: the upsert conflicts on (product, pincode), not id
+                values = {f: getattr(old, f) for f in VALUE_FIELDS}
+                values.update(r.values)
+                obj = ProductPincodeAvailability(pincode_id=pincode_id, product_id=product_id, **values)
+                updated += 1
+            else:
+                self.stats["unchanged"] += 1
+                continue
+            obj.updated_at = now
+            writes.append(obj)
+
+        if writes and not self.dry_run:
+            self._upsert(writes)
+        self.stats["inserted"] += inserted
+        self.stats["updated"] += updated
+
+        if self.stdout:
+            verb = "would write" if self.dry_run else "wrote"
+            self.stdout.write(
+                f"  line {chunk[-1].line}: {verb} {inserted} new + {updated} changed of {len(chunk)} rows"
+            )
+
+    def _upsert(self, objs):
+        kwargs = {"update_conflicts": True, "update_fields": [*VALUE_FIELDS, "updated_at"]}
+        if connection.features.supports_update_conflicts_with_target:
+            kwargs["unique_fields"] = ["product", "pincode"]
+        # MySQL: ON DUPLICATE KEY UPDATE on the (product, pincode) unique key
+        with transaction.atomic():
+            ProductPincodeAvailability.objects.bulk_create(objs, batch_size=1000, **kwargs)
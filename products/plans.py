@@ -0,0 +1,208 @@
+"""
+Compiled filter plans for the category PLP.
+
+Request params are canonicalized into ListingFilters; its shape (which
+filters are active, how many values each has, sort) picks a SQL template
+over ProductListing that is built once and reused with new params. The
+column names are resolved from the model once at import.
+"""
+from collections import namedtuple
+from decimal import ROUND_DOWN, Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.db import connection
+
+from .listing import sizes_mask
+from .models import ProductListing
+
+
+def _column(name):
+    return connection.ops.quote_name(ProductListing._meta.get_field(name).column)
+
+
+TABLE = connection.ops.quote_name(ProductListing._meta.db_table)
+COLUMNS = {
+    name: _column(name)
+    for name in (
+        "product", "subcategory", "brand_slug", "color_ids", "size_mask",
+        "payable_price", "discount_percent", "rating_avg", "popularity",
+    )
+}
+
+ORDER_BY = {
+    "low": f"{COLUMNS['payable_price']} ASC, {COLUMNS['product']} ASC",
+    "high": f"{COLUMNS['payable_price']} DESC, {COLUMNS['product']} DESC",
+    "discount": f"{COLUMNS['discount_percent']} DESC, {COLUMNS['product']} DESC",
+    "rating": f"{COLUMNS['rating_avg']} DESC, {COLUMNS['product']} DESC",
+    "popular": f"{COLUMNS['popularity']} DESC, {COLUMNS['product']} DESC",
+    "newest": f"{COLUMNS['product']} DESC",
+    "default": f"{COLUMNS['product']} DESC",
+}
+
+# /men/clothing/jeans/?offer=under999 shortcuts
+OFFER_SHORTCUTS = {
+    "under999": ("max_price", "999"),
+    "under1499": ("max_price", "1499"),
+    "min30": ("min_offer", "30"),
+    "min40": ("min_offer", "40"),
+    "min50": ("min_offer", "50"),
+}
+
+
+ListingFilters = namedtuple(
+    "ListingFilters",
+    "subcategory_id brands color_ids size_mask min_price max_price offer_filter min_offer max_offer search_ids sort",
+)
+
+
+CENT = Decimal("0.01")
+
+# largest magnitude the payable_price column (and the SQL driver) can take
+_price_field = ProductListing._meta.get_field("payable_price")
+DECIMAL_LIMIT = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+
+
+def parse_decimal(value):
+    """
+    Request number -> Decimal in the columns' range and cents, or None for
+    empty, NaN/Infinity and out-of-range values.
+    """
+    if value in (None, ""):
+        return None
+    try:
+        d = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    if not d.is_finite() or d.copy_abs() >= DECIMAL_LIMIT:
+        return None
+    return d.quantize(CENT, rounding=ROUND_DOWN)
+
+
+def parse_price_range(value):
+    """
+    "1000-1500" -> (Decimal("1000"), Decimal("1499.99")): facet buckets are
+    half-open, the SQL filter is inclusive. Either side may be empty.
+    """
+    lo, sep, hi = (value or "").partition("-")
+    if not sep:
+        return None, None
+    lo, hi = parse_decimal(lo), parse_decimal(hi)
+    return lo, (hi - CENT if hi is not None else None)
+
+
+def canonical_filters(subcategory_id, params, color_ids_for, search_ids=None):
+    """
+    params: dict with sort / offer / price ("lo-hi" facet bucket) /
+    min_price / max_price / min_offer / max_offer (strings) and brands /
+    colors / sizes (lists), as read from GET.
+    Returns (ListingFilters, resolved params for the template/facets).
+    """
+    sort = params.get("sort") if params.get("sort") in ORDER_BY else "default"
+    offer = params.get("offer") or ""
+    min_price, max_price = params.get("min_price"), params.get("max_price")
+    min_offer, max_offer = params.get("min_offer"), params.get("max_offer")
+    bucket_min, bucket_max = parse_price_range(params.get("price"))
+    min_price = parse_decimal(min_price) if min_price else bucket_min
+    max_price = parse_decimal(max_price) if max_price else bucket_max
+    brands = list(params.get("brands") or [])
+
+    shortcut = OFFER_SHORTCUTS.get(offer)
+    if shortcut and shortcut[0] == "max_price":
+        max_price = max_price or parse_decimal(shortcut[1])
+    elif shortcut:
+        min_offer = min_offer or shortcut[1]
+    elif offer.startswith("brand-") and not brands:
+        brands = [offer.replace("brand-", "", 1)]
+
+    colors = params.get("colors") or []
+    filters = ListingFilters(
+        subcategory_id=subcategory_id,
+        brands=tuple(sorted(set(brands))),
+        # None = no color filter, () = colors asked for but none exist
+        color_ids=tuple(sorted(set(color_ids_for(colors)))) if colors else None,
+        size_mask=sizes_mask(params.get("sizes") or []),
+        min_price=min_price,
+        max_price=max_price,
+        offer_filter=bool(min_offer or max_offer),
+        min_offer=parse_decimal(min_offer),
+        max_offer=parse_decimal(max_offer),
+        search_ids=tuple(search_ids) if search_ids is not None else None,
+        sort=sort,
+    )
+    resolved = {
+        "brands": brands, "price": params.get("price") or "", "min_price": min_price, "max_price": max_price,
+        "min_offer": min_offer, "max_offer": max_offer,
+    }
+    return filters, resolved
+
+
+def _shape(f):
+    return (
+        len(f.brands),
+        len(f.color_ids) if f.color_ids else 0,
+        bool(f.size_mask),
+        f.min_price is not None,
+        f.max_price is not None,
+        f.offer_filter,
+        f.min_offer is not None,
+        f.max_offer is not None,
+        len(f.search_ids) if f.search_ids is not None else None,
+        f.sort,
+    )
+
+
+@lru_cache(maxsize=256)
+def compile_plan(shape):
+    """ SQL with %s placeholders, in the order _params() emits values. """
+    n_brands, n_colors, by_size, by_min_price, by_price, offer_filter, by_min_offer, by_max_offer, n_ids, sort = shape
+    c = COLUMNS
+
+    where = [f"{c['subcategory']} = %s"]
+    if n_ids is not None:
+        where.append(f"{c['product']} IN ({', '.join(['%s'] * n_ids)})")
+    if n_brands:
+        where.append(f"{c['brand_slug']} IN ({', '.join(['%s'] * n_brands)})")
+    if n_colors:
+        where.append("(" + " OR ".join([f"{c['color_ids']} LIKE %s"] * n_colors) + ")")
+    if by_size:
+        where.append(f"({c['size_mask']} & %s) > 0")
+    if offer_filter:
+        where.append(f"{c['discount_percent']} > 0")
+    if by_min_offer:
+        where.append(f"{c['discount_percent']} >= %s")
+    if by_max_offer:
+        where.append(f"{c['discount_percent']} <= %s")
+    if by_min_price:
+        where.append(f"{c['payable_price']} >= %s")
+    if by_price:
+        where.append(f"{c['payable_price']} <= %s")
+
+    return f"SELECT * FROM {TABLE} WHERE {' AND '.join(where)} ORDER BY {ORDER_BY[sort]}"
+
+
+def _params(f):
+    params = [f.subcategory_id]
+    if f.search_ids is not None:
+        params.extend(f.search_ids)
+    params.extend(f.brands)
+    if f.color_ids:
+        params.extend(f"%,{cid},%" for cid in f.color_ids)
+    if f.size_mask:
+        params.append(f.size_mask)
+    if f.min_offer is not None:
+        params.append(f.min_offer)
+    if f.max_offer is not None:
+        params.append(f.max_offer)
+    if f.min_price is not None:
+        params.append(f.min_price)
+    if f.max_price is not None:
+        params.append(f.max_price)
+    return params
+
+
+def run_plan(filters):
+    """ ProductListing rows for a canonical filter set, in sort order. """
+    if filters.color_ids == () or filters.search_ids == ():
+        return []
+    sql = compile_plan(_shape(filters))
+    return list(ProductListing.objects.raw(sql, _params(filters)))
@@ -0,0 +1,180 @@
+"""
+Sales-velocity popularity: sort=popular and bestseller badges.
+
+ProductSalesDaily counts units per product per day (the day the order
+was placed). An order adds its items when it enters a sold status and
+takes them back if it later drops out (cancelled / failed); see the
+Order receivers in signals.py. update_popularity() (update_popularity
+command, run hourly or nightly) turns the last WINDOW_DAYS of counters
+into, per product:
+
+    score          sum(units * 0.5 ** (age_days / HALF_LIFE_DAYS))
+    sold_7d/30d    plain unit totals
+    is_bestseller  top BESTSELLER_SHARE of its subcategory by sold_30d,
+                   with at least BESTSELLER_MIN_UNITS sold
+
+stored in ProductPopularity and copied onto ProductListing, whose
+(subcategory, popularity, product) index serves sort=popular.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from orders.models import OrderItem
+
+from .catalog import bump_catalog_version
+from .models import ProductListing, ProductPopularity, ProductSalesDaily
+
+
+SOLD_STATUSES = ("CONFIRMED", "SHIPPED", "DELIVERED")
+WINDOW_DAYS = 30
+HALF_LIFE_DAYS = 7
+BESTSELLER_SHARE = 0.1
+BESTSELLER_MIN_UNITS = 5
+
+LISTING_FIELDS = ("popularity", "sold_7d", "sold_30d", "is_bestseller")
+
+
+def is_sold(status):
+    return (status or "").upper() in SOLD_STATUSES
+
+
+# ---------------- COUNTERS ----------------
+
+def add_sales(day, units):
+    """ {product_id: +/- units} onto day's counters """
+    with transaction.atomic():
+        for product_id, delta in sorted(units.items()):
+            if not delta:
+                continue
+            counter = ProductSalesDaily.objects.filter(product_id=product_id, day=day)
+            if counter.update(units=F("units") + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    ProductSalesDaily.objects.create(product_id=product_id, day=day, units=delta)
+            except IntegrityError:
+                # a concurrent order created the row first
+                counter.update(units=F("units") + delta)
+
+
+def order_status_changed(order, old_status):
+    """ Count the order's items in or out when it crosses the sold / not sold line. """
+    if is_sold(old_status) == is_sold(order.status):
+        return
+    sign = 1 if is_sold(order.status) else -1
+
+    units = defaultdict(int)
+    for product_id, quantity in OrderItem.objects.filter(order=order).values_list("product_id", "quantity"):
+        units[product_id] += sign * quantity
+    day = timezone.localdate(order.created_at) if order.created_at else timezone.localdate()
+    add_sales(day, units)
+
+
+def _models(apps=None):
+    """ (OrderItem, ProductSalesDaily, ProductPopularity, ProductListing), historical in migrations """
+    if apps is None:
+        return OrderItem, ProductSalesDaily, ProductPopularity, ProductListing
+    return (
+        apps.get_model("orders", "OrderItem"),
+        apps.get_model("products", "ProductSalesDaily"),
+        apps.get_model("products", "ProductPopularity"),
+        apps.get_model("products", "ProductListing"),
+    )
+
+
+def backfill_sales(apps=None):
+    """ Rebuild every counter from OrderItem history; returns the number of rows. """
+    item_model, daily_model, _, _ = _models(apps)
+    rows = (
+        item_model.objects.filter(order__status__in=SOLD_STATUSES)
+        .annotate(day=TruncDate("order__created_at"))
+        .values("product_id", "day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    )
+    counters = [daily_model(product_id=r["product_id"], day=r["day"], units=r["units"]) for r in rows]
+    with transaction.atomic():
+        daily_model.objects.all().delete()
+        daily_model.objects.bulk_create(counters, batch_size=1000)
+    return len(counters)
+
+
+# ---------------- SCORES ----------------
+
+def compute_scores(today, apps=None):
+    """ {product_id: [score, sold_7d, sold_30d]} from the last WINDOW_DAYS of counters """
+    _, daily_model, _, _ = _models(apps)
+    start = today - timedelta(days=WINDOW_DAYS - 1)
+    stats = {}
+    rows = (
+        daily_model.objects.filter(day__gte=start, day__lte=today, units__gt=0)
+        .values_list("product_id", "day", "units")
+    )
+    for product_id, day, units in rows.iterator(chunk_size=5000):
+        age = (today - day).days
+        s = stats.setdefault(product_id, [0.0, 0, 0])
+        s[0] += units * 0.5 ** (age / HALF_LIFE_DAYS)
+        if age < 7:
+            s[1] += units
+        s[2] += units
+    return stats
+
+
+def _bestsellers(listings, stats):
+    """ product ids in the top BESTSELLER_SHARE of their subcategory by sold_30d """
+    by_subcat = defaultdict(list)
+    for product_id, subcat_id in listings:
+        by_subcat[subcat_id].append(product_id)
+
+    out = set()
+    for product_ids in by_subcat.values():
+        top = max(1, math.ceil(len(product_ids) * BESTSELLER_SHARE))
+        sold = sorted(
+            (stats[pid][2], pid) for pid in product_ids
+            if pid in stats and stats[pid][2] >= BESTSELLER_MIN_UNITS
+        )
+        out.update(pid for _, pid in sold[-top:])
+    return out
+
+
+def update_popularity(today=None, batch_size=1000, apps=None):
+    """ Recompute ProductPopularity and the listing copies; returns (scored, listings changed). """
+    _, _, popularity_model, listing_model = _models(apps)
+    today = today or timezone.localdate()
+    stats = compute_scores(today, apps=apps)
+
+    current = {
+        row[0]: row for row in
+        listing_model.objects.values_list("product_id", "subcategory_id", *LISTING_FIELDS).iterator(chunk_size=5000)
+    }
+    bestsellers = _bestsellers(((pid, row[1]) for pid, row in current.items()), stats)
+
+    rows, changed = [], []
+    for product_id, (score, sold_7d, sold_30d) in stats.items():
+        rows.append(popularity_model(
+            product_id=product_id, score=Decimal(f"{score:.4f}"), sold_7d=sold_7d, sold_30d=sold_30d,
+            is_bestseller=product_id in bestsellers,
+        ))
+
+    for product_id, row in current.items():
+        score, sold_7d, sold_30d = stats.get(product_id, (0.0, 0, 0))
+        new = (Decimal(f"{score:.4f}"), sold_7d, sold_30d, product_id in bestsellers)
+        if tuple(row[2:]) != new:
+            changed.append(listing_model(product_id=product_id, **dict(zip(LISTING_FIELDS, new))))
+
+    with transaction.atomic():
+        popularity_model.objects.all().delete()
+        popularity_model.objects.bulk_create(rows, batch_size=batch_size)
+        # updated_at stays: popularity alone should not re-send every product in delta feeds / sync
+        listing_model.objects.bulk_update(changed, LISTING_FIELDS, batch_size=batch_size)
+
+    if changed and apps is None:
+        bump_catalog_version()
+    return len(rows), len(changed)
@@ -0,0 +1,16 @@
+from decimal import Decimal
+
+
+def payable_and_discount(price, discount_price):
+    """
+    Same rules as the old Coalesce / ExpressionWrapper annotations:
+    payable = discount_price or price, percent only for a real discount.
+    """
+    price = price or Decimal("0")
+    payable = discount_price if discount_price is not None else price
+
+    percent = Decimal("0")
+    if price > 0 and discount_price is not None and Decimal("0") < discount_price < price:
+        percent = ((price - discount_price) * Decimal("100.0") / price).quantize(Decimal("0.01"))
+
+    return payable, percent
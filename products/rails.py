@@ -0,0 +1,86 @@
+"""
+Home page product rails (GET /api/home/rails/).
+
+Per gender: newest arrivals, biggest discounts and bestsellers (units sold
+in the last 30 days, products/popularity.py), RAIL_SIZE in-stock cards
+each, read from ProductListing only. The built payload is kept in process
+for HOME_RAILS_TTL seconds whatever the catalog does (cart stock saves and
+price edits would otherwise rebuild it constantly), so the home page costs
+one query plus three per gender once per TTL and none in between.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.urls import reverse
+
+from .models import Gender, ProductListing
+
+
+RAIL_SIZE = 12
+CARD_FIELDS = (
+    "product_id", "name", "slug", "brand_name", "price", "discount_price",
+    "payable_price", "discount_percent", "first_image", "first_image_hash", "is_bestseller",
+)
+
+
+def card(listing):
+    return {
+        "id": listing.product_id,
+        "name": listing.name,
+        "slug": listing.slug,
+        "brand": listing.brand_name,
+        "price": str(listing.price),
+        "payable_price": str(listing.payable_price),
+        "discount_percent": float(listing.discount_percent),
+        "image": listing.image_url,
+        "image_srcset": listing.image_srcset,
+        "is_bestseller": listing.is_bestseller,
+        "url": reverse("product_detail", args=[listing.product_id]),
+    }
+
+
+def _listings(gender_id):
+    return ProductListing.objects.filter(category__gender_id=gender_id, in_stock=True).only(*CARD_FIELDS)
+
+
+def build_rails():
+    rails = []
+    for gender in Gender.objects.order_by("id"):
+        listings = _listings(gender.id)
+        rails.append({
+            "gender": gender.name,
+            "slug": gender.slug,
+            "new_arrivals": [card(l) for l in listings.order_by("-product_id")[:RAIL_SIZE]],
+            "top_discounts": [
+                card(l) for l in listings.filter(discount_percent__gt=0)
+                .order_by("-discount_percent", "-product_id")[:RAIL_SIZE]
+            ],
+            "bestsellers": [
+                card(l) for l in listings.filter(sold_30d__gt=0)
+                .order_by("-sold_30d", "-popularity", "-product_id")[:RAIL_SIZE]
+            ],
+        })
+    return rails
+
+
+# ---------------- PROCESS CACHE ----------------
+
+_lock = threading.Lock()
+_cached = {"built_at": 0.0, "data": None}
+
+
+def _fresh(ttl):
+    return _cached["data"] is not None and time.monotonic() - _cached["built_at"] < ttl
+
+
+def home_rails():
+    ttl = getattr(settings, "HOME_RAILS_TTL", 300)
+    if _fresh(ttl):
+        return _cached["data"]
+
+    with _lock:
+        # another thread may have rebuilt while we waited
+        if not _fresh(ttl):
+            _cached.update(data={"rails": build_rails()}, built_at=time.monotonic())
+        return _cached["data"]
@@ -0,0 +1,93 @@
+"""
+Per-product rating totals (ProductRatingSummary) for orders.ProductRating.
+
+Each rating create / edit / delete applies its delta with one F()
+UPDATE inside a transaction, so concurrent ratings never lose a count,
+and copies the new average onto the product's ProductListing row
+(rating_avg / rating_count) for cards and sort=rating. Bulk writes skip
+the signals; rebuild_summaries() (rebuild_rating_summaries command)
+recomputes everything from the ratings table.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .listing import listing_rating, refresh_listing
+from .models import ProductListing, ProductRatingSummary
+
+
+STARS = range(1, 6)
+
+
+def apply_rating(product_id, old=None, new=None):
+    """ One rating added (old=None), changed, or removed (new=None); stars 1-5. """
+    # out-of-range values are not counted (same as rebuild_summaries)
+    old = old if old in STARS else None
+    new = new if new in STARS else None
+    if old == new:
+        return
+    updates = {
+        "count": F("count") + ((new is not None) - (old is not None)),
+        "total": F("total") + ((new or 0) - (old or 0)),
+        "updated_at": timezone.now(),
+    }
+    if old is not None:
+        updates[f"stars_{old}"] = F(f"stars_{old}") - 1
+    if new is not None:
+        updates[f"stars_{new}"] = F(f"stars_{new}") + 1
+
+    with transaction.atomic():
+        ProductRatingSummary.objects.get_or_create(product_id=product_id)
+        # the UPDATE row lock serializes concurrent raters until commit
+        ProductRatingSummary.objects.filter(pk=product_id).update(**updates)
+        summary = ProductRatingSummary.objects.get(pk=product_id)
+        avg, count = listing_rating(summary)
+        ProductListing.objects.filter(pk=product_id).update(
+            rating_avg=avg, rating_count=count, updated_at=timezone.now()
+        )
+    bump_catalog_version()
+
+
+def rebuild_summaries(batch_size=1000, apps=None):
+    """
+    Recompute every summary from orders.ProductRating; returns products with ratings.
+    Pass a migration's apps to use its historical models.
+    """
+    if apps is None:
+        from orders.models import ProductRating
+        summary_model, listing_model = ProductRatingSummary, ProductListing
+    else:
+        ProductRating = apps.get_model("orders", "ProductRating")
+        summary_model = apps.get_model("products", "ProductRatingSummary")
+        listing_model = apps.get_model("products", "ProductListing")
+
+    rows = (
+        ProductRating.objects.filter(rating__in=STARS)
+        .values("product_id")
+        .annotate(
+            n=Count("id"), total=Sum("rating"),
+            **{f"s{star}": Count("id", filter=Q(rating=star)) for star in STARS},
+        )
+        .order_by("product_id")
+    )
+    summaries = [
+        summary_model(
+            product_id=r["product_id"], count=r["n"], total=r["total"],
+            **{f"stars_{star}": r[f"s{star}"] for star in STARS},
+        )
+        for r in rows
+    ]
+
+    stale = set(summary_model.objects.values_list("product_id", flat=True))
+    stale |= set(listing_model.objects.filter(rating_count__gt=0).values_list("product_id", flat=True))
+    with transaction.atomic():
+        summary_model.objects.all().delete()
+        summary_model.objects.bulk_create(summaries, batch_size=batch_size)
+
+    ids = sorted(stale | {s.product_id for s in summaries})
+    for i in range(0, len(ids), batch_size):
+        refresh_listing(ids[i:i + batch_size], apps=apps)
+    if apps is None:
+        bump_catalog_version()
+    return len(summaries)
@@ -0,0 +1,317 @@
+"""
+In-process product search.
+
+Inverted index over ProductListing name / brand / category / subcategory,
+ranked with BM25. Each worker keeps its own index and syncs incrementally
+from ProductListing.updated_at, so no external search service is needed.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Max
+
+from ajio.query_budget import unbudgeted
+
+from .models import ProductListing
+
+
+# field -> weight (a brand/subcategory hit counts more than a category hit)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "brand_name": 2.0,
+    "subcategory_name": 2.0,
+    "category_name": 1.0,
+}
+
+# groups of words that mean the same thing; override with settings.SEARCH_SYNONYMS
+DEFAULT_SYNONYMS = [
+    ["tshirt", "tee", "t-shirt"],
+    ["jean", "denim"],
+    ["trouser", "pant", "chino"],
+    ["sneaker", "shoe", "trainer"],
+    ["kurta", "kurti"],
+    ["sweatshirt", "hoodie"],
+    ["jacket", "coat"],
+    ["bag", "handbag"],
+]
+
+K1 = 1.2
+B = 0.75
+MAX_RESULTS = 500
+PREFIX_EXPANSIONS = 20
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+# ---------------- ANALYSIS ----------------
+
+def stem(token):
+    """ Tiny plural stemmer: shirts->shirt, dresses->dress, accessories->accessory """
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith(("sses", "ches", "shes", "xes", "zes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text, with_parts=False):
+    """
+    Lowercase, drop accents, join hyphenated words (t-shirt -> tshirt), stem.
+    with_parts also keeps the pieces of a compound (t-shirt -> tshirt, shirt)
+    so documents still match a search for just "shirt".
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = text.encode("ascii", "ignore").decode().lower()
+
+    out = []
+    for word in _WORD_RE.findall(text):
+        pieces = _TOKEN_RE.findall(word)
+        out.append(stem("".join(pieces)))
+        if with_parts and len(pieces) > 1:
+            out.extend(stem(p) for p in pieces if len(p) > 1)
+    return out
+
+
+def _synonym_map():
+    groups = getattr(settings, "SEARCH_SYNONYMS", DEFAULT_SYNONYMS)
+    out = defaultdict(set)
+    for group in groups:
+        terms = {t for word in group for t in tokenize(word)}
+        for t in terms:
+            out[t] |= terms
+    return out
+
+
+# ---------------- INDEX ----------------
+
+class SearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.synonyms = _synonym_map()
+        self._reset()
+
+    def _reset(self):
+        self.postings = defaultdict(dict)   # term -> {product_id: weighted tf}
+        self.doc_terms = {}                 # product_id -> {term: weighted tf}
+        self.doc_len = {}                   # product_id -> weighted length
+        self.total_len = 0.0
+
+        self.loaded = False
+        self.synced_at = None               # max ProductListing.updated_at seen
+        self.checked_at = 0.0               # monotonic time of last freshness check
+        self._sorted_terms = None           # lazily rebuilt for prefix lookups
+
+    # ----- writes -----
+
+    def _add(self, pid, row):
+        self._remove(pid)
+
+        terms = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for t in tokenize(row.get(field), with_parts=True):
+                terms[t] += weight
+        if not terms:
+            return
+
+        for t, tf in terms.items():
+            self.postings[t][pid] = tf
+        self.doc_terms[pid] = dict(terms)
+        self.doc_len[pid] = sum(terms.values())
+        self.total_len += self.doc_len[pid]
+        self._sorted_terms = None
+
+    def _remove(self, pid):
+        terms = self.doc_terms.pop(pid, None)
+        if not terms:
+            return
+        for t in terms:
+            docs = self.postings.get(t)
+            if docs is not None:
+                docs.pop(pid, None)
+                if not docs:
+                    del self.postings[t]
+        self.total_len -= self.doc_len.pop(pid, 0.0)
+        self._sorted_terms = None
+
+    def index_rows(self, rows):
+        with self.lock:
+            for row in rows:
+                self._add(row["pk"], row)
+
+    def remove_ids(self, ids):
+        with self.lock:
+            for pid in ids:
+                self._remove(pid)
+
+    # ----- sync with ProductListing -----
+
+    def _fields(self):
+        return ["pk", "updated_at", *FIELD_WEIGHTS]
+
+    def rebuild(self):
+        with self.lock:
+            self._reset()
+            latest = None
+            for row in ProductListing.objects.values(*self._fields()).iterator(chunk_size=2000):
+                self._add(row["pk"], row)
+                if latest is None or row["updated_at"] > latest:
+                    latest = row["updated_at"]
+            self.synced_at = latest
+            self.loaded = True
+            self.checked_at = time.monotonic()
+
+    def ensure_fresh(self):
+        """
+        One cheap MAX(updated_at) query every SEARCH_SYNC_SECONDS; only
+        changed listings are re-indexed. Deleted products are dropped at
+        read time because results are always joined back to ProductListing.
+        """
+        interval = getattr(settings, "SEARCH_SYNC_SECONDS", 5)
+        if self.loaded and time.monotonic() - self.checked_at < interval:
+            return
+
+        with self.lock:
+            if not self.loaded:
+                with unbudgeted():
+                    self.rebuild()
+                return
+
+            self.checked_at = time.monotonic()
+            latest = ProductListing.objects.aggregate(m=Max("updated_at"))["m"]
+            if latest is None or (self.synced_at and latest <= self.synced_at):
+                return
+
+            changed = ProductListing.objects.values(*self._fields())
+            if self.synced_at:
+                changed = changed.filter(updated_at__gte=self.synced_at)
+            with unbudgeted():
+                for row in changed.iterator(chunk_size=2000):
+                    self._add(row["pk"], row)
+            self.synced_at = latest
+
+    # ----- reads -----
+
+    def _prefix_terms(self, prefix):
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self.postings)
+        terms = self._sorted_terms
+        i = bisect_left(terms, prefix)
+        out = []
+        while i < len(terms) and terms[i].startswith(prefix) and len(out) < PREFIX_EXPANSIONS:
+            out.append(terms[i])
+            i += 1
+        return out
+
+    def _query_groups(self, query):
+        """
+        One group of alternative terms per query word:
+        merges split compounds ("t shirt" -> tshirt), adds synonyms,
+        and prefix-expands the last word (typeahead).
+        """
+        tokens = tokenize(query)
+
+        merged = []
+        i = 0
+        while i < len(tokens):
+            if i + 1 < len(tokens) and stem(tokens[i] + tokens[i + 1]) in self.postings:
+                merged.append(stem(tokens[i] + tokens[i + 1]))
+                i += 2
+            else:
+                merged.append(tokens[i])
+                i += 1
+
+        groups = []
+        for n, t in enumerate(merged):
+            alts = {t} | self.synonyms.get(t, set())
+            if n == len(merged) - 1 and len(t) >= 2:
+                alts |= set(self._prefix_terms(t))
+            alts = {a for a in alts if a in self.postings}
+            groups.append(alts)
+        return groups
+
+    def _score(self, groups, require_all):
+        n_docs = len(self.doc_terms) or 1
+        avg_len = (self.total_len / n_docs) or 1.0
+
+        scores = defaultdict(float)
+        hits = defaultdict(int)
+        for alts in groups:
+            best = {}
+            for term in alts:
+                docs = self.postings[term]
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for pid, tf in docs.items():
+                    norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * self.doc_len[pid] / avg_len))
+                    s = idf * norm
+                    if s > best.get(pid, 0.0):
+                        best[pid] = s
+            for pid, s in best.items():
+                scores[pid] += s
+                hits[pid] += 1
+
+        if require_all:
+            return {pid: s for pid, s in scores.items() if hits[pid] == len(groups)}
+        return scores
+
+    def search(self, query, limit=None):
+        """
+        Returns product ids, best match first. All words must match;
+        falls back to any-word matching when that finds nothing.
+        limit=None returns every match; the views go through
+        search_products(), which keeps the best MAX_RESULTS.
+        """
+        self.ensure_fresh()
+
+        with self.lock:
+            groups = self._query_groups(query)
+            if not groups:
+                return []
+
+            scores = {}
+            if all(groups):
+                scores = self._score(groups, require_all=True)
+            if not scores:
+                scores = self._score([g for g in groups if g], require_all=False)
+
+        if limit is not None and len(scores) > limit:
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda kv: (-kv[1], -kv[0]))
+        else:
+            ranked = sorted(scores.items(), key=lambda kv: (-kv[1], -kv[0]))
+        return [pid for pid, _ in ranked]
+
+
+_index = SearchIndex()
+
+
+def get_index():
+    return _index
+
+
+def search_products(query, limit=MAX_RESULTS):
+    """ Best `limit` matches; the id list ends up in a pk IN (...) so it is always capped """
+    return _index.search(query, limit=limit)
+
+
+def on_listings_changed(product_ids):
+    """
+    Called by listing.refresh_listing so the writing process sees its own
+    changes immediately; other workers pick them up in ensure_fresh().
+    """
+    if not _index.loaded:
+        return
+    rows = list(ProductListing.objects.filter(pk__in=product_ids).values(*_index._fields()))
+    with _index.lock:
+        _index.remove_ids(set(product_ids) - {r["pk"] for r in rows})
+        _index.index_rows(rows)
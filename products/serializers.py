@@ -1,3 +1,5 @@
+from decimal import InvalidOperation
+
 from rest_framework import serializers
 from .models import (
     Product, Category, SubCategory, Brand,
@@ -9,7 +11,7 @@ from .models import (
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = "__all__"
+        exclude = ["updated_at"]   # sync bookkeeping, not part of the API
 
 
 class SubCategorySerializer(serializers.ModelSerializer):
@@ -21,28 +23,79 @@ class SubCategorySerializer(serializers.ModelSerializer):
 class BrandSerializer(serializers.ModelSerializer):
     class Meta:
         model = Brand
-        fields = "__all__"
+        exclude = ["updated_at"]   # sync bookkeeping, not part of the API
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ["id", "url"]
+        fields = ["id", "url", "srcset"]
 
     def get_url(self, obj):
         request = self.context.get("request")
         if not obj.image:
             return ""
-        url = obj.image.url
+        url = obj.zoom_url
         return request.build_absolute_uri(url) if request else url
 
+    def get_srcset(self, obj):
+        return abs_srcset(self.context.get("request"), obj.srcset) if obj.image else ""
+
 
 class ProductSizeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductSize
-        fields = "__all__"
+        exclude = ["updated_at"]   # sync bookkeeping, not part of the API
+
+
+# ----------------- PREFETCH-AWARE HELPERS -----------------
+def first_image(obj):
+    """
+    obj.images.first() always runs a fresh ORDER BY id query, even after
+    prefetch_related("images"). Use the prefetched rows when they exist.
+    """
+    if "images" in getattr(obj, "_prefetched_objects_cache", {}):
+        images = [im for im in obj.images.all() if im.image]
+        return min(images, key=lambda im: im.id) if images else None
+    first = obj.images.first()
+    return first if first and first.image else None
+
+
+def abs_srcset(request, srcset):
+    """ "/media/a-160w.webp 160w, ..." with absolute URLs """
+    if not request or not srcset:
+        return srcset
+    return ", ".join(
+        f"{request.build_absolute_uri(url)} {width}"
+        for url, width in (part.rsplit(" ", 1) for part in srcset.split(", "))
+    )
+
+
+def rating_summary(obj):
+    """
+    Product's ProductRatingSummary or None. Load with
+    select_related("rating_summary") or each product costs a query.
+    """
+    return getattr(obj, "rating_summary", None)
+
+
+def rating_average(obj):
+    summary = rating_summary(obj)
+    return float(summary.average) if summary and summary.count else None
+
+
+def rating_count(obj):
+    summary = rating_summary(obj)
+    return summary.count if summary else 0
+
+
+def is_bestseller(obj):
+    """ Needs select_related("popularity") like rating_summary(). """
+    popularity = getattr(obj, "popularity", None)
+    return bool(popularity and popularity.is_bestseller)
 
 
 # ----------------- COMMON MIXIN FOR IMAGE URLS -----------------
@@ -53,47 +106,143 @@ class AbsUrlMixin:
         return request.build_absolute_uri(path) if request else path
 
 
+# ----------------- FIELD PROJECTION (?fields=id,name,image) -----------------
+class DynamicFieldsMixin:
+    """
+    Pass context={"fields": {...}} to keep only those fields.
+    Dropped SerializerMethodFields are never evaluated (no extra queries).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = self.context.get("fields")
+        if wanted:
+            for name in set(self.fields) - set(wanted):
+                self.fields.pop(name)
+
+
 # ----------------- PRODUCT LIST SERIALIZER -----------------
-class ProductSerializer(serializers.ModelSerializer, AbsUrlMixin):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer, AbsUrlMixin):
     brand = serializers.CharField(source="brand.name", read_only=True)
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
     sizes = serializers.SerializerMethodField()
     discount_percent = serializers.SerializerMethodField()
+    rating = serializers.SerializerMethodField()
+    rating_count = serializers.SerializerMethodField()
+    is_bestseller = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
         fields = [
             "id", "name", "brand", "slug",
             "price", "discount_price", "discount_percent",
-            "image", "images", "sizes"
+            "image", "image_srcset", "images", "sizes",
+            "rating", "rating_count", "is_bestseller",
         ]
 
+    # card-size JPEG + WebP srcset; originals until derivatives exist
     def get_image(self, obj):
         request = self.context.get("request")
-        first = obj.images.first()
-        if first and first.image:
-            return self.abs_url(request, first.image.url)
+        first = first_image(obj)
+        if first:
+            return self.abs_url(request, first.card_url)
         return ""
 
+    def get_image_srcset(self, obj):
+        first = first_image(obj)
+        return abs_srcset(self.context.get("request"), first.srcset) if first else ""
+
     def get_images(self, obj):
         request = self.context.get("request")
         out = []
         for img in obj.images.all():
             if img.image:
-                out.append(self.abs_url(request, img.image.url))
+                out.append(self.abs_url(request, img.zoom_url))
         return out
 
     def get_sizes(self, obj):
         return [{"size": s.size, "stock": s.stock} for s in obj.sizes.all()]
 
     def get_discount_percent(self, obj):
-        try:
-            if obj.price and obj.discount_price and obj.discount_price > 0 and obj.discount_price < obj.price:
-                return round(((obj.price - obj.discount_price) / obj.price) * 100, 0)
-        except:
-            pass
-        return 0
+        return discount_percent(obj)
+
+    def get_rating(self, obj):
+        return rating_average(obj)
+
+    def get_rating_count(self, obj):
+        return rating_count(obj)
+
+    def get_is_bestseller(self, obj):
+        return is_bestseller(obj)
+
+
+def discount_percent(obj):
+    try:
+        if obj.price and obj.discount_price and obj.discount_price > 0 and obj.discount_price < obj.price:
+            return round(((obj.price - obj.discount_price) / obj.price) * 100, 0)
+    except (TypeError, InvalidOperation, ZeroDivisionError):
+        pass
+    return 0
+
+
+# ----------------- PRODUCT LIST FAST PATH -----------------
+_money = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+def product_list_data(products, request=None, fields=None):
+    """
+    Read-only twin of ProductSerializer(products, many=True).data built as
+    plain dicts. Expects select_related("brand") and prefetched images/sizes
+    (when those fields are wanted), so the query count never depends on
+    the number of products.
+    """
+    def url(path):
+        return request.build_absolute_uri(path) if request else path
+
+    want = set(fields) if fields else set(ProductSerializer.Meta.fields)
+    need_images = bool(want & {"image", "image_srcset", "images"})
+
+    out = []
+    for p in products:
+        row = {}
+        if "id" in want:
+            row["id"] = p.id
+        if "name" in want:
+            row["name"] = p.name
+        if "brand" in want:
+            row["brand"] = p.brand.name
+        if "slug" in want:
+            row["slug"] = p.slug
+        if "price" in want:
+            row["price"] = _money.to_representation(p.price)
+        if "discount_price" in want:
+            row["discount_price"] = (
+                _money.to_representation(p.discount_price) if p.discount_price is not None else None
+            )
+        if "discount_percent" in want:
+            row["discount_percent"] = discount_percent(p)
+
+        if need_images:
+            images = sorted((im for im in p.images.all() if im.image), key=lambda im: im.id)
+            if "image" in want:
+                row["image"] = url(images[0].card_url) if images else ""
+            if "image_srcset" in want:
+                row["image_srcset"] = abs_srcset(request, images[0].srcset) if images else ""
+            if "images" in want:
+                row["images"] = [url(im.zoom_url) for im in images]
+
+        if "sizes" in want:
+            row["sizes"] = [{"size": s.size, "stock": s.stock} for s in p.sizes.all()]
+        if "rating" in want:
+            row["rating"] = rating_average(p)
+        if "rating_count" in want:
+            row["rating_count"] = rating_count(p)
+        if "is_bestseller" in want:
+            row["is_bestseller"] = is_bestseller(p)
+
+        out.append(row)
+    return out
 
 
 # ----------------- VARIANTS -----------------
@@ -110,18 +259,22 @@ class ColorSerializer(serializers.ModelSerializer):
 
 class VariantImageSerializer(serializers.ModelSerializer):
     url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = VariantImage
-        fields = ["id", "url"]
+        fields = ["id", "url", "srcset"]
 
     def get_url(self, obj):
         request = self.context.get("request")
         if not obj.image:
             return ""
-        url = obj.image.url
+        url = obj.zoom_url
         return request.build_absolute_uri(url) if request else url
 
+    def get_srcset(self, obj):
+        return abs_srcset(self.context.get("request"), obj.srcset) if obj.image else ""
+
 
 class ProductVariantSerializer(serializers.ModelSerializer, AbsUrlMixin):
     color = ColorSerializer()
@@ -138,7 +291,7 @@ class ProductVariantSerializer(serializers.ModelSerializer, AbsUrlMixin):
         for im in obj.images.all():
             if not im.image:
                 continue
-            url = im.image.url
+            url = im.zoom_url
             out.append(request.build_absolute_uri(url) if request else url)
         return out
 
@@ -148,36 +301,60 @@ class ProductDetailSerializer(serializers.ModelSerializer, AbsUrlMixin):
 
     # ADD THESE FOR QUICK VIEW
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     images = serializers.SerializerMethodField()
     sizes = serializers.SerializerMethodField()
 
     variants = ProductVariantSerializer(many=True, read_only=True)
     base_color = ColorSerializer()
 
+    rating = serializers.SerializerMethodField()
+    rating_count = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
+    is_bestseller = serializers.SerializerMethodField()
+
     class Meta:
         model = Product
         fields = [
             "id", "name", "brand",
             "price", "discount_price",
             "color_name", "base_color",
-            "image", "images", "sizes",
-            "variants"
+            "image", "image_srcset", "images", "sizes",
+            "variants",
+            "rating", "rating_count", "rating_histogram", "is_bestseller",
         ]
 
+    def get_rating(self, obj):
+        return rating_average(obj)
+
+    def get_rating_count(self, obj):
+        return rating_count(obj)
+
+    def get_rating_histogram(self, obj):
+        summary = rating_summary(obj)
+        return summary.histogram if summary else {str(star): 0 for star in range(5, 0, -1)}
+
+    def get_is_bestseller(self, obj):
+        return is_bestseller(obj)
+
     def get_image(self, obj):
         request = self.context.get("request")
-        first = obj.images.first()
-        if first and first.image:
-            return self.abs_url(request, first.image.url)
+        first = first_image(obj)
+        if first:
+            return self.abs_url(request, first.zoom_url)
         return ""
 
+    def get_image_srcset(self, obj):
+        first = first_image(obj)
+        return abs_srcset(self.context.get("request"), first.srcset) if first else ""
+
     def get_images(self, obj):
         request = self.context.get("request")
         out = []
         for im in obj.images.all():
             if not im.image:
                 continue
-            url = im.image.url
+            url = im.zoom_url
             out.append(request.build_absolute_uri(url) if request else url)
         return out
     
@@ -0,0 +1,244 @@
+"""
+In-process pincode serviceability index.
+
+Serviceable pincodes live in a dict keyed by the 6-digit pincode as an
+int. Per-pincode product availability is two parallel sorted arrays
+(product ids, packed flags/eta/stock), looked up with bisect, so a single
+or batched check costs no query. Workers sync incrementally from
+updated_at every PINCODE_SYNC_SECONDS; deleting an availability row
+touches its pincode so other workers reload that pincode's table.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from ajio.query_budget import unbudgeted
+
+from .models import ProductPincodeAvailability, ServiceablePincode
+
+
+Availability = namedtuple("Availability", "is_available cod_available eta_days stock")
+
+# packed value: bit 0 available, bit 1 COD, bits 2-9 eta days, bits 10+ stock
+_AVAILABLE = 1
+_COD = 2
+_ETA_SHIFT = 2
+_ETA_MASK = 0xFF
+_STOCK_SHIFT = 10
+_MAX_STOCK = (1 << (64 - _STOCK_SHIFT)) - 1
+
+
+def parse_pincode(value):
+    """ "560001" -> 560001, anything that is not 6 digits -> None """
+    s = str(value or "").strip()
+    if len(s) != 6 or not s.isdigit():
+        return None
+    return int(s)
+
+
+def _pack(is_available, cod_available, eta_days, stock):
+    return (
+        (_AVAILABLE if is_available else 0)
+        | (_COD if cod_available else 0)
+        | (min(int(eta_days or 0), _ETA_MASK) << _ETA_SHIFT)
+        | (min(int(stock or 0), _MAX_STOCK) << _STOCK_SHIFT)
+    )
+
+
+def _unpack(value):
+    return Availability(
+        is_available=bool(value & _AVAILABLE),
+        cod_available=bool(value & _COD),
+        eta_days=(value >> _ETA_SHIFT) & _ETA_MASK,
+        stock=value >> _STOCK_SHIFT,
+    )
+
+
+class PincodeTable:
+    """ Sorted product ids + packed availability for one pincode. """
+
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.ids = array("Q")
+        self.values = array("Q")
+
+    def set(self, product_id, value):
+        i = bisect_left(self.ids, product_id)
+        if i < len(self.ids) and self.ids[i] == product_id:
+            self.values[i] = value
+        else:
+            self.ids.insert(i, product_id)
+            self.values.insert(i, value)
+
+    def get(self, product_id):
+        i = bisect_left(self.ids, product_id)
+        if i < len(self.ids) and self.ids[i] == product_id:
+            return self.values[i]
+        return None
+
+
+class ServiceabilityIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pins = {}              # pincode int -> (city, state)
+        self.pin_by_id = {}         # ServiceablePincode pk -> pincode int
+        self.tables = {}            # pincode int -> PincodeTable
+        self.loaded = False
+        self.pins_synced = None     # (max updated_at, count, id sum) of ServiceablePincode
+        self.avail_synced = None    # max ProductPincodeAvailability.updated_at
+        self.checked_at = 0.0
+
+    # ----- loading -----
+
+    def _avail_rows(self, queryset):
+        return queryset.values_list(
+            "product_id", "pincode_id", "is_available", "cod_available", "eta_days", "stock"
+        ).iterator(chunk_size=5000)
+
+    def _load_pins(self, queryset):
+        for pk, pincode, city, state in queryset.values_list("pk", "pincode", "city", "state"):
+            pin = parse_pincode(pincode)
+            old = self.pin_by_id.pop(pk, None)
+            if old is not None and old != pin:
+                self.pins.pop(old, None)
+                self.tables.pop(old, None)
+            if pin is None:
+                continue
+            self.pin_by_id[pk] = pin
+            self.pins[pin] = (city, state)
+
+    def _apply_rows(self, rows):
+        for product_id, pincode_id, is_available, cod, eta, stock in rows:
+            pin = self.pin_by_id.get(pincode_id)
+            if pin is None:
+                continue
+            table = self.tables.get(pin)
+            if table is None:
+                table = self.tables[pin] = PincodeTable()
+            table.set(product_id, _pack(is_available, cod, eta, stock))
+
+    def _pin_state(self):
+        agg = ServiceablePincode.objects.aggregate(m=Max("updated_at"), n=Count("id"), s=Sum("id"))
+        return agg["m"], agg["n"], agg["s"]
+
+    def rebuild(self):
+        self._reset()
+        self.pins_synced = self._pin_state()
+        self.avail_synced = ProductPincodeAvailability.objects.aggregate(m=Max("updated_at"))["m"]
+        self._load_pins(ServiceablePincode.objects.all())
+
+        # bulk path: rows come sorted, so append instead of insort
+        for product_id, pincode_id, is_available, cod, eta, stock in self._avail_rows(
+            ProductPincodeAvailability.objects.order_by("pincode_id", "product_id")
+        ):
+            pin = self.pin_by_id.get(pincode_id)
+            if pin is None:
+                continue
+            table = self.tables.get(pin)
+            if table is None:
+                table = self.tables[pin] = PincodeTable()
+            table.ids.append(product_id)
+            table.values.append(_pack(is_available, cod, eta, stock))
+
+        self.loaded = True
+        self.checked_at = time.monotonic()
+
+    def _sync(self):
+        pins_state = self._pin_state()
+        avail_latest = ProductPincodeAvailability.objects.aggregate(m=Max("updated_at"))["m"]
+
+        old_max = self.pins_synced[0]
+        if pins_state[1:] != self.pins_synced[1:]:
+            # a pincode was added or removed: cheap enough to start over
+            self.rebuild()
+            return
+
+        if pins_state != self.pins_synced:
+            changed = ServiceablePincode.objects.all()
+            if old_max:
+                changed = changed.filter(updated_at__gte=old_max)
+            changed_ids = list(changed.values_list("pk", flat=True))
+            self._load_pins(ServiceablePincode.objects.filter(pk__in=changed_ids))
+            # reload whole tables so deleted availability rows disappear
+            for pk in changed_ids:
+                pin = self.pin_by_id.get(pk)
+                if pin is not None:
+                    self.tables.pop(pin, None)
+            self._apply_rows(self._avail_rows(
+                ProductPincodeAvailability.objects.filter(pincode_id__in=changed_ids)
+            ))
+            self.pins_synced = pins_state
+
+        if avail_latest and avail_latest != self.avail_synced:
+            changed = ProductPincodeAvailability.objects.all()
+            if self.avail_synced:
+                changed = changed.filter(updated_at__gte=self.avail_synced)
+            self._apply_rows(self._avail_rows(changed))
+            self.avail_synced = avail_latest
+
+    def ensure_fresh(self):
+        interval = getattr(settings, "PINCODE_SYNC_SECONDS", 5)
+        if self.loaded and time.monotonic() - self.checked_at < interval:
+            return
+
+        with self.lock:
+            if self.loaded and time.monotonic() - self.checked_at < interval:
+                return
+            with unbudgeted():
+                if not self.loaded:
+                    self.rebuild()
+                else:
+                    self.checked_at = time.monotonic()
+                    self._sync()
+
+    def expire(self):
+        """ Force a sync on the next lookup (this worker saw a change). """
+        self.checked_at = 0.0
+
+    # ----- reads -----
+
+    def pincode_info(self, pincode):
+        """ (city, state) if serviceable, else None """
+        self.ensure_fresh()
+        pin = parse_pincode(pincode)
+        with self.lock:
+            return self.pins.get(pin) if pin is not None else None
+
+    def check_many(self, product_ids, pincode):
+        """ {product_id: Availability or None (no row)}; empty dict if pincode is not serviceable. """
+        self.ensure_fresh()
+        pin = parse_pincode(pincode)
+        with self.lock:
+            if pin is None or pin not in self.pins:
+                return {}
+            table = self.tables.get(pin)
+            values = {pid: table.get(pid) if table is not None else None for pid in product_ids}
+        return {pid: _unpack(v) if v is not None else None for pid, v in values.items()}
+
+
+_index = ServiceabilityIndex()
+
+
+def get_serviceability_index():
+    return _index
+
+
+def pincode_info(pincode):
+    return _index.pincode_info(pincode)
+
+
+def check_availability(product_ids, pincode):
+    return _index.check_many(product_ids, pincode)
+
+
+def expire_serviceability():
+    _index.expire()
@@ -0,0 +1,213 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .listing import schedule_refresh
+from .stock import invalidate_stock
+from .serviceability import expire_serviceability
+from .catalog import bump_catalog_version
+from .images import schedule_derivatives
+from .sync import record_tombstone
+from .taxonomy import invalidate_taxonomy
+from .ratings import apply_rating
+from .popularity import order_status_changed
+from orders.models import Order, ProductRating
+from .models import (
+    Gender, Brand, Category, SubCategory, Color,
+    Product, ProductImage, ProductSize, ProductVariant, VariantImage, ProductListing,
+    ServiceablePincode, ProductPincodeAvailability,
+)
+
+
+# ---------------- LISTING READ MODEL ----------------
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    schedule_refresh(instance.id)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def product_child_changed(sender, instance, **kwargs):
+    schedule_refresh(instance.product_id)
+
+
+# ---------------- IMAGE DERIVATIVES ----------------
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=VariantImage)
+def image_replaced(sender, instance, **kwargs):
+    # a new file needs new derivatives; the old hash must not outlive it
+    if instance.pk and instance.image_hash:
+        old = sender.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+        if old != instance.image.name:
+            instance.image_hash = ""
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=VariantImage)
+def image_saved(sender, instance, **kwargs):
+    schedule_derivatives(instance)
+
+
+# ---------------- DELTA SYNC TOMBSTONES ----------------
+# deleted rows leave no updated_at behind; /api/products/changes/ reads these
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Brand)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductSize)
+@receiver(post_delete, sender=ProductImage)
+def catalog_row_deleted(sender, instance, **kwargs):
+    record_tombstone(sender, instance.pk)
+
+
+# ---------------- STOCK MAP ----------------
+# cart add / quantity / size changes all save ProductSize
+
+@receiver(post_save, sender=ProductSize)
+@receiver(post_delete, sender=ProductSize)
+def product_size_stock_changed(sender, instance, **kwargs):
+    invalidate_stock(instance.product_id)
+
+
+# ---------------- PINCODE SERVICEABILITY ----------------
+
+@receiver(post_delete, sender=ProductPincodeAvailability)
+def pincode_availability_deleted(sender, instance, **kwargs):
+    # deletes leave no updated_at behind; touching the pincode makes
+    # other workers reload that pincode's table
+    ServiceablePincode.objects.filter(pk=instance.pincode_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ServiceablePincode)
+@receiver(post_delete, sender=ServiceablePincode)
+@receiver(post_save, sender=ProductPincodeAvailability)
+@receiver(post_delete, sender=ProductPincodeAvailability)
+def pincode_availability_changed(sender, instance, **kwargs):
+    transaction.on_commit(expire_serviceability)
+
+
+# renames only touch the copied name/slug columns (updated_at bump -> search re-index)
+@receiver(post_save, sender=Brand)
+def brand_saved(sender, instance, **kwargs):
+    now = timezone.now()
+    ProductListing.objects.filter(brand_id=instance.id).update(
+        brand_name=instance.name, brand_slug=instance.slug, updated_at=now, facets_changed_at=now
+    )
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    ProductListing.objects.filter(category_id=instance.id).update(
+        category_name=instance.name, updated_at=timezone.now()
+    )
+
+
+@receiver(post_save, sender=SubCategory)
+def subcategory_saved(sender, instance, **kwargs):
+    now = timezone.now()
+    ProductListing.objects.filter(subcategory_id=instance.id).update(
+        subcategory_name=instance.name, updated_at=now, facets_changed_at=now
+    )
+
+
+# ---------------- NAV TAXONOMY ----------------
+# this worker rebuilds on the next request; others notice the stamp (taxonomy.py)
+
+@receiver(post_save, sender=Gender)
+@receiver(post_delete, sender=Gender)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def taxonomy_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_taxonomy)
+
+
+# ---------------- RATING SUMMARIES ----------------
+
+@receiver(pre_save, sender=ProductRating)
+def rating_changing(sender, instance, **kwargs):
+    # remember what the row held so post_save can apply just the difference
+    instance._previous_rating = (
+        sender.objects.filter(pk=instance.pk).values_list("product_id", "rating").first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ProductRating)
+def rating_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_rating", None)
+    if previous and previous[0] != instance.product_id:
+        apply_rating(previous[0], old=previous[1])
+        previous = None
+    apply_rating(instance.product_id, old=previous[1] if previous else None, new=instance.rating)
+
+
+@receiver(post_delete, sender=ProductRating)
+def rating_deleted(sender, instance, **kwargs):
+    apply_rating(instance.product_id, old=instance.rating)
+
+
+# ---------------- SALES COUNTERS (popularity) ----------------
+# every status write path (checkout, payment, admin, auto-delivery) saves the Order
+
+@receiver(pre_save, sender=Order)
+def order_status_changing(sender, instance, **kwargs):
+    instance._previous_status = (
+        sender.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def order_status_saved(sender, instance, **kwargs):
+    order_status_changed(instance, getattr(instance, "_previous_status", None))
+
+
+# ---------------- CATALOG VERSION (ETags / API cache) ----------------
+# connected after the listing receivers so the listing refresh commits first
+
+# ProductSize is not here: every cart add / update saves it, and bumping on each
+# of those would keep every ETag cold. Only a size appearing, going away or
+# crossing zero stock counts; exact stock comes from the stock map.
+CATALOG_MODELS = (
+    Gender, Category, SubCategory, Brand, Color,
+    Product, ProductImage, ProductVariant, VariantImage,
+    ServiceablePincode, ProductPincodeAvailability,
+)
+
+
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(pre_save, sender=ProductSize)
+def size_stock_changing(sender, instance, **kwargs):
+    instance._previous_stock = (
+        sender.objects.filter(pk=instance.pk).values_list("stock", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ProductSize)
+def size_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_previous_stock", None)
+    if created or previous is None or (previous > 0) != (instance.stock > 0):
+        bump_catalog_version()
+
+
+@receiver(post_delete, sender=ProductSize)
+def size_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+for _model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=_model, dispatch_uid=f"catalog_save_{_model.__name__}")
+    post_delete.connect(catalog_changed, sender=_model, dispatch_uid=f"catalog_delete_{_model.__name__}")
@@ -0,0 +1,251 @@
+"""
+Precomputed "Similar Styles" for the product detail page.
+
+Scores every product against nearby products of the same category on
+shared subcategory, brand, colors, price band and co-purchases (two
+products in the same OrderItem order). The ranked ids are stored in
+SimilarProducts by the build_similar_products command, so the PDP does
+one row lookup plus one ProductListing fetch.
+"""
+import math
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from orders.models import OrderItem
+
+from .listing import unpack_ids
+from .models import ProductListing, SimilarProducts
+
+
+WEIGHTS = {
+    "subcategory": 3.0,
+    "brand": 2.0,
+    "color": 1.0,
+    "price": 1.5,
+    "copurchase": 4.0,
+}
+
+STORED = 24             # ids kept per product (PDP shows 12; spares cover deletions)
+PRICE_WINDOW = 60       # neighbours by price on each side, per subcategory / brand
+MAX_ORDER_ITEMS = 20    # bigger orders say little about which products go together
+SKIP_STATUSES = ("CANCELLED", "FAILED")
+
+
+# ---------------- SIGNALS ----------------
+
+def copurchase_counts(product_ids=None):
+    """
+    {product_id: Counter(other_product_id -> orders containing both)}.
+    With product_ids, only orders that contain one of them are read.
+    """
+    items = OrderItem.objects.exclude(order__status__in=SKIP_STATUSES)
+    if product_ids is not None:
+        items = items.filter(
+            order_id__in=OrderItem.objects.filter(product_id__in=product_ids).values("order_id")
+        )
+
+    counts = defaultdict(Counter)
+
+    def flush(basket):
+        if 1 < len(basket) <= MAX_ORDER_ITEMS:
+            for a in basket:
+                for b in basket:
+                    if a != b:
+                        counts[a][b] += 1
+
+    current, basket = None, set()
+    for order_id, product_id in items.order_by("order_id").values_list("order_id", "product_id").iterator(chunk_size=5000):
+        if order_id != current:
+            flush(basket)
+            current, basket = order_id, set()
+        basket.add(product_id)
+    flush(basket)
+
+    return counts
+
+
+def _price_score(a, b):
+    """ 1.0 for the same price, 0 once one is twice the other """
+    if a <= 0 or b <= 0:
+        return 0.0
+    return max(0.0, 1.0 - abs(math.log(a / b)) / math.log(2))
+
+
+def score(a, b, co):
+    """ a, b: rows from _load_category; co: Counter of a's co-purchases """
+    s = 0.0
+    if a["subcategory_id"] == b["subcategory_id"]:
+        s += WEIGHTS["subcategory"]
+    if a["brand_id"] == b["brand_id"]:
+        s += WEIGHTS["brand"]
+    if a["colors"] & b["colors"]:
+        s += WEIGHTS["color"]
+    s += WEIGHTS["price"] * _price_score(a["price"], b["price"])
+    together = co.get(b["pk"], 0) if co else 0
+    if together:
+        s += WEIGHTS["copurchase"] * together / (together + 2)
+    return s
+
+
+# ---------------- RANKING ----------------
+
+def _load_category(category_id):
+    rows = {}
+    for r in ProductListing.objects.filter(category_id=category_id).values(
+        "pk", "subcategory_id", "brand_id", "color_ids", "payable_price", "in_stock",
+    ):
+        rows[r["pk"]] = {
+            "pk": r["pk"],
+            "subcategory_id": r["subcategory_id"],
+            "brand_id": r["brand_id"],
+            "colors": frozenset(unpack_ids(r["color_ids"])),
+            "price": float(r["payable_price"] or 0),
+            "in_stock": r["in_stock"],
+        }
+    return rows
+
+
+def _price_sorted(rows, key):
+    """ {group: (prices, ids)} with each group sorted by price """
+    groups = defaultdict(list)
+    for r in rows.values():
+        groups[r[key]].append((r["price"], r["pk"]))
+    out = {}
+    for group, pairs in groups.items():
+        pairs.sort()
+        out[group] = ([p for p, _ in pairs], [pid for _, pid in pairs])
+    return out
+
+
+def _window(sorted_group, price):
+    prices, ids = sorted_group
+    i = bisect_left(prices, price)
+    return ids[max(0, i - PRICE_WINDOW):i + PRICE_WINDOW]
+
+
+def rank_category(category_id, copurchases, only_ids=None):
+    """
+    {product_id: [similar ids, best first]} for products of one category.
+    Candidates are price neighbours in the same subcategory and brand plus
+    co-purchased products, so the cost stays linear in category size.
+    """
+    rows = _load_category(category_id)
+    by_subcat = _price_sorted(rows, "subcategory_id")
+    by_brand = _price_sorted(rows, "brand_id")
+
+    targets = rows.keys() if only_ids is None else [pid for pid in only_ids if pid in rows]
+
+    out = {}
+    for pid in targets:
+        a = rows[pid]
+        co = copurchases.get(pid)
+
+        candidates = set(_window(by_subcat[a["subcategory_id"]], a["price"]))
+        candidates.update(_window(by_brand[a["brand_id"]], a["price"]))
+        if co:
+            candidates.update(other for other in co if other in rows)
+        candidates.discard(pid)
+
+        ranked = sorted(
+            candidates,
+            key=lambda other: (-score(a, rows[other], co), not rows[other]["in_stock"], -other),
+        )
+        out[pid] = ranked[:STORED]
+    return out
+
+
+def save_ranked(ranked):
+    if not ranked:
+        return 0
+    # delete + insert, same as listing.refresh_listing
+    rows = [
+        SimilarProducts(product_id=pid, similar_ids=",".join(map(str, ids)))
+        for pid, ids in ranked.items()
+    ]
+    with transaction.atomic():
+        SimilarProducts.objects.filter(product_id__in=ranked.keys()).delete()
+        SimilarProducts.objects.bulk_create(rows)
+    return len(rows)
+
+
+# ---------------- BUILD ----------------
+
+def build_all(stdout=None):
+    """ Recompute every product, one category at a time. """
+    copurchases = copurchase_counts()
+    total = 0
+    category_ids = (
+        ProductListing.objects.order_by().values_list("category_id", flat=True).distinct()
+    )
+    for category_id in sorted(category_ids):
+        total += save_ranked(rank_category(category_id, copurchases))
+        if stdout:
+            stdout.write(f"  category {category_id}: {total} products done")
+    return total
+
+
+def refresh_changed(stdout=None):
+    """
+    Incremental run: since the last build, find listings that changed,
+    products without a row and products in new orders; recompute every
+    product in the subcategories they touch (a new product can enter any
+    neighbour's list) plus the co-purchased products themselves.
+    """
+    since = SimilarProducts.objects.aggregate(m=Max("computed_at"))["m"]
+    if since is None:
+        return build_all(stdout=stdout)
+
+    changed = set(
+        ProductListing.objects.filter(Q(updated_at__gt=since) | Q(product__similar__isnull=True))
+        .values_list("pk", flat=True)
+    )
+    ordered = set(
+        OrderItem.objects.filter(order__created_at__gt=since).values_list("product_id", flat=True)
+    )
+    if not changed and not ordered:
+        return 0
+
+    subcats = set(
+        ProductListing.objects.filter(pk__in=changed)
+        .values_list("subcategory_id", flat=True)
+    )
+    targets = defaultdict(set)      # category id -> product ids
+    for pid, category_id in ProductListing.objects.filter(
+        Q(subcategory_id__in=subcats) | Q(pk__in=ordered)
+    ).values_list("pk", "category_id"):
+        targets[category_id].add(pid)
+
+    all_ids = {pid for ids in targets.values() for pid in ids}
+    copurchases = copurchase_counts(all_ids)
+
+    total = 0
+    for category_id, ids in sorted(targets.items()):
+        total += save_ranked(rank_category(category_id, copurchases, only_ids=ids))
+        if stdout:
+            stdout.write(f"  category {category_id}: {total} products refreshed")
+    return total
+
+
+# ---------------- READ ----------------
+
+def similar_listings(product, limit=12):
+    """
+    Ranked ProductListing rows for the PDP. Products not built yet fall
+    back to same brand + subcategory, newest first (the old behaviour).
+    """
+    row = SimilarProducts.objects.filter(pk=product.pk).values_list("similar_ids", flat=True).first()
+    if row is None:
+        return list(
+            ProductListing.objects
+            .filter(subcategory_id=product.subcategory_id, brand_id=product.brand_id)
+            .exclude(pk=product.pk)
+            .order_by("-pk")[:limit]
+        )
+
+    ids = [int(x) for x in row.split(",") if x]
+    listings = ProductListing.objects.in_bulk(ids)
+    # deleted products simply drop out
+    return [listings[pid] for pid in ids if pid in listings][:limit]
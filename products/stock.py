@@ -0,0 +1,70 @@
+"""
+In-process "any size in stock" cache for the stock-map API.
+
+`stock` maps product id -> bool for every product looked up since the
+last reset. Ids are dict keys, never bit positions, so a request for
+huge ids costs no more than one for small ones; MAX_ENTRIES bounds it
+against scans over made-up ids. ProductSize saves/deletes (cart
+add/update/size change) drop the product's entry via signals; other
+workers catch up after STOCK_MAP_TTL.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from .models import ProductSize
+
+
+MAX_ENTRIES = 200_000
+
+
+class StockCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.stock = {}
+        self.loaded_at = time.monotonic()
+
+    def lookup(self, product_ids):
+        """ {product_id: bool} with at most one query for the uncached ids. """
+        ttl = getattr(settings, "STOCK_MAP_TTL", 30)
+
+        with self.lock:
+            if time.monotonic() - self.loaded_at > ttl or len(self.stock) > MAX_ENTRIES:
+                self._reset()
+            cached = {pid: self.stock[pid] for pid in product_ids if pid in self.stock}
+
+        missing = [pid for pid in product_ids if pid not in cached]
+        if missing:
+            stocked = set(
+                ProductSize.objects
+                .filter(product_id__in=missing, stock__gt=0)
+                .values_list("product_id", flat=True)
+                .distinct()
+            )
+            fetched = {pid: pid in stocked for pid in missing}
+            with self.lock:
+                self.stock.update(fetched)
+            cached.update(fetched)
+
+        return {pid: cached[pid] for pid in product_ids}
+
+    def invalidate(self, product_id):
+        if not product_id:
+            return
+        with self.lock:
+            self.stock.pop(product_id, None)
+
+
+_cache = StockCache()
+
+
+def stock_for(product_ids):
+    return _cache.lookup(product_ids)
+
+
+def invalidate_stock(product_id):
+    _cache.invalidate(product_id)
@@ -0,0 +1,274 @@
+"""
+Header search typeahead.
+
+Product names, brands and subcategories are held in a sorted key array
+(a flattened prefix trie): bisect to the prefix, walk forward while keys
+still match. Every word boundary of a name is a key, so "shi" finds
+"Cotton T-Shirt". Each prefix ranks all of its matches once and keeps the
+top entries until the next rebuild.
+
+Freshness follows the catalog version: when it moves, only listings
+updated since the last sync are compared with the index, and the index is
+rebuilt only if a suggested field changed or rows were added / deleted, so
+stock saves from the cart don't trigger rebuilds.
+
+Links are reversed to the live PLP route: a subcategory's own page, and
+for a brand the subcategory holding most of its products, with ?brand=.
+Brands with no routable page are not suggested.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import Count
+from django.urls import NoReverseMatch, reverse
+
+from ajio.query_budget import unbudgeted
+
+from .catalog import get_catalog_version
+from .models import Brand, ProductListing, SubCategory
+
+
+DEFAULT_LIMIT = 6
+TOP_CACHE_SIZE = 20000  # memoized (prefix, n) rankings per index
+PRODUCT_FIELDS = ("pk", "name", "brand_name", "first_image", "first_image_hash", "updated_at")
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+
+def plp_url(gender_slug, category_slug, subcategory_slug):
+    try:
+        return reverse("category_products", args=[gender_slug, category_slug, subcategory_slug])
+    except NoReverseMatch:      # gender not routed
+        return None
+
+
+def _words(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = text.encode("ascii", "ignore").decode().lower()
+    return _WORD_RE.findall(text)
+
+
+def normalize(text):
+    """ "Cotton T-Shirt" -> "cotton tshirt" """
+    return " ".join(re.sub(r"[-']", "", w) for w in _words(text))
+
+
+class PrefixIndex:
+    """ Sorted (key, ref) pairs; ref indexes into self.entries. """
+
+    def __init__(self):
+        self.keys = []
+        self.refs = []
+        self.entries = []
+        self._ref_of = {}       # id(entry) -> ref while building (one ref per entry)
+        self._top = {}          # (prefix, n) -> ranked entries
+
+    def add(self, text, entry):
+        raw = _words(text)
+        if not raw:
+            return
+        ref = self._ref_of.get(id(entry))
+        if ref is None:
+            ref = self._ref_of[id(entry)] = len(self.entries)
+            self.entries.append(entry)
+
+        words = [re.sub(r"[-']", "", w) for w in raw]
+        for i in range(len(words)):
+            rest = " ".join(words[i + 1:])
+            # i = word position (0 = name starts with prefix)
+            self.keys.append(f"{words[i]} {rest}".rstrip())
+            self.refs.append((i, ref))
+            # compound pieces: "t-shirt" is also found by "shirt"
+            for piece in re.split(r"[-']", raw[i])[1:]:
+                self.keys.append(f"{piece} {rest}".rstrip())
+                self.refs.append((i, ref))
+
+    def freeze(self):
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.keys = [self.keys[i] for i in order]
+        self.refs = [self.refs[i] for i in order]
+        self._ref_of = {}
+
+    def lookup(self, prefix):
+        """ {ref: best word_position} for every key starting with prefix. """
+        i = bisect_left(self.keys, prefix)
+        best = {}
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            pos, ref = self.refs[i]
+            if pos < best.get(ref, pos + 1):
+                best[ref] = pos
+            i += 1
+        return best
+
+    def top(self, prefix, n):
+        """
+        n best entries for prefix: earliest word match, then shortest name.
+        Every match is ranked; the result is kept per (prefix, n).
+        """
+        key = (prefix, n)
+        cached = self._top.get(key)
+        if cached is None:
+            entries = self.entries
+            ranked = heapq.nsmallest(
+                n, self.lookup(prefix).items(),
+                key=lambda hit: (hit[1], len(entries[hit[0]]["name"]), entries[hit[0]]["name"], hit[0]),
+            )
+            cached = [entries[ref] for ref, _ in ranked]
+            if len(self._top) >= TOP_CACHE_SIZE:
+                self._top.clear()
+            self._top[key] = cached
+        return cached
+
+
+class Suggester:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.products = PrefixIndex()
+        self.brands = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.version = None         # catalog version the index is synced to
+        self.synced_at = None       # latest listing updated_at seen
+        self.entries = {}           # product id -> entry
+        self.brand_rows = None
+        self.brand_subcats = None
+        self.subcat_rows = None
+        self.checked_at = 0.0
+
+    @staticmethod
+    def _entry(row):
+        return {
+            "id": row["pk"],
+            "name": row["name"],
+            "brand": row["brand_name"],
+            "image": row["first_image"],
+            "image_hash": row["first_image_hash"],
+        }
+
+    @staticmethod
+    def _brand_rows():
+        return list(Brand.objects.order_by("pk").values_list("name", "slug"))
+
+    @staticmethod
+    def _brand_subcats():
+        """ brand slug -> subcategory id with most of its listings (ties: lowest id) """
+        rows = (
+            ProductListing.objects.values_list("brand_slug", "subcategory_id")
+            .annotate(n=Count("pk")).order_by()
+        )
+        best = {}
+        for slug, subcat_id, _ in sorted(rows, key=lambda r: (-r[2], r[1])):
+            if slug:
+                best.setdefault(slug, subcat_id)
+        return best
+
+    @staticmethod
+    def _subcat_rows():
+        return list(
+            SubCategory.objects.order_by("pk").values_list(
+                "pk", "name", "slug", "category__slug", "category__name",
+                "category__gender__slug", "category__gender__name",
+            )
+        )
+
+    def _build(self, version):
+        products, brands, categories = PrefixIndex(), PrefixIndex(), PrefixIndex()
+
+        entries, synced_at = {}, None
+        for row in ProductListing.objects.values(*PRODUCT_FIELDS).iterator(chunk_size=2000):
+            entry = entries[row["pk"]] = self._entry(row)
+            products.add(row["name"], entry)
+            products.add(f"{row['brand_name']} {row['name']}", entry)
+            if synced_at is None or row["updated_at"] > synced_at:
+                synced_at = row["updated_at"]
+
+        subcat_rows = self._subcat_rows()
+        subcat_urls = {}
+        for pk, name, slug, cat_slug, cat_name, gender_slug, gender_name in subcat_rows:
+            url = plp_url(gender_slug, cat_slug, slug) if (slug and cat_slug and gender_slug) else None
+            if url is None:
+                continue
+            subcat_urls[pk] = url
+            categories.add(name, {"name": name, "category": cat_name, "gender": gender_name, "url": url})
+
+        brand_rows, brand_subcats = self._brand_rows(), self._brand_subcats()
+        for name, slug in brand_rows:
+            url = subcat_urls.get(brand_subcats.get(slug))
+            if url:
+                brands.add(name, {"name": name, "slug": slug, "url": f"{url}?{urlencode({'brand': slug})}"})
+
+        for idx in (products, brands, categories):
+            idx.freeze()
+
+        # swap in one go; readers keep using the old arrays until then
+        self.products, self.brands, self.categories = products, brands, categories
+        self.entries, self.brand_rows, self.subcat_rows = entries, brand_rows, subcat_rows
+        self.brand_subcats = brand_subcats
+        self.version, self.synced_at = version, synced_at
+
+    def _unchanged(self):
+        """
+        True when nothing the index shows changed since synced_at (e.g. a
+        stock-only listing refresh); moves synced_at forward.
+        """
+        changed = ProductListing.objects.values(*PRODUCT_FIELDS)
+        if self.synced_at is not None:
+            changed = changed.filter(updated_at__gte=self.synced_at)
+        latest = self.synced_at
+        for row in changed.iterator(chunk_size=2000):
+            old = self.entries.get(row["pk"])
+            if old is None or old != self._entry(row):
+                return False
+            if latest is None or row["updated_at"] > latest:
+                latest = row["updated_at"]
+        # deletes don't show up in updated_at
+        if ProductListing.objects.count() != len(self.entries):
+            return False
+        if self._brand_rows() != self.brand_rows or self._subcat_rows() != self.subcat_rows:
+            return False
+        if self._brand_subcats() != self.brand_subcats:
+            return False
+        self.synced_at = latest
+        return True
+
+    def ensure_fresh(self):
+        interval = getattr(settings, "SEARCH_SYNC_SECONDS", 5)
+        if self.version is not None and time.monotonic() - self.checked_at < interval:
+            return
+
+        with self.lock:
+            self.checked_at = time.monotonic()
+            version, _ = get_catalog_version()
+            if version == self.version:
+                return
+            with unbudgeted():
+                if self.version is not None and self._unchanged():
+                    self.version = version
+                else:
+                    self._build(version)
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        self.ensure_fresh()
+
+        prefix = normalize(query)
+        if not prefix:
+            return {"products": [], "brands": [], "categories": []}
+
+        return {
+            "products": self.products.top(prefix, limit),
+            "brands": self.brands.top(prefix, 3),
+            "categories": self.categories.top(prefix, 3),
+        }
+
+
+_suggester = Suggester()
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return _suggester.suggest(query, limit=limit)
+
@@ -0,0 +1,153 @@
+"""
+Catalog delta sync for clients that keep a local copy.
+
+    GET /api/products/changes/                 full snapshot
+    GET /api/products/changes/?since=<token>   only what changed
+
+The response is NDJSON, parents before children:
+
+    {"op": "upsert", "type": "product", "id": 7, "name": ..., ...}
+    {"op": "delete", "type": "size", "id": 31}
+    {"token": "5f0c2a..."}                      last line: pass as ?since=
+
+Upserts come from updated_at on each model, deletes from CatalogTombstone
+rows written by post_delete signals. The token is the request time; the
+next read starts SYNC_OVERLAP earlier so rows committed late by a slow
+transaction are not missed, which means a client can see the same upsert
+twice (apply them as idempotent writes). A token older than
+CATALOG_TOMBSTONE_DAYS gets a fresh snapshot, announced by
+{"reset": true}, because its tombstones may have been pruned.
+"""
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .images import derivative_url
+from .models import Brand, CatalogTombstone, Category, Product, ProductImage, ProductSize
+
+
+SYNC_OVERLAP = timedelta(seconds=10)
+CHUNK_SIZE = 2000
+
+
+def _image_row(row):
+    name, image_hash = row.pop("image"), row.pop("image_hash")
+    original = default_storage.url(name) if name else ""
+    row["url"] = derivative_url(image_hash, "zoom", fallback=original)
+    row["card"] = derivative_url(image_hash, "card", fallback=original)
+    return row
+
+
+def _money(row, *fields):
+    for f in fields:
+        if row[f] is not None:
+            row[f] = str(row[f])
+    return row
+
+
+# type -> (model, values() fields renamed for the client, row hook); parents first
+KINDS = {
+    "category": (Category, {"id": "id", "name": "name", "slug": "slug", "gender_id": "gender"}, None),
+    "brand": (Brand, {"id": "id", "name": "name", "slug": "slug"}, None),
+    "product": (
+        Product,
+        {
+            "id": "id", "name": "name", "slug": "slug", "brand_id": "brand",
+            "category_id": "category", "subcategory_id": "subcategory", "base_color_id": "color",
+            "price": "price", "discount_price": "discount_price",
+            "payable_price": "payable_price", "discount_percent": "discount_percent",
+        },
+        lambda row: _money(row, "price", "discount_price", "payable_price", "discount_percent"),
+    ),
+    "size": (ProductSize, {"id": "id", "product_id": "product", "size": "size", "stock": "stock"}, None),
+    "image": (
+        ProductImage, {"id": "id", "product_id": "product", "image": "image", "image_hash": "image_hash"}, _image_row,
+    ),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _, _) in KINDS.items()}
+
+
+# ---------------- TOKENS ----------------
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(dt):
+    return format(int(dt.timestamp() * 1_000_000), "x")
+
+
+def decode_token(token):
+    try:
+        micros = int(token, 16)
+        return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise InvalidToken("invalid sync token")
+
+
+def _retention():
+    return timedelta(days=getattr(settings, "CATALOG_TOMBSTONE_DAYS", 30))
+
+
+# ---------------- TOMBSTONES ----------------
+
+def record_tombstone(model, object_id):
+    kind = KIND_BY_MODEL.get(model)
+    if kind and object_id:
+        CatalogTombstone.objects.create(kind=kind, object_id=object_id)
+
+
+def prune_tombstones():
+    """ Drop tombstones past retention; clients that old get a reset snapshot anyway. """
+    return CatalogTombstone.objects.filter(deleted_at__lt=timezone.now() - _retention()).delete()[0]
+
+
+# ---------------- STREAM ----------------
+
+def _line(obj):
+    return json.dumps(obj, separators=(",", ":"), default=str) + "\n"
+
+
+def _upserts(kind, since):
+    model, fields, hook = KINDS[kind]
+    qs = model.objects.order_by("id").values(*fields)
+    if since is not None:
+        qs = qs.filter(updated_at__gte=since)
+    for row in qs.iterator(chunk_size=CHUNK_SIZE):
+        out = {"op": "upsert", "type": kind}
+        out.update((fields[k], v) for k, v in row.items())
+        if hook:
+            out = hook(out)
+        yield _line(out)
+
+
+def change_lines(since=None, now=None):
+    """
+    NDJSON lines for everything changed since the decoded token (None =
+    full snapshot). The last line carries the next token; clients should
+    only store it once they have seen it (a cut-off stream is simply retried).
+    """
+    now = now or timezone.now()
+    reset = since is not None and since < now - _retention()
+
+    if reset:
+        since = None
+        yield _line({"reset": True})
+    elif since is not None:
+        since -= SYNC_OVERLAP
+
+    for kind in KINDS:
+        yield from _upserts(kind, since)
+
+    if since is not None:
+        tombstones = (
+            CatalogTombstone.objects.filter(deleted_at__gte=since)
+            .order_by("id").values_list("kind", "object_id")
+        )
+        for kind, object_id in tombstones.iterator(chunk_size=CHUNK_SIZE):
+            yield _line({"op": "delete", "type": kind, "id": object_id})
+
+    yield _line({"token": encode_token(now)})
@@ -0,0 +1,208 @@
+"""
+In-memory taxonomy map for URL resolution.
+
+Gender / Category / SubCategory rows (and color names) are small and
+change rarely, so each worker keeps them in dicts keyed by slug. PLP
+requests resolve /<gender>/<category>/<subcategory>/ without a query.
+
+The same pass builds the nested nav tree (gender -> category ->
+subcategory with slugs, URLs and product counts) served by
+/api/taxonomy/ and the nav_taxonomy context processor. Taxonomy saves
+drop the map at once on the saving worker (signals.py). Other workers
+re-read the stamp (STAMPS plus the per-subcategory listing counts) at
+most every SEARCH_SYNC_SECONDS and rebuild only when it moved: a
+taxonomy row added or removed, a category saved, a product added,
+removed or moved to another subcategory. Price and stock edits leave it
+alone. Gender and color renames have no stamp and reach other workers
+within TAXONOMY_TTL.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import Http404
+from django.urls import NoReverseMatch, reverse
+
+from ajio.query_budget import unbudgeted
+
+from .models import Color, Category, Gender, ProductListing, SubCategory
+
+
+# taxonomy model -> aggregates that move when its rows would change the map
+STAMPS = (
+    (Gender, Count("pk"), Max("pk")),
+    (Category, Count("pk"), Max("updated_at")),
+    (SubCategory, Count("pk"), Max("pk")),
+    (Color, Count("pk"), Max("pk")),
+)
+
+
+def taxonomy_stamp():
+    """ (taxonomy aggregates, {subcategory id: listing count}); the counts feed the nav tree """
+    rows = tuple(
+        tuple(model.objects.aggregate(n=count, last=last).values())
+        for model, count, last in STAMPS
+    )
+    counts = dict(
+        ProductListing.objects.values("subcategory_id").annotate(n=Count("product_id"))
+        .order_by().values_list("subcategory_id", "n")
+    )
+    return rows, counts
+
+
+class TaxonomyMap:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+        self.genders = {}           # slug -> Gender
+        self.categories = {}        # (gender_id, slug) -> Category
+        self.subcats = {}           # (category_id, slug) -> SubCategory
+        self.subcats_by_gender = {} # (gender_id, slug) -> SubCategory (lowest id wins)
+        self.color_ids = {}         # color name -> [ids]
+        self.tree = []              # nav: [{gender, categories: [{..., subcategories: [...]}]}]
+        self.tree_by_slug = {}      # gender slug -> tree node
+
+    def _build(self, stamp):
+        genders = {g.slug: g for g in Gender.objects.exclude(slug=None)}
+        gender_by_id = {g.id: g for g in genders.values()}
+
+        categories, category_by_id = {}, {}
+        for c in Category.objects.exclude(slug=None).order_by("id"):
+            c.gender = gender_by_id.get(c.gender_id)
+            categories[(c.gender_id, c.slug)] = c
+            category_by_id[c.id] = c
+
+        subcats, by_gender = {}, {}
+        for sc in SubCategory.objects.exclude(slug=None).order_by("id"):
+            cat = category_by_id.get(sc.category_id)
+            if cat is None:
+                continue
+            sc.category = cat
+            subcats[(cat.id, sc.slug)] = sc
+            by_gender.setdefault((cat.gender_id, sc.slug), sc)
+
+        color_ids = {}
+        for cid, name in Color.objects.order_by("id").values_list("id", "name"):
+            color_ids.setdefault(name, []).append(cid)
+
+        self.tree = self._build_tree(genders, categories, subcats, counts=stamp[1])
+        self.tree_by_slug = {node["slug"]: node for node in self.tree}
+        self.genders, self.categories, self.subcats = genders, categories, subcats
+        self.subcats_by_gender, self.color_ids = by_gender, color_ids
+        self.stamp, self.built_at = stamp, time.monotonic()
+
+    @staticmethod
+    def _build_tree(genders, categories, subcats, counts):
+        def url(*slugs):
+            try:
+                return reverse("category_products", args=slugs)
+            except NoReverseMatch:      # gender not routed yet
+                return None
+
+        cat_nodes = {}
+        for sc in subcats.values():
+            cat = sc.category
+            node = cat_nodes.get(cat.id)
+            if node is None:
+                node = cat_nodes[cat.id] = {
+                    "id": cat.id, "name": cat.name, "slug": cat.slug,
+                    "url": None, "count": 0, "subcategories": [],
+                }
+            n = counts.get(sc.id, 0)
+            node["subcategories"].append({
+                "id": sc.id, "name": sc.name, "slug": sc.slug,
+                "url": url(cat.gender.slug, cat.slug, sc.slug), "count": n,
+            })
+            node["count"] += n
+        for node in cat_nodes.values():
+            # category link lands on its first subcategory that has products
+            subs = node["subcategories"]
+            node["url"] = next((s["url"] for s in subs if s["count"]), subs[0]["url"])
+
+        tree = []
+        for g in sorted(genders.values(), key=lambda g: g.id):
+            nodes = [
+                cat_nodes[c.id] for c in categories.values()
+                if c.gender_id == g.id and c.id in cat_nodes
+            ]
+            tree.append({
+                "id": g.id, "name": g.name, "slug": g.slug,
+                "count": sum(c["count"] for c in nodes), "categories": nodes,
+            })
+        return tree
+
+    def invalidate(self):
+        with self.lock:
+            self.stamp = None
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        interval = getattr(settings, "SEARCH_SYNC_SECONDS", 5)
+        if self.stamp is not None and now - self.checked_at < interval:
+            return
+        with self.lock:
+            if self.stamp is not None and now - self.checked_at < interval:
+                return
+            with unbudgeted():
+                stamp = taxonomy_stamp()
+                ttl = getattr(settings, "TAXONOMY_TTL", 300)
+                if stamp != self.stamp or now - self.built_at >= ttl:
+                    self._build(stamp)
+            self.checked_at = now
+
+    def resolve(self, gender, subcategory, category=None):
+        """
+        (Gender, Category, SubCategory) for URL slugs, Http404 when any is missing.
+        Same rules as the old get_object_or_404 chain.
+        """
+        self.ensure_fresh()
+
+        g = self.genders.get(gender)
+        if g is None:
+            raise Http404("No Gender matches the given query.")
+
+        if category:
+            cat = self.categories.get((g.id, category))
+            if cat is None:
+                raise Http404("No Category matches the given query.")
+            subcat = self.subcats.get((cat.id, subcategory))
+        else:
+            subcat = self.subcats_by_gender.get((g.id, subcategory))
+            cat = subcat.category if subcat else None
+
+        if subcat is None:
+            raise Http404("No SubCategory matches the given query.")
+        return g, cat, subcat
+
+    def nav_tree(self):
+        self.ensure_fresh()
+        return self.tree
+
+    def nav_by_slug(self):
+        self.ensure_fresh()
+        return self.tree_by_slug
+
+    def color_ids_for(self, names):
+        self.ensure_fresh()
+        out = []
+        for name in names:
+            out.extend(self.color_ids.get(name, ()))
+        return out
+
+
+_taxonomy = TaxonomyMap()
+
+
+def get_taxonomy():
+    return _taxonomy
+
+
+def resolve_category_path(gender, subcategory, category=None):
+    return _taxonomy.resolve(gender, subcategory, category)
+
+
+def invalidate_taxonomy():
+    _taxonomy.invalidate()
@@ -1,3 +1,1136 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from ajio import index_advisor
+
+from . import catalog, facets, feeds, images, pagination, rails, search, serviceability, stock, suggest, sync
+from .facets import get_category_facets
+from .importer import CatalogImporter
+from .listing import rebuild_all
+from .models import (
+    Brand, Category, Gender, Product, ProductImage, ProductListing, ProductPincodeAvailability,
+    ProductPopularity, ProductRatingSummary, ProductSize, ServiceablePincode, SubCategory,
+)
+from .pagination import order_for_sort
+from .pincode_loader import PincodeLoader, RowError
+from .pricing import payable_and_discount
+from .search import search_products
+from .serializers import ProductSerializer, discount_percent, product_list_data
+from .serviceability import check_availability
+from .taxonomy import get_taxonomy, invalidate_taxonomy
+
+
+def reset_catalog_caches():
+    """ Drop every in-process catalog cache; test transactions roll back under them. """
+    cache.clear()
+    catalog._memo.update(version=None, updated_at=None, fetched=0.0)
+    search._index = search.SearchIndex()
+    facets._engine = facets.FacetEngine()
+    suggest._suggester = suggest.Suggester()
+    stock._cache = stock.StockCache()
+    rails._cached.update(built_at=0.0, data=None)
+    invalidate_taxonomy()
+
+
+# long TTLs: counts must not depend on how fast the test runs; templates render without collectstatic
+@override_settings(
+    QUERY_BUDGET_CHECKS=True, CATALOG_VERSION_TTL=600, SEARCH_SYNC_SECONDS=600,
+    STORAGES={
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+)
+class CatalogTestCase(TestCase):
+    """ Men > Clothing > Jeans / Shirts, two brands, a few priced products with sizes. """
+
+    @classmethod
+    def setUpTestData(cls):
+        men = Gender.objects.create(name="Men", slug="men")
+        cls.clothing = Category.objects.create(name="Clothing", slug="clothing", gender=men)
+        cls.jeans = SubCategory.objects.create(name="Jeans", slug="jeans", category=cls.clothing)
+        cls.shirts = SubCategory.objects.create(name="Shirts", slug="shirts", category=cls.clothing)
+        cls.levis = Brand.objects.create(name="Levis")
+        cls.gap = Brand.objects.create(name="Gap")
+
+        specs = [
+            ("Slim Fit Jeans", cls.levis, cls.jeans, "2499", "1999", ["30", "32"]),
+            ("Straight Jeans", cls.levis, cls.jeans, "1999", None, ["32"]),
+            ("Skinny Denim Jeans", cls.gap, cls.jeans, "2999", "1499", ["28", "30"]),
+            ("Relaxed Jeans", cls.gap, cls.jeans, "999", "899", []),
+            ("Oxford Shirt", cls.gap, cls.shirts, "1499", "1199", ["M", "L"]),
+            ("Linen Shirt", cls.levis, cls.shirts, "1799", None, ["S"]),
+        ]
+        cls.products = []
+        for name, brand, subcat, price, discount, sizes in specs:
+            p = Product.objects.create(
+                name=name, brand=brand, category=cls.clothing, subcategory=subcat,
+                price=Decimal(price), discount_price=Decimal(discount) if discount else None, stock=5,
+            )
+            ProductImage.objects.create(product=p, image=f"products/{p.slug or p.id}.jpg")
+            for size in sizes:
+                ProductSize.objects.create(product=p, size=size, stock=3)
+            cls.products.append(p)
+        ProductRatingSummary.objects.create(product=cls.products[0], count=2, total=9, stars_4=1, stars_5=1)
+        ProductPopularity.objects.create(product=cls.products[2], score=12, sold_7d=4, sold_30d=12, is_bestseller=True)
+        rebuild_all()
+
+    def setUp(self):
+        reset_catalog_caches()
+
+
+# ---------------- QUERY BUDGETS ----------------
+
+class QueryBudgetTests(CatalogTestCase):
+    """ Exact query counts with warm in-process indexes and a cold response cache. """
+
+    def assertQueries(self, n, url):
+        self.assertEqual(self.client.get(url).status_code, 200)     # builds taxonomy / facets / search
+        cache.clear()
+        with self.assertNumQueries(n):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_product_list(self):
+        # listing ids, products + brand/rating/popularity, images, sizes
+        self.assertQueries(4, "/api/products/")
+
+    def test_product_list_search_sorted(self):
+        self.assertQueries(4, "/api/products/?search=jeans&sort=low")
+
+    def test_product_list_cursor_page(self):
+        self.assertQueries(4, "/api/products/?limit=2&sort=high")
+
+    def test_product_list_projection_skips_relations(self):
+        self.assertQueries(2, "/api/products/?fields=id,name,price")
+
+    def test_product_detail(self):
+        # product + brand/color/rating/popularity, images, sizes, variants (no variants -> no variant images)
+        self.assertQueries(4, f"/api/products/{self.products[0].id}/")
+
+    def test_plp(self):
+        # one compiled plan over ProductListing; facets come from the bitsets
+        self.assertQueries(1, "/men/clothing/jeans/?brand=levis&sort=low")
+
+    def test_cached_response_costs_no_query(self):
+        url = "/api/products/?sort=discount"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+
+# ---------------- LIST FAST PATH ----------------
+
+class ProductListDataTests(CatalogTestCase):
+    """ product_list_data must stay a drop-in for ProductSerializer(many=True). """
+
+    def _products(self):
+        return list(
+            Product.objects.order_by("id")
+            .select_related("brand", "rating_summary", "popularity")
+            .prefetch_related("images", "sizes")
+        )
+
+    def test_matches_serializer(self):
+        request = RequestFactory().get("/api/products/")
+        products = self._products()
+        expected = ProductSerializer(products, many=True, context={"request": request}).data
+        self.assertEqual(product_list_data(products, request), [dict(row) for row in expected])
+
+    def test_matches_serializer_with_fields(self):
+        request = RequestFactory().get("/api/products/")
+        products = self._products()
+        for fields in ({"id", "name"}, {"price", "discount_price", "discount_percent"}, {"image", "sizes", "rating"}):
+            expected = ProductSerializer(products, many=True, context={"request": request, "fields": fields}).data
+            self.assertEqual(product_list_data(products, request, fields), [dict(row) for row in expected])
+
+    def test_discount_percent(self):
+        p = Product(price=Decimal("2000"), discount_price=Decimal("1500"))
+        self.assertEqual(discount_percent(p), 25)
+        self.assertEqual(discount_percent(Product(price=Decimal("1000"), discount_price=None)), 0)
+        self.assertEqual(discount_percent(Product(price=Decimal("1000"), discount_price=Decimal("1200"))), 0)
+        self.assertEqual(discount_percent(Product(price="abc", discount_price=Decimal("10"))), 0)
+
+
+# ---------------- CURSORS ----------------
+
+class CursorPaginationTests(CatalogTestCase):
+    """ Walking every page must give the ORM ordering exactly once. """
+
+    def walk(self, params):
+        ids, cursor = [], None
+        for _ in range(20):
+            query = f"{params}&cursor={cursor}" if cursor else params
+            body = self.client.get(f"/api/products/?{query}").json()
+            ids += [row["id"] for row in body["results"]]
+            cursor = body["next_cursor"]
+            if not cursor:
+                return ids
+        self.fail("cursor never ended")
+
+    def test_keyset_round_trip_per_sort(self):
+        for sort in ("low", "high", "discount", "rating", "popular", "newest"):
+            with self.subTest(sort=sort):
+                expected = list(
+                    ProductListing.objects.order_by(*order_for_sort(sort)).values_list("pk", flat=True)
+                )
+                self.assertEqual(self.walk(f"limit=2&sort={sort}"), expected)
+
+    def test_ties_on_sort_value_are_not_skipped(self):
+        ProductListing.objects.update(payable_price=Decimal("999"))
+        self.assertEqual(sorted(self.walk("limit=2&sort=low")), sorted(p.id for p in self.products))
+
+    def test_relevance_round_trip(self):
+        self.assertEqual(self.walk("limit=2&search=jeans"), search_products("jeans"))
+
+    def test_cursor_from_other_sort_is_rejected(self):
+        cursor = self.client.get("/api/products/?limit=2&sort=low").json()["next_cursor"]
+        response = self.client.get(f"/api/products/?limit=2&sort=high&cursor={cursor}")
+        self.assertEqual(response.status_code, 400)
+
+    def test_garbage_cursor_is_rejected(self):
+        self.assertEqual(self.client.get("/api/products/?limit=2&cursor=not-a-cursor").status_code, 400)
+
+    def test_forged_cursor_values_are_rejected(self):
+        forged = [
+            {"s": "low", "i": 1, "p": "NaN"},
+            {"s": "low", "i": 1, "p": "Infinity"},
+            {"s": "low", "i": 1, "p": "1e999999"},
+            {"s": "low", "i": 1, "p": "10000000000"},
+            {"s": "low", "i": 1, "p": "1.001"},
+            {"s": "low", "i": 99999999999999999999999, "p": "10"},
+            {"s": "low", "i": 0, "p": "10"},
+            {"s": "default", "i": -5},
+        ]
+        for payload in forged:
+            with self.subTest(payload=payload):
+                cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+                response = self.client.get(f"/api/products/?sort={payload['s']}&cursor={cursor}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_first_page_by_default(self):
+        body = self.client.get("/api/products/").json()
+        self.assertEqual(len(body["results"]), len(self.products))
+        self.assertIsNone(body["next_cursor"])
+
+        with mock.patch.object(pagination, "DEFAULT_PAGE_SIZE", 2):
+            body = self.client.get("/api/products/?sort=low").json()
+        self.assertEqual(len(body["results"]), 2)
+        self.assertIsNotNone(body["next_cursor"])
+
+
+# ---------------- SEARCH ----------------
+
+class SearchTests(CatalogTestCase):
+
+    def orm_ids(self, word):
+        q = Q()
+        for field in ("name", "brand_name", "category_name", "subcategory_name"):
+            q |= Q(**{f"{field}__icontains": word})
+        return set(ProductListing.objects.filter(q).values_list("pk", flat=True))
+
+    def test_single_word_matches_orm(self):
+        for word in ("shirt", "levis", "gap", "skinny", "clothing"):
+            with self.subTest(word=word):
+                self.assertEqual(set(search_products(word)), self.orm_ids(word))
+
+    def test_every_word_must_match(self):
+        expected = self.orm_ids("levis") & self.orm_ids("jeans")
+        self.assertEqual(set(search_products("levis jeans")), expected)
+
+    def test_any_word_fallback(self):
+        self.assertEqual(set(search_products("oxford nosuchword")), self.orm_ids("oxford"))
+
+    def test_synonyms_and_plurals(self):
+        self.assertEqual(set(search_products("denim")), self.orm_ids("jean"))
+        self.assertEqual(search_products("shirts"), search_products("shirt"))
+
+    def test_name_match_ranks_first(self):
+        # every jeans product matches "jeans"; only one name also has "slim"
+        self.assertEqual(search_products("slim jeans")[0], self.products[0].id)
+
+    def test_limit_keeps_best_matches(self):
+        self.assertEqual(search_products("jeans", limit=2), search_products("jeans")[:2])
+
+    def test_views_cap_search_ids(self):
+        # sorted lists and the PLP facets take the ids into pk IN (...) too
+        index = search.get_index()
+        with mock.patch.object(index, "search", wraps=index.search) as searched:
+            self.client.get("/api/products/?search=jeans&sort=low")
+        self.assertEqual(searched.call_args.kwargs["limit"], search.MAX_RESULTS)
+
+    def test_saved_product_is_reindexed(self):
+        search_products("jeans")        # build
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[4]
+            p.name = "Oxford Chino"
+            p.save()
+        self.assertIn(p.id, search_products("chino"))
+
+
+# ---------------- TYPEAHEAD ----------------
+
+class SuggestTests(CatalogTestCase):
+
+    def test_links_resolve_to_live_pages(self):
+        body = self.client.get("/api/products/suggest/?q=lev").json()
+        self.assertEqual(body["brands"], [
+            {"name": "Levis", "slug": "levis", "url": "/men/clothing/jeans/?brand=levis"},
+        ])
+        body = self.client.get("/api/products/suggest/?q=shir").json()
+        self.assertEqual([c["url"] for c in body["categories"]], ["/men/clothing/shirts/"])
+        self.assertEqual(body["products"][0]["url"], f"/detail/{self.products[5].id}/")     # "Linen Shirt": shorter name first
+
+        for url in (body["categories"][0]["url"], "/men/clothing/jeans/?brand=levis"):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_brand_without_products_is_not_suggested(self):
+        Brand.objects.create(name="Levant")
+        body = self.client.get("/api/products/suggest/?q=lev").json()
+        self.assertEqual([b["slug"] for b in body["brands"]], ["levis"])
+
+
+# ---------------- FACETS ----------------
+
+class FacetTests(CatalogTestCase):
+    """ Bitset counts against the same questions asked through the ORM. """
+
+    def test_counts_match_orm(self):
+        selection = {"brands": ["levis"], "sizes": ["32"]}
+        counts = get_category_facets(self.clothing.id).counts(self.jeans.id, selection)
+        jeans = Product.objects.filter(subcategory=self.jeans)
+
+        # disjunctive: each facet ignores its own selection
+        brands = {
+            b["brand_slug"]: b["cnt"] for b in counts["brands"]
+        }
+        self.assertEqual(brands, dict(
+            jeans.filter(sizes__size="32").values_list("brand__slug").annotate(n=Count("id", distinct=True))
+        ))
+        sizes = {s["value"]: s["cnt"] for s in counts["sizes"]}
+        self.assertEqual(sizes, dict(
+            jeans.filter(brand__slug="levis").values_list("sizes__size").annotate(n=Count("id", distinct=True))
+        ))
+        self.assertEqual(counts["total"], jeans.filter(brand__slug="levis", sizes__size="32").distinct().count())
+
+    def test_price_and_discount_buckets_match_orm(self):
+        counts = get_category_facets(self.clothing.id).counts(self.jeans.id, {})
+        listings = ProductListing.objects.filter(subcategory=self.jeans)
+        for bucket in counts["price_buckets"]:
+            q = listings
+            if bucket["min"] is not None:
+                q = q.filter(payable_price__gte=bucket["min"])
+            if bucket["max"] is not None:
+                q = q.filter(payable_price__lte=bucket["max"])
+            self.assertEqual(bucket["cnt"], q.count(), bucket["label"])
+        for bucket in counts["discount_buckets"]:
+            self.assertEqual(bucket["cnt"], listings.filter(discount_percent__gte=bucket["min"]).count())
+
+    def test_bucket_edges(self):
+        # quantiles rounded to amounts a shopper would pick, within the price range
+        self.assertEqual(facets.price_edges(list(range(300, 3000, 10))), [800, 1400, 1900, 2500])
+        self.assertEqual(facets.price_edges(list(range(5000, 50000, 50))), [14000, 23000, 32000, 41000])
+        self.assertEqual(facets.price_edges([499, 499, 499, 499, 2999]), [500])
+        self.assertEqual(facets.price_edges([]), [])
+        self.assertEqual(facets.discount_thresholds([12, 35, 41, 48, 62, 70, 75]), [10, 30, 40, 70])
+        self.assertEqual(facets.discount_thresholds([5, 5, 5]), [])
+
+    def test_buckets_follow_subcategory_prices(self):
+        engine = get_category_facets(self.clothing.id)
+        price_buckets, discount_buckets = engine.buckets(self.jeans.id)
+        self.assertEqual([b["label"] for b in price_buckets], ["Below Rs.900", "Rs.900-1499", "Rs.1500 and above"])
+        self.assertEqual([b["value"] for b in discount_buckets], ["10", "20", "50"])
+        # shirts have their own edges
+        self.assertNotEqual(engine.buckets(self.shirts.id)[0], price_buckets)
+
+        # a bucket value round-trips through the PLP filter
+        response = self.client.get(f"/men/clothing/jeans/?price={price_buckets[1]['value']}")
+        self.assertEqual([p.pk for p in response.context["products"]], [self.products[2].id])
+
+    def test_price_histogram(self):
+        body = self.client.get(
+            "/api/products/price-histogram/", {"gender": "men", "subcategory": "jeans", "bins": 4, "brand": "gap"},
+        ).json()
+        self.assertEqual((body["min"], body["max"]), ("899.00", "1999.00"))
+        # every filter but price: gap's 899 and 1499
+        self.assertEqual([b["cnt"] for b in body["bins"]], [1, 0, 1, 0])
+        self.assertEqual(len(body["buckets"]), 3)
+
+    def test_only_bucket_ranges_are_cached(self):
+        facets = get_category_facets(self.clothing.id)
+        counts = facets.counts(self.jeans.id, {})
+        cached = len(facets._range_cache)
+        self.assertEqual(cached, len(counts["price_buckets"]) + len(counts["discount_buckets"]))
+
+        for rupees in range(100, 150):
+            facets.counts(self.jeans.id, {"min_price": Decimal(rupees), "min_offer": Decimal(rupees % 40)})
+        self.assertEqual(len(facets._range_cache), cached)
+
+    def test_plp_matches_orm(self):
+        response = self.client.get("/men/clothing/jeans/?brand=gap&sort=low")
+        expected = list(
+            ProductListing.objects.filter(subcategory=self.jeans, brand_slug="gap")
+            .order_by("payable_price", "pk").values_list("pk", flat=True)
+        )
+        self.assertEqual([p.pk for p in response.context["products"]], expected)
+
+    def test_stock_change_keeps_bitsets(self):
+        facets_before = get_category_facets(self.clothing.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            size = ProductSize.objects.filter(product=self.products[0]).first()
+            size.stock = 0
+            size.save()
+        with override_settings(SEARCH_SYNC_SECONDS=0):
+            self.assertIs(get_category_facets(self.clothing.id), facets_before)
+
+    def test_price_change_rebuilds_bitsets(self):
+        facets_before = get_category_facets(self.clothing.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[1]
+            p.price = Decimal("499")
+            p.save()
+        with override_settings(SEARCH_SYNC_SECONDS=0):
+            facets_after = get_category_facets(self.clothing.id)
+        self.assertIsNot(facets_after, facets_before)
+        self.assertEqual(facets_after.payable[facets_after.pos[p.id]], Decimal("499"))
+
+
+# ---------------- STOCK MAP ----------------
+
+class StockMapTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user("shopper"))
+
+    def test_map_and_compact(self):
+        in_stock, no_sizes = self.products[0].id, self.products[3].id
+        ids = f"{in_stock},{no_sizes},x,-1"
+        self.assertEqual(
+            self.api.get(f"/api/products/stock-map/?ids={ids}").json(),
+            {str(in_stock): True, str(no_sizes): False},
+        )
+        body = self.api.get(f"/api/products/stock-map/?ids={ids}&compact=1").json()
+        self.assertEqual(body, {"in_stock": [in_stock]})
+
+    def test_huge_ids_are_cheap(self):
+        ids = ",".join(str(10 ** 18 + i) for i in range(1000))
+        with self.assertNumQueries(1):
+            body = self.api.get(f"/api/products/stock-map/?ids={ids}&compact=1").json()
+        self.assertEqual(body, {"in_stock": []})
+        self.assertEqual(len(stock._cache.stock), 1000)
+        self.assertEqual(self.api.get(f"/api/products/stock-map/?ids={2 ** 63}").json(), {})
+
+    def test_size_save_drops_cached_answer(self):
+        p = self.products[1]
+        self.assertEqual(stock.stock_for([p.id]), {p.id: True})
+        ProductSize.objects.filter(product=p).update(stock=0)
+        self.assertEqual(stock.stock_for([p.id]), {p.id: True})      # cached
+        size = p.sizes.get()
+        size.save()
+        self.assertEqual(stock.stock_for([p.id]), {p.id: False})
+
+
+# ---------------- CONDITIONAL GET ----------------
+
+class ConditionalGetTests(CatalogTestCase):
+
+    def test_etag_round_trip(self):
+        first = self.client.get("/api/products/")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        again = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], etag)
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+
+    def test_etag_depends_on_canonical_url(self):
+        a = self.client.get("/api/products/?sort=low&brand=gap")["ETag"]
+        b = self.client.get("/api/products/?brand=gap&sort=low")["ETag"]
+        c = self.client.get("/api/products/?sort=high")["ETag"]
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_catalog_change_invalidates(self):
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[0]
+            p.price = Decimal("2599")
+            p.save()
+        with override_settings(CATALOG_VERSION_TTL=0):
+            response = self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_cart_stock_saves_keep_etag_until_stock_runs_out(self):
+        size = ProductSize.objects.get(product=self.products[1])     # stock 3
+        etag = self.client.get("/api/products/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            size.stock = 1
+            size.save()
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            size.stock = 0
+            size.save()
+        self.assertEqual(self.client.get("/api/products/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since(self):
+        url = f"/api/products/{self.products[0].id}/"
+        first = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+
+# ---------------- DELTA SYNC ----------------
+
+class CatalogSyncTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # everything in the fixture happened an hour ago
+        self.then = timezone.now() - timedelta(hours=1)
+        for model in (Category, Brand, Product, ProductSize, ProductImage):
+            model.objects.update(updated_at=self.then)
+
+    def lines(self, since=None):
+        response = self.client.get("/api/products/changes/" + (f"?since={since}" if since else ""))
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_token_round_trip(self):
+        now = timezone.now()
+        self.assertEqual(sync.decode_token(sync.encode_token(now)), now)
+        with self.assertRaises(sync.InvalidToken):
+            sync.decode_token("xyz")
+        self.assertEqual(self.client.get("/api/products/changes/?since=xyz").status_code, 400)
+
+    def test_snapshot_then_delta(self):
+        lines = self.lines()
+        products = {l["id"] for l in lines if l.get("type") == "product"}
+        self.assertEqual(products, {p.id for p in self.products})
+        token = lines[-1]["token"]
+
+        self.assertEqual(self.lines(token)[:-1], [])
+
+        p = self.products[0]
+        p.name = "Slim Fit Jeans 2.0"
+        p.save()
+        ProductSize.objects.filter(product=self.products[1]).delete()
+
+        delta = self.lines(token)
+        self.assertIn({"op": "upsert", "type": "product", "id": p.id}, [
+            {k: l.get(k) for k in ("op", "type", "id")} for l in delta
+        ])
+        deletes = {(l["type"], l["id"]) for l in delta if l.get("op") == "delete"}
+        self.assertEqual({kind for kind, _ in deletes}, {"size"})
+        self.assertIn("token", delta[-1])
+
+    def test_expired_token_resets(self):
+        old = sync.encode_token(timezone.now() - timedelta(days=365))
+        lines = self.lines(old)
+        self.assertEqual(lines[0], {"reset": True})
+        self.assertEqual(len([l for l in lines if l.get("type") == "product"]), len(self.products))
+
+    def test_sync_stamps_stay_out_of_public_api(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("reader"))    # category list is not AllowAny
+        for url in ("/brands/", "/categories/"):
+            rows = client.get(url).json()
+            self.assertTrue(rows)
+            self.assertNotIn("updated_at", rows[0])
+
+
+# ---------------- IMPORTER ----------------
+
+class CatalogImporterTests(CatalogTestCase):
+    HEADER = "slug,name,price,discount_price,category,subcategory,brand,sizes\n"
+
+    def run_import(self, body):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(self.HEADER + body)
+        self.addCleanup(os.remove, f.name)
+        importer = CatalogImporter(download_images=False)
+        try:
+            return importer, importer.run(f.name)
+        finally:
+            importer.close()
+
+    def test_create_then_reapply_is_noop(self):
+        body = "tapered-jeans,Tapered Jeans,1899,1599,clothing,jeans,levis,30:4|32:0\n"
+        _, stats = self.run_import(body)
+        self.assertEqual((stats["created"], stats["errors"]), (1, 0))
+
+        p = Product.objects.get(slug="tapered-jeans")
+        self.assertEqual(dict(p.sizes.values_list("size", "stock")), {"30": 4, "32": 0})
+        listing = ProductListing.objects.get(pk=p.pk)
+        self.assertEqual((listing.payable_price, listing.in_stock), (Decimal("1599.00"), True))
+
+        _, stats = self.run_import(body)
+        self.assertEqual((stats["created"], stats["updated"], stats["unchanged"]), (0, 0, 1))
+
+    def test_price_change_updates_listing(self):
+        self.run_import("tapered-jeans,Tapered Jeans,1899,,clothing,jeans,gap,30:1\n")
+        _, stats = self.run_import("tapered-jeans,Tapered Jeans,1899,999,clothing,jeans,gap,30:1\n")
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(ProductListing.objects.get(slug="tapered-jeans").payable_price, Decimal("999.00"))
+
+    def test_bad_rows_are_reported(self):
+        importer, stats = self.run_import(
+            "a,A,100,,clothing,jeans,nosuchbrand,\n"
+            "b,B,abc,,clothing,jeans,gap,\n"
+            "c,C,100,,clothing,shirts,gap,XXXL9:1\n"
+        )
+        self.assertEqual((stats["errors"], stats["created"]), (3, 0))
+        self.assertEqual([line for line, _ in importer.errors], [2, 3, 4])
+
+
+# ---------------- NAV TAXONOMY ----------------
+
+class TaxonomyTests(CatalogTestCase):
+
+    def counts(self):
+        with override_settings(SEARCH_SYNC_SECONDS=0):
+            men = self.client.get("/api/taxonomy/").json()["genders"][0]
+        return {s["slug"]: s["count"] for c in men["categories"] for s in c["subcategories"]}
+
+    def test_nav_tree_payload(self):
+        men = self.client.get("/api/taxonomy/").json()["genders"][0]
+        self.assertEqual((men["slug"], men["count"]), ("men", 6))
+        clothing = men["categories"][0]
+        self.assertEqual((clothing["slug"], clothing["count"], clothing["url"]), ("clothing", 6, "/men/clothing/jeans/"))
+        self.assertEqual(
+            [(s["slug"], s["count"], s["url"]) for s in clothing["subcategories"]],
+            [("jeans", 4, "/men/clothing/jeans/"), ("shirts", 2, "/men/clothing/shirts/")],
+        )
+
+    def test_price_and_stock_edits_do_not_rebuild(self):
+        taxonomy = get_taxonomy()
+        tree = taxonomy.nav_tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[0]
+            p.price = Decimal("2199")
+            p.save()
+            ProductSize.objects.filter(product=p).update(stock=0)
+            p.sizes.first().save()
+        self.counts()
+        self.assertIs(taxonomy.tree, tree)
+
+    def test_new_product_updates_counts(self):
+        self.assertEqual(self.counts()["shirts"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(
+                name="Poplin Shirt", brand=self.gap, category=self.clothing, subcategory=self.shirts,
+                price=Decimal("999"), stock=1,
+            )
+        self.assertEqual(self.counts()["shirts"], 3)
+
+
+# ---------------- HOME RAILS ----------------
+
+class HomeRailsTests(CatalogTestCase):
+
+    def test_rails_payload(self):
+        men = self.client.get("/api/home/rails/").json()["rails"][0]
+        self.assertEqual(men["slug"], "men")
+        in_stock = ProductListing.objects.filter(in_stock=True)
+        self.assertEqual(
+            [c["id"] for c in men["new_arrivals"]], list(in_stock.order_by("-pk").values_list("pk", flat=True)),
+        )
+        self.assertEqual([c["id"] for c in men["top_discounts"]], list(
+            in_stock.filter(discount_percent__gt=0).order_by("-discount_percent", "-pk").values_list("pk", flat=True)
+        ))
+        self.assertEqual([c["id"] for c in men["bestsellers"]], [self.products[2].id])
+        card = men["bestsellers"][0]
+        self.assertEqual((card["payable_price"], card["is_bestseller"]), ("1499.00", True))
+        self.assertEqual(card["url"], f"/detail/{self.products[2].id}/")
+
+    def test_catalog_edits_wait_for_ttl(self):
+        self.client.get("/api/home/rails/")
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[0]
+            p.price = Decimal("2199")
+            p.save()
+        with self.assertNumQueries(0):
+            self.client.get("/api/home/rails/")
+        # genders, then three rails for the one gender
+        with override_settings(HOME_RAILS_TTL=0), self.assertNumQueries(4):
+            self.client.get("/api/home/rails/")
+
+
+# ---------------- MEDIA ----------------
+
+def use_temp_media(test):
+    """ Point MEDIA_ROOT at a fresh directory for one test. """
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    override = override_settings(MEDIA_ROOT=media_root)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class MediaTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+
+    def test_uploads_get_hashed_names(self):
+        name = default_storage.save("products/shirt.jpg", ContentFile(b"jpeg bytes"))
+        self.assertRegex(name, r"^products/shirt\.[0-9a-f]{12}\.jpg$")
+        # same bytes, same file: the URL can be cached forever
+        self.assertEqual(default_storage.save("products/shirt.jpg", ContentFile(b"jpeg bytes")), name)
+        self.assertNotEqual(default_storage.save("products/shirt.jpg", ContentFile(b"other bytes")), name)
+
+    def get(self, name, **headers):
+        response = self.client.get(reverse("media", kwargs={"path": name}), **headers)
+        if hasattr(response, "streaming_content"):
+            response.body = b"".join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_hashed_names_are_immutable(self):
+        hashed = default_storage.save("products/shirt.jpg", ContentFile(b"jpeg bytes"))
+        with open(os.path.join(settings.MEDIA_ROOT, "products", "plain.jpg"), "wb") as f:
+            f.write(b"jpeg bytes")
+
+        self.assertIn("immutable", self.get(hashed)["Cache-Control"])
+        self.assertNotIn("immutable", self.get("products/plain.jpg")["Cache-Control"])
+
+    def test_range_requests(self):
+        name = default_storage.save("clip.mp4", ContentFile(b"0123456789"))
+
+        response = self.get(name, HTTP_RANGE="bytes=2-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.body, b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+
+        response = self.get(name, HTTP_RANGE="bytes=-3")
+        self.assertEqual(response.body, b"789")
+
+        response = self.get(name, HTTP_RANGE="bytes=10-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+    def test_conditional_requests(self):
+        name = default_storage.save("clip.mp4", ContentFile(b"0123456789"))
+        first = self.get(name)
+        self.assertEqual(first.status_code, 200)
+
+        self.assertEqual(self.get(name, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.assertEqual(self.get(name, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.get(name, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+
+# ---------------- FEED ----------------
+
+class ProductFeedTests(CatalogTestCase):
+
+    def items(self, since=None):
+        return {item["id"]: item for item in feeds.feed_items("https://shop.example/", since)}
+
+    def test_sale_price_only_when_discounted(self):
+        items = self.items()
+        self.assertEqual(items[self.products[0].id]["sale_price"], "1999.00 INR")
+        self.assertEqual(items[self.products[1].id]["sale_price"], "")
+        self.assertEqual(items[self.products[1].id]["price"], "1999.00 INR")
+
+    def test_items(self):
+        item = self.items()[self.products[3].id]
+        self.assertEqual(item["link"], "https://shop.example" + reverse("product_detail", args=[self.products[3].id]))
+        self.assertEqual(item["product_type"], "Clothing > Jeans")
+        # no sizes -> product stock
+        self.assertEqual((item["stock"], item["availability"]), (5, "in_stock"))
+        self.assertEqual(self.items()[self.products[0].id]["stock"], 6)
+
+    def test_formats(self):
+        xml = "".join(feeds.render(self.items().values(), "xml"))
+        self.assertEqual(xml.count("<item>"), len(self.products))
+        self.assertEqual(xml.count("<g:sale_price>"), 4)
+
+        rows = list(csv.DictReader(io.StringIO("".join(feeds.render(self.items().values(), "csv")))))
+        self.assertEqual([r["id"] for r in rows], [str(p.id) for p in self.products])
+
+        lines = "".join(feeds.render(self.items().values(), "ndjson")).splitlines()
+        self.assertEqual(json.loads(lines[1])["title"], "Straight Jeans")
+
+    def test_delta_feed(self):
+        watermark = feeds.feed_watermark()
+        self.assertEqual(self.items(since=watermark), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            p = self.products[2]
+            p.name = "Skinny Jeans"
+            p.save()
+        self.assertEqual(list(self.items(since=watermark)), [p.id])
+
+    def test_endpoint_gzip(self):
+        response = self.client.get("/api/products/feed.ndjson", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        body = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(len(body.splitlines()), len(self.products))
+        self.assertTrue(response["X-Feed-Watermark"])
+
+
+# ---------------- SERVICEABILITY ----------------
+
+@override_settings(PINCODE_SYNC_SECONDS=600)
+class ServiceabilityTests(CatalogTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.blr = ServiceablePincode.objects.create(pincode="560001", city="Bengaluru", state="Karnataka")
+        ProductPincodeAvailability.objects.create(
+            product=cls.products[0], pincode=cls.blr, stock=4, eta_days=2, cod_available=False,
+        )
+        ProductPincodeAvailability.objects.create(product=cls.products[1], pincode=cls.blr, is_available=False)
+
+    def setUp(self):
+        super().setUp()
+        serviceability._index = serviceability.ServiceabilityIndex()
+
+    def test_check_many(self):
+        ids = [p.id for p in self.products[:3]]
+        result = check_availability(ids, "560001")
+        self.assertEqual(result[ids[0]], serviceability.Availability(True, False, 2, 4))
+        self.assertFalse(result[ids[1]].is_available)
+        self.assertIsNone(result[ids[2]])
+        self.assertEqual(check_availability(ids, "110001"), {})
+        self.assertEqual(check_availability(ids, "56OO01"), {})
+
+    def test_lookups_cost_no_query_once_loaded(self):
+        check_availability([self.products[0].id], "560001")
+        with self.assertNumQueries(0):
+            self.assertEqual(serviceability.pincode_info("560001"), ("Bengaluru", "Karnataka"))
+            check_availability([p.id for p in self.products], "560001")
+
+    def test_syncs_rows_changed_elsewhere(self):
+        pid = self.products[0].id
+        check_availability([pid], "560001")
+        # another worker: queryset updates send no signals, updated_at is all there is
+        later = timezone.now() + timedelta(seconds=1)
+        ProductPincodeAvailability.objects.filter(product_id=pid).update(stock=0, updated_at=later)
+        ProductPincodeAvailability.objects.create(product=self.products[2], pincode=self.blr, stock=1)
+        self.assertEqual(check_availability([pid], "560001")[pid].stock, 4)     # not due yet
+
+        serviceability.get_serviceability_index().expire()
+        result = check_availability([pid, self.products[2].id], "560001")
+        self.assertEqual(result[pid].stock, 0)
+        self.assertEqual(result[self.products[2].id].stock, 1)
+
+    def test_deleted_rows_disappear(self):
+        pid = self.products[0].id
+        check_availability([pid], "560001")
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductPincodeAvailability.objects.get(product_id=pid).delete()
+        self.assertIsNone(check_availability([pid], "560001")[pid])
+
+    def test_endpoint(self):
+        def check(pid, pincode):
+            return self.client.get("/api/check-product-pincode/", {"product_id": pid, "pincode": pincode})
+
+        data = check(self.products[0].id, "560001").json()
+        self.assertTrue(data["product_available"])
+        self.assertEqual((data["city"], data["eta_days"], data["cod_available"]), ("Bengaluru", 2, False))
+        self.assertEqual(check(self.products[1].id, "560001").json()["message"], "Out of stock at your location")
+        self.assertFalse(check(self.products[2].id, "110001").json()["deliverable"])
+        self.assertEqual(check(999999, "560001").status_code, 404)
+        self.assertEqual(check(self.products[0].id, "5600").status_code, 400)
+
+
+# ---------------- STORED DISCOUNT ----------------
+
+class StoredDiscountTests(CatalogTestCase):
+
+    def stored(self, product):
+        p = Product.objects.get(pk=product.pk)
+        return p.payable_price, p.discount_percent
+
+    def test_payable_and_discount(self):
+        self.assertEqual(payable_and_discount(Decimal("2000"), Decimal("1500")), (Decimal("1500"), Decimal("25.00")))
+        self.assertEqual(payable_and_discount(Decimal("1999"), None), (Decimal("1999"), Decimal("0")))
+        # a "discount" above the price is payable but not a discount
+        self.assertEqual(payable_and_discount(Decimal("1000"), Decimal("1200")), (Decimal("1200"), Decimal("0")))
+        self.assertEqual(payable_and_discount(Decimal("0"), Decimal("10")), (Decimal("10"), Decimal("0")))
+
+    def test_save_and_bulk_update_keep_columns_in_step(self):
+        p = self.products[1]
+        p.discount_price = Decimal("999.50")
+        p.save(update_fields=["discount_price"])
+        self.assertEqual(self.stored(p), (Decimal("999.50"), Decimal("50.00")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=p.pk).update(discount_price=None)
+        self.assertEqual(self.stored(p), (Decimal("1999"), Decimal("0")))
+        self.assertEqual(ProductListing.objects.get(pk=p.pk).discount_percent, 0)
+
+    def test_backfill_command(self):
+        # raw writes leave the stored columns stale
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Product._meta.db_table} SET discount_price = 1249.50 WHERE id = %s", [self.products[0].pk]
+            )
+        out = io.StringIO()
+        call_command("backfill_product_prices", stdout=out)
+        self.assertIn("Updated stored prices on 1 products", out.getvalue())
+        self.assertEqual(self.stored(self.products[0]), (Decimal("1249.50"), Decimal("50.00")))
+        self.assertEqual(ProductListing.objects.get(pk=self.products[0].pk).payable_price, Decimal("1249.50"))
+
+    def test_discount_sort(self):
+        # 50%, 20% (newer first), 10%, then undiscounted newest first
+        expected = [self.products[i].id for i in (2, 4, 0, 3, 5, 1)]
+        body = self.client.get("/api/products/?sort=discount").json()
+        self.assertEqual([row["id"] for row in body["results"]], expected)
+
+        response = self.client.get("/men/clothing/jeans/?sort=discount")
+        self.assertEqual([p.pk for p in response.context["products"]], [self.products[i].id for i in (2, 0, 3, 1)])
+
+
+# ---------------- INDEX ADVISOR ----------------
+
+class IndexAdvisorTests(CatalogTestCase):
+
+    def sql(self, queryset):
+        return queryset.query.sql_with_params()[0]
+
+    def log(self, *lines):
+        fd, path = tempfile.mkstemp(suffix=".jsonl")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w") as fh:
+            fh.write("\n".join(lines))
+        return path
+
+    def test_read_log(self):
+        path = self.log(
+            '{"path": "/api/products/?sort=low"}',
+            "not json",
+            '{"method": "post", "url": "/api/orders/create/", "data": {"address_id": 3}, "user": "alice"}',
+            '{"path": "relative/"}',
+        )
+        self.assertEqual(list(index_advisor.read_log(path)), [
+            {"method": "GET", "path": "/api/products/?sort=low", "data": {}, "user": None},
+            {"method": "POST", "path": "/api/orders/create/", "data": {"address_id": 3}, "user": "alice"},
+        ])
+
+    def test_predicates(self):
+        sql = self.sql(
+            ProductListing.objects.filter(subcategory_id=1, brand_slug__in=["a", "b"], payable_price__lte=500)
+            .exclude(pk=3).order_by("-discount_percent", "-product_id")
+        )
+        self.assertEqual(index_advisor.normalize_sql(sql).count("(%s, ...)"), 1)
+        cols = index_advisor.predicates(sql)[ProductListing._meta.db_table]
+        self.assertEqual(sorted(cols["eq"]), ["brand_slug", "subcategory_id"])
+        self.assertEqual(cols["range"], ["payable_price"])
+        self.assertEqual(cols["order"], ["discount_percent", "product_id"])
+
+    def test_suggests_missing_index_only(self):
+        recorder = index_advisor.Recorder()
+        with connection.execute_wrapper(recorder):
+            recorder.endpoint = "test"
+            list(Product.objects.filter(name="Linen Shirt"))
+            list(Product.objects.filter(slug="linen-shirt"))      # unique: nothing to add
+        suggestions = index_advisor.suggest(recorder, index_advisor.Advisor(), slow_ms=0)
+        self.assertEqual([(s["model"], s["fields"]) for s in suggestions], [("Product", ["name"])])
+        self.assertEqual((suggestions[0]["before"], suggestions[0]["after"]), (6, 1))
+
+    def test_command(self):
+        path = self.log(
+            '{"path": "/api/products/?sort=low"}',
+            '{"path": "/api/products/%d/"}' % self.products[0].id,
+        )
+        out = io.StringIO()
+        call_command("advise_indexes", path, "--slow-ms", "0", stdout=out)
+        self.assertIn("Replayed 2 requests", out.getvalue())
+        self.assertIn("product-list", out.getvalue())
+
+        out = io.StringIO()
+        call_command("advise_indexes", path, "--json", "--slow-ms", "0", stdout=out)
+        self.assertIsInstance(json.loads(out.getvalue()), list)
+
+        with self.assertRaises(CommandError):
+            call_command("advise_indexes", self.log("no requests here"))
+
+
+# ---------------- IMAGE DERIVATIVES ----------------
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativeTests(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        use_temp_media(self)
+
+    def upload(self, name="products/photo.png", size=(800, 400), mode="RGBA"):
+        out = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128)[:len(mode)]).save(out, format="PNG")
+        return default_storage.save(name, ContentFile(out.getvalue()))
+
+    def test_names_and_srcset(self):
+        h = "ab" + "0" * 18
+        self.assertEqual(images.derivative_name(h, "card"), f"derived/ab/{h}-400w.jpg")
+        self.assertEqual(images.derivative_name(h, "thumb", "webp"), f"derived/ab/{h}-160w.webp")
+        self.assertEqual(
+            images.srcset(h, "webp"),
+            f"/media/derived/ab/{h}-160w.webp 160w, /media/derived/ab/{h}-400w.webp 400w, "
+            f"/media/derived/ab/{h}-1200w.webp 1200w",
+        )
+        # until derivatives exist: the original, no srcset
+        self.assertEqual(images.image_urls("products/x.jpg", ""), {
+            "url": "/media/products/x.jpg", "webp_srcset": "", "jpeg_srcset": "",
+        })
+
+    def test_render_derivatives(self):
+        name = self.upload()
+        image_hash = images.render_derivatives(name)
+        self.assertEqual(len(image_hash), images.HASH_LENGTH)
+
+        with default_storage.open(images.derivative_name(image_hash, "card")) as f, Image.open(f) as im:
+            self.assertEqual((im.format, im.size, im.mode), ("JPEG", (400, 200), "RGB"))
+        # never upscaled
+        with default_storage.open(images.derivative_name(image_hash, "zoom", "webp")) as f, Image.open(f) as im:
+            self.assertEqual((im.format, im.size), ("WEBP", (800, 400)))
+
+        # same photo again: same hash, nothing rewritten
+        with mock.patch.object(images.Image, "open") as opened:
+            self.assertEqual(images.render_derivatives(name), image_hash)
+        opened.assert_not_called()
+
+    def test_unreadable_original(self):
+        bad = default_storage.save("products/bad.png", ContentFile(b"not an image"))
+        with self.assertLogs("products.images", "WARNING"):
+            self.assertEqual(images.render_derivatives("products/missing.png"), "")
+            self.assertEqual(images.render_derivatives(bad), "")
+
+    def test_upload_switches_cards_to_derivatives(self):
+        image = ProductImage.objects.filter(product=self.products[0]).get()
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = self.upload()
+            image.save()
+        image.refresh_from_db()
+        self.assertTrue(image.image_hash)
+        self.assertEqual(ProductListing.objects.get(pk=self.products[0].pk).first_image_hash, image.image_hash)
+
+        rows = self.client.get("/api/products/?fields=id,image,image_srcset&limit=50").json()["results"]
+        row = next(r for r in rows if r["id"] == self.products[0].id)
+        self.assertEqual(row["image"], "http://testserver" + image.card_url)
+        self.assertIn("-400w.webp 400w", row["image_srcset"])
+
+        # a replaced file drops the old hash before new derivatives exist
+        with self.captureOnCommitCallbacks(execute=False):
+            image.image = self.upload("products/other.png", size=(300, 300), mode="RGB")
+            image.save()
+        image.refresh_from_db()
+        self.assertEqual(image.image_hash, "")
+
+
+# ---------------- PINCODE LOADER ----------------
+
+class PincodeLoaderTests(CatalogTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.blr = ServiceablePincode.objects.create(pincode="560001", city="Bengaluru")
+        ProductPincodeAvailability.objects.create(
+            product=cls.products[0], pincode=cls.blr, stock=4, eta_days=2, cod_available=False,
+        )
+
+    def csv_file(self, text):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, "w") as fh:
+            fh.write(text)
+        return path
+
+    def load(self, text, **kwargs):
+        loader = PincodeLoader(batch_size=kwargs.pop("batch_size", 2), **kwargs)
+        return loader.run(self.csv_file(text)), loader
+
+    def rows(self):
+        return {
+            (r.pincode.pincode, r.product_id): (r.is_available, r.stock, r.cod_available, r.eta_days)
+            for r in ProductPincodeAvailability.objects.select_related("pincode")
+        }
+
+    def test_upsert_keeps_missing_columns(self):
+        p0, p1 = self.products[0], self.products[1]
+        before = ProductPincodeAvailability.objects.get(product=p0).updated_at
+        stats, _ = self.load(
+            "pincode,product_id,stock\n"
+            f"560001,{p0.id},9\n"
+            f"560001,{p1.id},3\n"
+        )
+        self.assertEqual((stats["inserted"], stats["updated"], stats["errors"]), (1, 1, 0))
+        # stock-only feed: COD / ETA stay as stored, new rows get the model defaults
+        self.assertEqual(self.rows(), {
+            ("560001", p0.id): (True, 9, False, 2),
+            ("560001", p1.id): (True, 3, True, 3),
+        })
+        self.assertGreater(ProductPincodeAvailability.objects.get(product=p0).updated_at, before)
+
+    def test_unchanged_rows_are_not_written(self):
+        p0 = self.products[0]
+        stamp = ProductPincodeAvailability.objects.get(product=p0).updated_at
+        stats, _ = self.load(f"pincode,product_slug,stock,cod_available\n560001,{p0.slug},4,no\n")
+        self.assertEqual((stats["unchanged"], stats["updated"]), (1, 0))
+        self.assertEqual(ProductPincodeAvailability.objects.get(product=p0).updated_at, stamp)
+
+    def test_errors_are_reported_per_line(self):
+        p0 = self.products[0]
+        stats, loader = self.load(
+            "pincode,product_id,stock,eta_days\n"
+            f"5600,{p0.id},1,1\n"
+            f"560001,{p0.id},-1,1\n"
+            f"560001,{p0.id},1,999\n"
+            "560001,999999,1,1\n"
+            f"110001,{p0.id},1,1\n"
+            f"560001,{p0.id},7,1\n"
+        )
+        self.assertEqual((stats["rows"], stats["errors"], stats["updated"]), (6, 5, 1))
+        self.assertEqual([line for line, _ in loader.errors], [2, 3, 4, 5, 6])
+        self.assertIn("--create-pincodes", loader.errors[-1][1])
+
+        with self.assertRaises(RowError):
+            self.load("pin,product\n1,2\n")
+
+    def test_create_pincodes_and_dry_run(self):
+        text = f"pincode,product_id,is_available\n110001,{self.products[2].id},yes\n"
+        stats, _ = self.load(text, create_pincodes=True, dry_run=True)
+        self.assertEqual((stats["inserted"], stats["new_pincodes"]), (1, 1))
+        self.assertFalse(ServiceablePincode.objects.filter(pincode="110001").exists())
+
+        stats, _ = self.load(text, create_pincodes=True)
+        self.assertIn(("110001", self.products[2].id), self.rows())
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command(
+            "load_pincode_availability",
+            self.csv_file(f"pincode,product_id,stock\n560001,{self.products[3].id},2\n"),
+            stdout=out,
+        )
+        self.assertIn("Inserted 1, updated 0, 0 unchanged, 0 errors", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("load_pincode_availability", "/nonexistent.csv")
@@ -1,5 +1,4 @@
 from django.urls import path,  re_path
-from .views import product_list, product_detail, category_list, brand_list, category_products
 # from .page_views import product_detail_page
 from . import views
 
@@ -7,6 +6,12 @@ from . import views
 urlpatterns = [
     # -------- API --------
     path('api/products/', views.product_list, name='product-list'),
+    path('api/products/suggest/', views.product_suggest, name='product-suggest'),
+    path('api/products/feed.<str:fmt>', views.product_feed, name='product-feed'),
+    path('api/products/changes/', views.catalog_changes, name='catalog-changes'),
+    path('api/products/price-histogram/', views.price_histogram_api, name='price-histogram'),
+    path('api/home/rails/', views.home_rails_api, name='home-rails'),
+    path('api/taxonomy/', views.taxonomy_api, name='taxonomy'),
     path('api/products/<int:pk>/', views.product_detail_api, name='product-detail-api'),
      path("api/check-product-pincode/", views.check_product_pincode, name="check_product_pincode"),
 
@@ -1,24 +1,61 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from decimal import Decimal
-from django.db.models import F, ExpressionWrapper, DecimalField, Q, Count, Case, When, Value
+from django.db.models import Prefetch
+from django.core.files.storage import default_storage
 from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .models import *
 from .serializers import *
-from django.db.models.functions import Coalesce
-from .models import Gender, Category, SubCategory, Product, ProductSize
+from .models import Category, SubCategory, Product
 from users.models import Address
+from ajio.query_budget import query_budget
+from .catalog import catalog_cache
+from .pagination import MAX_ID, SORTS, InvalidCursor, order_for_sort, paginate_keyset, paginate_ranked
+from .search import search_products
+from .suggest import suggest
+from .facets import get_category_facets
+from .stock import stock_for
+from .serviceability import check_availability, pincode_info
+from .similar import similar_listings
+from .taxonomy import get_taxonomy, resolve_category_path
+from .plans import canonical_filters, parse_decimal, run_plan
+from . import feeds, sync
+from .images import derivative_url
+from .rails import home_rails
 
 # filter
 def _get_selected_list(request, key):
     return [v for v in request.GET.getlist(key) if v]
 
+
+def _get_list_fields(request):
+    """
+    ?fields=id,name,brand,image -> {"id", "name", "brand", "image"}
+    None means "all fields" (old behaviour).
+    """
+    raw = request.GET.get("fields")
+    if not raw:
+        return None
+    allowed = set(ProductSerializer.Meta.fields)
+    wanted = {f.strip() for f in raw.split(",") if f.strip() in allowed}
+    return wanted or None
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
+@query_budget(6)
 def product_detail_api(request, pk):
     product = get_object_or_404(
-        Product.objects.prefetch_related("images", "variants__color", "variants__images"),
+        Product.objects
+        .select_related("brand", "base_color", "rating_summary", "popularity")
+        .prefetch_related(
+            "images", "sizes",
+            Prefetch("variants", queryset=ProductVariant.objects.select_related("color")),
+            "variants__images",
+        ),
         pk=pk
     )
     serializer = ProductDetailSerializer(product, context={"request": request})
@@ -26,10 +63,35 @@ def product_detail_api(request, pk):
 
 
 # ---------------- API: PRODUCT LIST (SEARCH/FILTER/SORT) ----------------
+def _products_for_listings(listing_ids, fields):
+    """
+    Load full Product rows for already filtered/sorted listing ids, keeping their order.
+    """
+    products = Product.objects.select_related("brand")
+
+    # only load relations the response will actually use
+    if fields is None or fields & {"image", "image_srcset", "images"}:
+        products = products.prefetch_related("images")
+    if fields is None or "sizes" in fields:
+        products = products.prefetch_related("sizes")
+    if fields is None or fields & {"rating", "rating_count"}:
+        products = products.select_related("rating_summary")
+    if fields is None or "is_bestseller" in fields:
+        products = products.select_related("popularity")
+
+    by_id = {p.id: p for p in products.filter(id__in=listing_ids)}
+    return [by_id[pid] for pid in listing_ids if pid in by_id]
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
+@query_budget(8)
 def product_list(request):
-    products = Product.objects.all()
+    fields = _get_list_fields(request)
+
+    # filters + sort run on the denormalized listing table only
+    listings = ProductListing.objects.all()
 
     search = request.GET.get("search")
     subcategory = request.GET.get("subcategory")
@@ -44,67 +106,117 @@ def product_list(request):
 
     
     # ---------- SEARCH ----------
+    # ranked ids from the in-process inverted index (products/search.py)
+    ranked_ids = None
     if search:
-        products = products.filter(
-            Q(name__icontains=search) |
-            Q(brand__name__icontains=search) |
-            Q(category__name__icontains=search) |
-            Q(subcategory__name__icontains=search)
-        )
+        # best MAX_RESULTS matches; price / discount sorts re-order those
+        ranked_ids = search_products(search)
+        listings = listings.filter(pk__in=ranked_ids)
 
     # ---------- SUBCATEGORY ----------
     if subcategory:
-        products = products.filter(subcategory__slug=subcategory)
+        listings = listings.filter(
+            subcategory_id__in=SubCategory.objects.filter(slug=subcategory).values("id")
+        )
 
     # ---------- BRAND ----------
     if brand_slugs:
-        products = products.filter(brand__slug__in=brand_slugs)
-
-
-     # Discount percent calculation (database level)
-    discount_percent_expr = ExpressionWrapper(
-        (F("price") - F("discount_price")) * Decimal("100.0") / F("price"),
-        output_field=DecimalField(max_digits=6, decimal_places=2)
-    )
+        listings = listings.filter(brand_slug__in=brand_slugs)
 
     # ---------- DISCOUNT ----------
     if offer and not min_offer:
         min_offer = offer
 
+    #  discount_percent is 0 for products without a real discount
+    numbers = {"min_offer": min_offer, "max_offer": max_offer, "max_price": max_price}
+    numbers = {k: parse_decimal(v) for k, v in numbers.items() if v}
+    if None in numbers.values():
+        return Response({"error": "Invalid number"}, status=400)
 
-    #  Apply discount filters only when needed
     if min_offer or max_offer:
-        products = products.filter(
-            price__gt=0,
-            discount_price__isnull=False,
-            discount_price__gt=0,
-            discount_price__lt=F("price")
-        ).annotate(discount_percent=discount_percent_expr)
-
-        if min_offer:
-            products = products.filter(discount_percent__gte=Decimal(min_offer))
-
-        if max_offer:
-            products = products.filter(discount_percent__lte=Decimal(max_offer))
+        listings = listings.filter(discount_percent__gt=0)
+    if min_offer:
+        listings = listings.filter(discount_percent__gte=numbers["min_offer"])
+    if max_offer:
+        listings = listings.filter(discount_percent__lte=numbers["max_offer"])
 
     # Max price filter (AJIO under price)
     if max_price:
-        products = products.filter(discount_price__lte=Decimal(max_price))
+        listings = listings.filter(payable_price__lte=numbers["max_price"])
+
+    #  Sort (sort column + id tiebreak, so cursors stay stable)
+    if sort not in SORTS:
+        sort = None
+    listings = listings.order_by(*order_for_sort(sort))
+
+    # always one page (DEFAULT_PAGE_SIZE unless ?limit=); ?cursor=<next_cursor> for the next
+    try:
+        # search without explicit sort -> relevance order
+        if ranked_ids is not None and not sort:
+            allowed = set(listings.values_list("pk", flat=True))
+            ranked_ids = [pid for pid in ranked_ids if pid in allowed]
+            page_ids, next_cursor = paginate_ranked(ranked_ids, request)
+        else:
+            rows, next_cursor = paginate_keyset(listings, request, sort)
+            page_ids = [r.pk for r in rows]
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=400)
+
+    products = _products_for_listings(page_ids, fields)
+    return Response({"results": product_list_data(products, request, fields), "next_cursor": next_cursor})
+
+# ---------------- API: HOME PAGE RAILS ----------------
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def home_rails_api(request):
+    """
+    New arrivals, top discounts and bestsellers per gender, card fields only.
+    Built at most once per HOME_RAILS_TTL (products/rails.py).
+    """
+    return Response(home_rails())
 
-    #  Sort
-    if sort == "low":
-        products = products.order_by("discount_price", "id")
-    elif sort == "high":
-        products = products.order_by("-discount_price", "-id")
-    else:
-        products = products.order_by("-id")
+# ---------------- API: HEADER SEARCH TYPEAHEAD ----------------
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_suggest(request):
+    """
+    GET /api/products/suggest/?q=shi&limit=6
+    In-memory prefix lookup (products/suggest.py), no per-keystroke DB scan.
+    """
+    q = (request.GET.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 6)), 10))
+    except ValueError:
+        limit = 6
+
+    if len(q) < 2:
+        return Response({"query": q, "products": [], "brands": [], "categories": []})
+
+    result = suggest(q, limit=limit)
+
+    products = []
+    for p in result["products"]:
+        img = default_storage.url(p["image"]) if p["image"] else ""
+        img = derivative_url(p["image_hash"], "thumb", fallback=img)
+        products.append({
+            "id": p["id"],
+            "name": p["name"],
+            "brand": p["brand"],
+            "image": request.build_absolute_uri(img) if img else "",
+            "url": reverse("product_detail", args=[p["id"]]),
+        })
 
-    serializer = ProductSerializer(products, many=True, context={"request": request})
-    return Response(serializer.data)
+    return Response({
+        "query": q,
+        "products": products,
+        "brands": result["brands"],     # url: PLP of the brand's main subcategory, ?brand=
+        "categories": result["categories"],
+    })
 
 # /Product Brand
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache
 def brand_list(request):
     brands = Brand.objects.all()
     serializer = BrandSerializer(brands, many=True)
@@ -112,11 +224,18 @@ def brand_list(request):
 
 # Product Category list
 @api_view(['GET'])
+@catalog_cache
 def category_list(request):
     categories = Category.objects.all()
     serializer = CategorySerializer(categories, many=True)
     return Response(serializer.data)
 
+# Nested Gender -> Category -> SubCategory tree with product counts
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def taxonomy_api(request):
+    return Response({"genders": get_taxonomy().nav_tree()})
+
 # PRODUCT DETAIL BY ID
 # @api_view(['GET'])
 # def product_detail(request, pk):
@@ -127,13 +246,8 @@ def category_list(request):
 def product_detail(request, product_id):
     product = get_object_or_404(Product, id=product_id)
 
-    similar_products = (
-        Product.objects
-        .filter(brand=product.brand, subcategory=product.subcategory)
-        .exclude(id=product.id)
-        .prefetch_related("images")
-        .order_by("-id")[:12]
-    )
+    # precomputed ranking (products/similar.py) -> ready-to-render listing rows
+    similar_products = similar_listings(product, limit=12)
 
     # --------------------------
     # Default pincode (your code)
@@ -167,84 +281,40 @@ def product_detail(request, product_id):
     }
     return render(request, "product_detail.html", context)
 
-def category_products(request, gender, subcategory, category=None):
-    # -----------------------------
-    # Resolve URL objects
-    # -----------------------------
-    g = get_object_or_404(Gender, slug=gender)
-
-    if category:
-        cat = get_object_or_404(Category, slug=category, gender=g)
-        subcat = get_object_or_404(SubCategory, slug=subcategory, category=cat)
-    else:
-        subcat = get_object_or_404(SubCategory, slug=subcategory, category__gender=g)
-        cat = subcat.category
-
-    # -----------------------------
-    # Detect ProductSize relation automatically (Product -> ProductSize)
-    # This is what you have in admin "PRODUCT SIZES"
-  
-    size_rel = None        # reverse accessor name (ex: "product_sizes" or "productsize_set")
-    size_field = None      # field storing size value (ex: "size")
-    stock_field = None     # field storing stock (ex: "stock")
-
-    for rel in Product._meta.related_objects:
-        rm = rel.related_model
-        # match common model names
-        if rm.__name__.lower() in ["productsize", "productsizes", "product_size", "product_sizes"]:
-            size_rel = rel.get_accessor_name()
-            fields = {f.name for f in rm._meta.get_fields()}
-            for cand in ["size", "value", "label"]:
-                if cand in fields:
-                    size_field = cand
-                    break
-            for cand in ["stock", "qty", "quantity"]:
-                if cand in fields:
-                    stock_field = cand
-                    break
-            break
+def _plp_filters(request, subcat, search_ids):
+    # canonical filter set -> cached SQL template over ProductListing (products/plans.py)
+    return canonical_filters(subcat.id, {
+        "sort": request.GET.get("sort"),
+        "offer": (request.GET.get("offer") or "").strip().lower(),
+        "price": request.GET.get("price"),
+        "min_price": request.GET.get("min_price"),
+        "max_price": request.GET.get("max_price"),
+        "min_offer": request.GET.get("min_offer"),
+        "max_offer": request.GET.get("max_offer"),
+        "brands": request.GET.getlist("brand"),
+        "colors": request.GET.getlist("color"),
+        "sizes": request.GET.getlist("size"),
+    }, get_taxonomy().color_ids_for, search_ids=search_ids)
+
+
+def _facet_selection(filters, resolved, colors, sizes, search_ids):
+    return {
+        "brands": resolved["brands"],
+        "colors": colors,
+        "sizes": sizes,
+        "min_price": filters.min_price,
+        "max_price": filters.max_price,
+        "min_offer": filters.min_offer,
+        "max_offer": filters.max_offer,
+        "ids": search_ids,
+    }
 
-    # -----------------------------
-    # Detect Variant relation ONLY for Colors (optional)
-    # because your API uses variants__color
-    # -----------------------------
-    variant_rel = None
-    for relname in ["variants", "variant_set", "productvariant_set"]:
-        try:
-            Product._meta.get_field(relname)
-            variant_rel = relname
-            break
-        except Exception:
-            continue
-
-    color_lookup = None
-    if variant_rel:
-        variant_model = Product._meta.get_field(variant_rel).related_model
-        variant_fields = {f.name for f in variant_model._meta.get_fields()}
-        # if FK color exists, use name
-        if "color" in variant_fields:
-            color_lookup = f"{variant_rel}__color__name"
-        elif "color_name" in variant_fields:
-            color_lookup = f"{variant_rel}__color_name"
 
+def category_products(request, gender, subcategory, category=None):
     # -----------------------------
-    # Base queryset (subcategory products)
+    # Resolve URL objects (in-memory taxonomy map, no queries)
     # -----------------------------
-    products = (
-        Product.objects
-        .filter(subcategory=subcat)
-        .select_related("brand", "category", "subcategory")
-        .prefetch_related("images")
-        .distinct()
-    )
-
-    # prefetch sizes table if exists
-    if size_rel:
-        products = products.prefetch_related(size_rel)
-
-    # prefetch variants for color if exists
-    if variant_rel:
-        products = products.prefetch_related(variant_rel, f"{variant_rel}__color")
+    g, cat, subcat = resolve_category_path(gender, subcategory, category)
 
     # -----------------------------
     # READ FILTER PARAMS (GET)
@@ -252,193 +322,39 @@ def category_products(request, gender, subcategory, category=None):
     sort = request.GET.get("sort")  # low / high / default
     search = (request.GET.get("search") or "").strip()
     offer = (request.GET.get("offer") or "").strip().lower()
-
-    max_price = request.GET.get("max_price")
-    min_offer = request.GET.get("min_offer")
-    max_offer = request.GET.get("max_offer")
-
-    brand_slugs = request.GET.getlist("brand")
     colors = request.GET.getlist("color")
     sizes = request.GET.getlist("size")
 
+    search_ids = search_products(search) if search else None
 
-    # /men/clothing/jeans/?offer=under999
-    if offer == "under999":
-        max_price = max_price or "999"
-    elif offer == "under1499":
-        max_price = max_price or "1499"
-    elif offer == "min30":
-        min_offer = min_offer or "30"
-    elif offer == "min40":
-        min_offer = min_offer or "40"
-    elif offer == "min50":
-        min_offer = min_offer or "50"
-    # brand-xxx example: offer=brand-nike
-    elif offer.startswith("brand-") and not brand_slugs:
-        brand_slugs = [offer.replace("brand-", "", 1)]
-
-    # -----------------------------
-    # APPLY FILTERS
-    # -----------------------------
-    if search:
-        products = products.filter(name__icontains=search)
-
-
-    if brand_slugs:
-        products = products.filter(brand__slug__in=brand_slugs)
-
-    # color filter: Product.color OR variant color
-    if colors:
-        if hasattr(Product, "color"):
-            # if Product.color is FK
-            products = products.filter(color__name__in=colors)
-        elif color_lookup:
-            products = products.filter(**{f"{color_lookup}__in": colors}).distinct()
-        # else ignore
-
-    # size filter: from ProductSize table (NOT variants)
-    if sizes and size_rel and size_field:
-        products = products.filter(**{f"{size_rel}__{size_field}__in": sizes}).distinct()
-
-    # discount percent
-    discount_percent_expr = ExpressionWrapper(
-        (F("price") - F("discount_price")) * Decimal("100.0") / F("price"),
-        output_field=DecimalField(max_digits=6, decimal_places=2)
-    )
-
-    # ALWAYS annotate off_percent so template can use it anytime
-    products = products.annotate(
-        off_percent=Case(
-            When(
-                price__gt=0,
-                discount_price__isnull=False,
-                discount_price__gt=0,
-                discount_price__lt=F("price"),
-                then=discount_percent_expr
-            ),
-            default=Value(0),
-            output_field=DecimalField(max_digits=6, decimal_places=2),
-        )
-    )
-    
-
-    if min_offer or max_offer:
-        products = (
-            products.filter(
-                price__gt=0,
-                discount_price__isnull=False,
-                discount_price__gt=0,
-                discount_price__lt=F("price")
-            )
-            .annotate(discount_percent=discount_percent_expr)
-        )
-        if min_offer:
-            products = products.filter(discount_percent__gte=Decimal(min_offer))
-        if max_offer:
-            products = products.filter(discount_percent__lte=Decimal(max_offer))
+    filters, resolved = _plp_filters(request, subcat, search_ids)
+    products = run_plan(filters)
 
-    # max price using payable price
-    if max_price:
-        try:
-            mx = Decimal(max_price)
-            products = products.annotate(
-                payable_price=Coalesce("discount_price", "price")
-            ).filter(payable_price__lte=mx)
-        except Exception:
-            pass
-
-    # sorting
-    if sort == "low":
-        products = products.annotate(
-            payable_price=Coalesce("discount_price", "price")
-        ).order_by("payable_price", "id")
-    elif sort == "high":
-        products = products.annotate(
-            payable_price=Coalesce("discount_price", "price")
-        ).order_by("-payable_price", "-id")
-    else:
-        products = products.order_by("-id")
+    brand_slugs = resolved["brands"]
+    max_price = resolved["max_price"]
 
     # -----------------------------
     # FACETS (sidebar counts)
-    # build from category scope (AJIO style)
+    # in-memory bitsets per category (products/facets.py), counts honour
+    # the active selection (disjunctive per facet); price / discount
+    # buckets follow the subcategory's own distribution
     # -----------------------------
-    base = (
-        Product.objects
-        .filter(category=cat)
-        .select_related("brand")
-        .distinct()
-    )
+    facets = get_category_facets(cat.id)
+    counts = facets.counts(subcat.id, _facet_selection(filters, resolved, colors, sizes, search_ids))
 
-    if size_rel:
-        base = base.prefetch_related(size_rel)
-    if variant_rel:
-        base = base.prefetch_related(variant_rel)
-
-    subcat_facets = (
-        SubCategory.objects
-        .filter(category=cat)
-        .annotate(cnt=Count("product"))
-        .values("name", "slug", "cnt")
-        .order_by("name")
-    )
-
-    brand_facets = (
-        base.values("brand__name", "brand__slug")
-        .annotate(cnt=Count("id", distinct=True))
-        .order_by("brand__name")
-    )
-
-    # color facets
-    if hasattr(Product, "color"):
-        color_facets = (
-            base.values(value=F("color__name"))
-            .exclude(value__isnull=True)
-            .exclude(value__exact="")
-            .annotate(cnt=Count("id", distinct=True))
-            .order_by("value")
-        )
-    elif color_lookup:
-        color_facets = (
-            base.values(value=F(color_lookup))
-            .exclude(value__isnull=True)
-            .exclude(value__exact="")
-            .annotate(cnt=Count("id", distinct=True))
-            .order_by("value")
-        )
-    else:
-        color_facets = []
-
-    # size facets from ProductSize table
-    if size_rel and size_field:
-        size_facets = (
-            base.values(value=F(f"{size_rel}__{size_field}"))
-            .exclude(value__isnull=True)
-            .exclude(value__exact="")
-            .annotate(cnt=Count("id", distinct=True))
-            .order_by("value")
-        )
-    else:
-        size_facets = []
-
-    price_buckets = [
-        {"label": "Below Rs.999", "value": "999"},
-        {"label": "Rs.1000-1499", "value": "1499"},
-        {"label": "Rs.1500-1999", "value": "1999"},
-        {"label": "Rs.2000-2499", "value": "2499"},
-    ]
-
-    discount_buckets = [
-        {"label": "30% and above", "value": "30"},
-        {"label": "40% and above", "value": "40"},
-        {"label": "50% and above", "value": "50"},
-    ]
+    subcat_facets = facets.subcat_facets()
+    brand_facets = counts["brands"]
+    color_facets = counts["colors"]
+    size_facets = counts["sizes"]
+    price_buckets = counts["price_buckets"]
+    discount_buckets = counts["discount_buckets"]
 
     return render(request, "products/category_products.html", {
         "gender": g,
         "category": cat,
         "subcategory": subcat,
         "products": products,
+        "product_count": len(products),
 
         "subcat_facets": subcat_facets,
         "brand_facets": brand_facets,
@@ -452,13 +368,47 @@ def category_products(request, gender, subcategory, category=None):
         "sel_brands": set(brand_slugs),
         "sel_colors": set(colors),
         "sel_sizes": set(sizes),
+        "sel_price": resolved["price"],
         "sel_max_price": str(max_price or ""),
-        "sel_min_offer": str(min_offer or ""),
+        "sel_min_offer": str(resolved["min_offer"] or ""),
         "sel_sort": sort or "",
         "sel_search": search,
         "sel_offer": offer,
     })
 
+# ---------------- API: PRICE RANGE SLIDER ----------------
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def price_histogram_api(request):
+    """
+    GET /api/products/price-histogram/?gender=men&category=clothing&subcategory=jeans
+    [&brand=..&color=..&size=..&min_offer=..&search=..]
+    Payable-price histogram of the PLP scope with every filter except price
+    applied, plus the sidebar price buckets; served from the facet bitsets.
+    """
+    gender, subcategory = request.GET.get("gender"), request.GET.get("subcategory")
+    if not gender or not subcategory:
+        return Response({"error": "gender and subcategory are required"}, status=400)
+    g, cat, subcat = resolve_category_path(gender, subcategory, request.GET.get("category") or None)
+
+    search = (request.GET.get("search") or "").strip()
+    search_ids = search_products(search) if search else None
+    colors, sizes = request.GET.getlist("color"), request.GET.getlist("size")
+    filters, resolved = _plp_filters(request, subcat, search_ids)
+    selection = _facet_selection(filters, resolved, colors, sizes, search_ids)
+
+    facets = get_category_facets(cat.id)
+    try:
+        bins = min(max(int(request.GET.get("bins") or 20), 1), 100)
+    except ValueError:
+        bins = 20
+    data = facets.histogram(subcat.id, selection, bins)
+    data["buckets"] = [
+        {"label": b["label"], "value": b["value"], "cnt": b["cnt"]}
+        for b in facets.counts(subcat.id, selection)["price_buckets"]
+    ]
+    return Response(data)
+
 def products_page(request):
     # Just render page, filtering is done via JS + API
     return render(request, "products/products_page.html")
@@ -477,13 +427,16 @@ def check_product_pincode(request):
     if len(pincode) != 6 or not pincode.isdigit():
         return Response({"success": False, "error": "Enter valid 6 digit pincode"}, status=400)
 
-    product = Product.objects.filter(id=int(product_id)).first()
-    if not product:
+    product_id = int(product_id)
+    avail = check_availability([product_id], pincode).get(product_id)
+
+    # an availability row proves the product exists; only misses hit the DB
+    if avail is None and not Product.objects.filter(id=product_id).exists():
         return Response({"success": False, "error": "Product not found"}, status=404)
 
     # 1) is pincode serviceable?
-    pin_obj = ServiceablePincode.objects.filter(pincode=pincode).first()
-    if not pin_obj:
+    pin_info = pincode_info(pincode)
+    if not pin_info:
         return Response({
             "success": True,
             "deliverable": False,
@@ -492,12 +445,9 @@ def check_product_pincode(request):
             "message": "Sorry! We do not deliver to this pincode."
         }, status=200)
 
-    # 2) product availability in this pincode
-    avail = ProductPincodeAvailability.objects.filter(
-        product=product,
-        pincode=pin_obj
-    ).first()
+    city, state = pin_info
 
+    # 2) product availability in this pincode
     # if entry not created in admin
     if not avail:
         return Response({
@@ -505,8 +455,8 @@ def check_product_pincode(request):
             "deliverable": True,
             "product_available": False,
             "pincode": pincode,
-            "city": pin_obj.city,
-            "state": pin_obj.state,
+            "city": city,
+            "state": state,
             "message": "Delivery available, but this product is not available at your location"
         }, status=200)
 
@@ -517,8 +467,8 @@ def check_product_pincode(request):
             "deliverable": True,
             "product_available": False,
             "pincode": pincode,
-            "city": pin_obj.city,
-            "state": pin_obj.state,
+            "city": city,
+            "state": state,
             "message": "Out of stock at your location"
         }, status=200)
 
@@ -527,29 +477,112 @@ def check_product_pincode(request):
         "deliverable": True,
         "product_available": True,
         "pincode": pincode,
-        "city": pin_obj.city,
-        "state": pin_obj.state,
-        "stock": int(avail.stock or 0),
-        "cod_available": bool(avail.cod_available),
-        "eta_days": int(avail.eta_days or 0)
+        "city": city,
+        "state": state,
+        "stock": avail.stock,
+        "cod_available": avail.cod_available,
+        "eta_days": avail.eta_days
     }, status=200)
 
 
-@api_view(["GET"])
+STOCK_MAP_MAX_IDS = 1000
+
+
+@api_view(["GET", "POST"])
 def stock_map_api(request):
     """
-    GET /api/products/stock-map/?ids=1,2,3
+    GET  /api/products/stock-map/?ids=1,2,3
     returns: { "1": true, "2": false }
+
+    POST /api/products/stock-map/  {"ids": [1, 2, 3, ...]}   (or GET ...&compact=1)
+    returns compact: { "in_stock": [1, 3] }  (every other requested id is out of stock)
+
+    (not ?format=: DRF reserves that for its renderer override)
     """
-    ids = request.GET.get("ids", "")
-    id_list = [int(x) for x in ids.split(",") if x.strip().isdigit()]
+    if request.method == "POST":
+        raw = request.data.get("ids") or []
+        if isinstance(raw, str):
+            raw = raw.split(",")
+    else:
+        raw = request.GET.get("ids", "").split(",")
+
+    id_list = []
+    for x in raw:
+        x = str(x).strip()
+        if x.isdigit() and 0 < int(x) <= MAX_ID:
+            id_list.append(int(x))
+    id_list = list(dict.fromkeys(id_list))
 
-    stock = {}
-    for pid in id_list:
-        # in_stock if ANY size has stock > 0
-        has_stock = ProductSize.objects.filter(product_id=pid, stock__gt=0).exists()
-        stock[str(pid)] = has_stock
+    if len(id_list) > STOCK_MAP_MAX_IDS:
+        return Response({"error": f"At most {STOCK_MAP_MAX_IDS} ids allowed"}, status=400)
 
-    return Response(stock)
+    # one query for ids not in the in-process cache
+    stock = stock_for(id_list)
 
+    if request.method == "POST" or request.GET.get("compact") in ("1", "true"):
+        return Response({"in_stock": [pid for pid in id_list if stock[pid]]})
 
+    return Response({str(pid): has_stock for pid, has_stock in stock.items()})
+
+
+# ---------------- PRODUCT FEED (XML / CSV / NDJSON) ----------------
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def product_feed(request, fmt):
+    """
+    GET /api/products/feed.xml | feed.csv | feed.ndjson [?since=2026-01-31T00:00:00Z]
+    Streamed row by row (products/feeds.py); gzip when the client accepts it.
+    X-Feed-Watermark is the since= value for the next delta pull.
+    """
+    if fmt not in feeds.FORMATS:
+        return Response({"error": "format must be xml, csv or ndjson"}, status=404)
+    try:
+        since = feeds.parse_since(request.GET.get("since"))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    base_url = request.build_absolute_uri("/")
+    watermark = feeds.feed_watermark()
+    chunks = feeds.encode_chunks(feeds.render(feeds.feed_items(base_url, since), fmt, link=base_url))
+
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    response = StreamingHttpResponse(
+        feeds.gzip_chunks(chunks) if use_gzip else chunks, content_type=feeds.FORMATS[fmt]
+    )
+    if use_gzip:
+        response["Content-Encoding"] = "gzip"
+    response["Vary"] = "Accept-Encoding"
+    response["Content-Disposition"] = f'inline; filename="products{"-delta" if since else ""}.{fmt}"'
+    if watermark:
+        response["X-Feed-Watermark"] = watermark.isoformat()
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def catalog_changes(request):
+    """
+    GET /api/products/changes/[?since=<token>]
+    NDJSON upserts and deletes since the token (full snapshot without one),
+    ending with {"token": ...} for the next call (products/sync.py).
+    """
+    token = request.GET.get("since")
+    try:
+        since = sync.decode_token(token) if token else None
+    except sync.InvalidToken as e:
+        return Response({"error": str(e)}, status=400)
+
+    now = timezone.now()
+    chunks = feeds.encode_chunks(sync.change_lines(since, now))
+
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    response = StreamingHttpResponse(
+        feeds.gzip_chunks(chunks) if use_gzip else chunks, content_type=feeds.FORMATS["ndjson"]
+    )
+    if use_gzip:
+        response["Content-Encoding"] = "gzip"
+    response["Vary"] = "Accept-Encoding"
+    response["Cache-Control"] = "no-store"
+    response["X-Sync-Token"] = sync.encode_token(now)
+    return response
@@ -237,21 +237,35 @@ document.addEventListener("DOMContentLoaded", function () {
   const container = document.getElementById("productContainer");
   const isProductsPage = window.location.pathname.includes("/products-page/");
   if (container && !isProductsPage) {
-    fetch("/api/products/")
+    fetch("/api/home/rails/")
       .then(res => res.json())
       .then(data => {
-        container.innerHTML = "";
-        (data || []).forEach(product => {
-          const img = normalizeImgUrl(product.image) || QV_FALLBACK_IMG;
-          container.innerHTML += `
-            <div class="product-card">
-              <img src="${img}" alt="${product.name || ""}" onerror="this.src='${QV_FALLBACK_IMG}'">
-              <h4>${product.brand || ""}</h4>
-              <p>${product.name || ""}</p>
-              <div class="price">₹${product.price || ""}</div>
-            </div>
-          `;
+        const railTitles = { new_arrivals: "New Arrivals", top_discounts: "Top Discounts", bestsellers: "Bestsellers" };
+        let html = "";
+        ((data && data.rails) || []).forEach(group => {
+          Object.keys(railTitles).forEach(key => {
+            const cards = group[key] || [];
+            if (!cards.length) return;
+            html += `<h3 class="home-rail-title">${railTitles[key]} · ${group.gender || ""}</h3><div class="home-rail">`;
+            cards.forEach(product => {
+              const img = normalizeImgUrl(product.image) || QV_FALLBACK_IMG;
+              const webp = product.image_srcset
+                ? `<source type="image/webp" srcset="${product.image_srcset}" sizes="(max-width: 768px) 50vw, 240px">`
+                : "";
+              const off = product.discount_percent > 0 ? ` <span class="off">(${Math.round(product.discount_percent)}% off)</span>` : "";
+              html += `
+                <a class="product-card" href="${product.url || "#"}">
+                  <picture>${webp}<img src="${img}" alt="${product.name || ""}" loading="lazy" onerror="this.src='${QV_FALLBACK_IMG}'"></picture>
+                  <h4>${product.brand || ""}</h4>
+                  <p>${product.name || ""}</p>
+                  <div class="price">₹${product.payable_price || product.price || ""}${off}</div>
+                </a>
+              `;
+            });
+            html += "</div>";
+          });
         });
+        container.innerHTML = html;
       })
       .catch(err => console.error("Home product fetch error:", err));
   }
@@ -1294,18 +1308,36 @@ function initNavSearch() {
 
     timer = setTimeout(async () => {
       try {
-        const res = await fetch(`/api/products/?search=${encodeURIComponent(q)}`);
-        const data = await res.json();
+        const res = await fetch(`/api/products/suggest/?q=${encodeURIComponent(q)}&limit=6`);
+        const data = (await res.json()) || {};
+        const products = data.products || [];
+        const links = [...(data.categories || []), ...(data.brands || [])];
 
         dd.innerHTML = "";
 
-        if (!Array.isArray(data) || data.length === 0) {
+        if (products.length === 0 && links.length === 0) {
           dd.innerHTML = `<div class="search-empty">No results found</div>`;
           dd.style.display = "block";
           return;
         }
 
-        data.slice(0, 6).forEach(p => {
+        // brand + category suggestions first (text only)
+        links.forEach(s => {
+          const row = document.createElement("div");
+          row.className = "search-item search-link";
+          row.innerHTML = `
+            <div class="search-meta">
+              <div class="search-name">${s.name || ""}</div>
+              <div class="search-brand">${s.gender ? `${s.gender} / ${s.category}` : "Brand"}</div>
+            </div>
+          `;
+          row.addEventListener("click", () => {
+            window.location.href = s.url;
+          });
+          dd.appendChild(row);
+        });
+
+        products.forEach(p => {
           const img = normalizeImgUrl(p.image) || QV_FALLBACK_IMG;
           const row = document.createElement("div");
           row.className = "search-item";
@@ -1317,7 +1349,7 @@ function initNavSearch() {
             </div>
           `;
           row.addEventListener("click", () => {
-            window.location.href = `/product/${p.id}/`;
+            window.location.href = p.url || `/detail/${p.id}/`;
           });
           dd.appendChild(row);
         });